@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+"""
+Benchmarks moduli_assembly orchestration against the deterministic fake ssh-keygen of
+`benchmarks.fake_ssh_keygen`, on synthetic inputs, and saves the results as JSON.
+
+    python -m benchmarks --lines 10000 100000 1000000 -o bench.json
+    python -m benchmarks --compare bench.json
+"""
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from argparse import ArgumentParser
+from logging import (WARNING, getLogger)
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from typing import (Callable, Dict, List)
+
+from benchmarks.fake_ssh_keygen import (write_candidates, write_moduli)
+from moduli_assembly import (ModuliAssembly, __version__, default_config)
+from moduli_assembly.scripts.moduli_infile import moduli_distribution
+
+FAKE_SSH_KEYGEN = Path(__file__).parent / 'fake_ssh_keygen.py'
+
+# Safe prime line counts for `create_moduli_file` are spread over these sizes
+MODULI_BITSIZES = (3072, 4096, 6144, 7680, 8192)
+
+
+def args():
+    parser = ArgumentParser(description='Benchmark moduli_assembly with a fake ssh-keygen')
+    parser.add_argument('--lines', type=int, nargs='+', default=[10000, 100000],
+                        help='Synthetic input sizes, in lines, default=10000 100000')
+    parser.add_argument('--key-length', type=int, default=1024,
+                        help='Key length of synthetic candidates, default=1024')
+    parser.add_argument('--jobs', type=int, default=4, help='Generation runs and shards, default=4')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds per fake ssh-keygen invocation')
+    parser.add_argument('--yield', dest='yield_rate', type=float, default=0.002,
+                        help='Fraction of candidates the fake screening accepts, default=0.002')
+    parser.add_argument('--only', type=str, nargs='+', default=None, help='Run only the named benchmarks')
+    parser.add_argument('-o', '--output', type=Path, default=None, help='Write JSON results to OUTPUT')
+    parser.add_argument('--compare', type=Path, default=None,
+                        help='Baseline JSON results; exits 1 on a benchmark slower by more than --tolerance')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown ratio, default=0.25')
+    return parser.parse_args()
+
+
+def assembly(root_dir: Path) -> ModuliAssembly:
+    """
+    A ModuliAssembly rooted in `root_dir`, running the fake ssh-keygen.
+    """
+    ma = ModuliAssembly(config=default_config(), root_dir=root_dir)
+    ma.config['ssh_keygen'] = str(FAKE_SSH_KEYGEN)
+    # The benchmarks write their fixtures straight into the moduli directory
+    ma.make_dirs()
+    return ma
+
+
+def candidate_file(ma: ModuliAssembly, key_length: int, lines: int) -> Path:
+    candidate = ma.create_candidate_path(key_length)
+    write_candidates(str(candidate), key_length, lines)
+    return candidate
+
+
+def bench_generate_candidates(ma: ModuliAssembly, lines: int, opts) -> Callable[[], None]:
+    os.environ['FAKE_SSH_KEYGEN_CANDIDATES'] = str(max(1, lines // opts.jobs))
+    return lambda: ma.generate_candidates(opts.key_length, opts.jobs, jobs=opts.jobs)
+
+
+def bench_screen_candidates(ma: ModuliAssembly, lines: int, opts) -> Callable[[], None]:
+    candidate = candidate_file(ma, opts.key_length, lines)
+    return lambda: ma.screen_candidates(candidate)
+
+
+def bench_screen_candidates_sharded(ma: ModuliAssembly, lines: int, opts) -> Callable[[], None]:
+    candidate = candidate_file(ma, opts.key_length, lines)
+    return lambda: ma.screen_candidates(candidate, shards=opts.jobs)
+
+
+def bench_restart_candidate_screening(ma: ModuliAssembly, lines: int, opts) -> Callable[[], None]:
+    # Two interrupted screenings, each half done
+    for _ in range(2):
+        candidate = candidate_file(ma, opts.key_length, lines // 2)
+        ma.create_checkpoint_filename(candidate).write_text(f'{lines // 4}\n')
+        time.sleep(0.001)
+    return lambda: ma.restart_candidate_screening()
+
+
+def _screened_files(ma: ModuliAssembly, lines: int, seed: int = 0) -> None:
+    for bitsize in MODULI_BITSIZES:
+        screened = ma.config['moduli_dir'] / f'{bitsize}.screened_{seed}'
+        write_moduli(str(screened), bitsize, lines // len(MODULI_BITSIZES), seed=seed)
+
+
+def bench_create_moduli_file(ma: ModuliAssembly, lines: int, opts) -> Callable[[], None]:
+    _screened_files(ma, lines)
+    return lambda: ma.create_moduli_file()
+
+
+def bench_create_moduli_file_incremental(ma: ModuliAssembly, lines: int, opts) -> Callable[[], None]:
+    _screened_files(ma, lines)
+    ma.create_moduli_file()
+    # One more screened file, a tenth the size of the moduli file
+    write_moduli(str(ma.config['moduli_dir'] / '4096.screened_1'), 4096, max(1, lines // 10), seed=1)
+    return lambda: ma.create_moduli_file()
+
+
+def bench_moduli_distribution(ma: ModuliAssembly, lines: int, opts) -> Callable[[], None]:
+    _screened_files(ma, lines)
+    moduli_file = ma.create_moduli_file()
+    return lambda: moduli_distribution(moduli_file)
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    'generate_candidates': bench_generate_candidates,
+    'screen_candidates': bench_screen_candidates,
+    'screen_candidates_sharded': bench_screen_candidates_sharded,
+    'restart_candidate_screening': bench_restart_candidate_screening,
+    'create_moduli_file': bench_create_moduli_file,
+    'create_moduli_file_incremental': bench_create_moduli_file_incremental,
+    'moduli_distribution': bench_moduli_distribution,
+}
+
+
+def measure(name: str, setup: Callable, lines: int, opts) -> dict:
+    """
+    Runs one benchmark in its own root directory; setup is not timed.
+
+    Returns:
+        Result: name, lines, wall seconds, own CPU seconds, and CPU seconds of (fake) ssh-keygen children.
+    """
+    with TemporaryDirectory() as tmp:
+        run = setup(assembly(Path(tmp)), lines, opts)
+        own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+        started = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - started
+        own_after = resource.getrusage(resource.RUSAGE_SELF)
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return {
+        'name': name,
+        'lines': lines,
+        'seconds': round(seconds, 6),
+        'cpu_seconds': round(max(0.0, own_after.ru_utime + own_after.ru_stime - own.ru_utime - own.ru_stime), 6),
+        'child_cpu_seconds': round(max(0.0, children_after.ru_utime + children_after.ru_stime
+                                       - children.ru_utime - children.ru_stime), 6),
+        'lines_per_second': round(lines / seconds) if seconds else None,
+    }
+
+
+def regressions(results: List[dict], baseline: dict, tolerance: float) -> List[str]:
+    """
+    Benchmarks slower than their baseline by more than `tolerance`.
+    """
+    before = {(result['name'], result['lines']): result['seconds'] for result in baseline['results']}
+    slower = []
+    for result in results:
+        previous = before.get((result['name'], result['lines']))
+        if previous and result['seconds'] > previous * (1 + tolerance):
+            slower.append(f'{result["name"]} ({result["lines"]} lines): {previous:.3f}s -> {result["seconds"]:.3f}s')
+    return slower
+
+
+def main():
+    opts = args()
+    getLogger('moduli_assembly').setLevel(WARNING)
+    os.environ['FAKE_SSH_KEYGEN_LATENCY'] = str(opts.latency)
+    os.environ['FAKE_SSH_KEYGEN_YIELD'] = str(opts.yield_rate)
+
+    results = []
+    for name, setup in BENCHMARKS.items():
+        if opts.only and name not in opts.only:
+            continue
+        for lines in opts.lines:
+            result = measure(name, setup, lines, opts)
+            results.append(result)
+            print(f'{name:<32} {lines:>9} lines {result["seconds"]:>9.3f}s  '
+                  f'cpu {result["cpu_seconds"]:>8.3f}s  ssh-keygen cpu {result["child_cpu_seconds"]:>8.3f}s')
+
+    report = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'parameters': {'key_length': opts.key_length, 'jobs': opts.jobs, 'latency': opts.latency,
+                       'yield': opts.yield_rate},
+        'results': results,
+    }
+    if opts.output:
+        opts.output.write_text(json.dumps(report, indent=2) + '\n')
+
+    if opts.compare:
+        slower = regressions(results, json.loads(opts.compare.read_text()), opts.tolerance)
+        for line in slower:
+            print(f'REGRESSION: {line}')
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
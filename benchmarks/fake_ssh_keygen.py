@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Deterministic stand-in for `ssh-keygen -M generate` and `ssh-keygen -M screen`.
+
+Accepts the command lines built by `ModuliAssembly.generate_command` and `ModuliAssembly.screen_command`, writes
+files in the ssh-keygen formats and keeps the screening checkpoint the way ssh-keygen does, but without any
+arithmetic, so benchmarks measure moduli_assembly itself. Behaviour is set from the environment:
+
+    FAKE_SSH_KEYGEN_LATENCY     Seconds slept by every invocation, default 0
+    FAKE_SSH_KEYGEN_CANDIDATES  Candidate lines written per generation run, default 10000
+    FAKE_SSH_KEYGEN_YIELD       Fraction of candidates screening accepts, default 0.002
+"""
+import os
+import sys
+import time
+import zlib
+from contextlib import nullcontext
+from random import Random
+
+# ssh-keygen's moduli.c field values
+MODULI_TYPE_SAFE = 2
+MODULI_TYPE_SOPHIE_GERMAIN = 4
+MODULI_TESTS_SIEVE = 0x02
+MODULI_TESTS_SCREENED = 0x06
+MODULI_TRIALS = 100
+
+# ssh-keygen writes its screening checkpoint every so many lines
+CHECKPOINT_INTERVAL = 1000
+
+
+def _timestamp() -> str:
+    return time.strftime('%Y%m%d%H%M%S', time.gmtime())
+
+
+def _open(path: str, mode: str):
+    """
+    Opens a file, or standard input or output for "-", as ssh-keygen does.
+    """
+    if path == '-':
+        return nullcontext(sys.stdin if mode == 'r' else sys.stdout)
+    return open(path, mode)
+
+
+def parse(argv: list) -> tuple:
+    """
+    Splits an ssh-keygen moduli command line into its mode, `-O` options, `-f` input and output file.
+    """
+    mode, options, infile, outfile = None, {}, None, None
+    args = iter(argv)
+    for arg in args:
+        if arg == '-M':
+            mode = next(args)
+        elif arg == '-O':
+            key, _, value = next(args).partition('=')
+            options[key] = value
+        elif arg == '-f':
+            infile = next(args)
+        else:
+            outfile = arg
+    return mode, options, infile, outfile
+
+
+def write_candidates(path: str, bits: int, count: int, seed: int = 0) -> None:
+    """
+    Writes `count` Sophie Germain candidate lines of a `bits` key length, as `ssh-keygen -M generate` does.
+    """
+    random = Random(bits ^ seed)
+    timestamp = _timestamp()
+    with _open(path, 'w') as f:
+        for _ in range(count):
+            q = random.getrandbits(bits - 1) | (1 << (bits - 2)) | 1
+            f.write(f'{timestamp} {MODULI_TYPE_SOPHIE_GERMAIN} {MODULI_TESTS_SIEVE} 0 {bits - 2} 0 {q:X}\n')
+
+
+def write_moduli(path: str, bits: int, count: int, seed: int = 0, generator: int = 2) -> None:
+    """
+    Writes `count` safe prime lines of a `bits` key length, as `ssh-keygen -M screen` does.
+    """
+    random = Random(bits ^ seed)
+    timestamp = _timestamp()
+    with open(path, 'w') as f:
+        for _ in range(count):
+            p = random.getrandbits(bits) | (1 << (bits - 1)) | 3
+            f.write(f'{timestamp} {MODULI_TYPE_SAFE} {MODULI_TESTS_SCREENED} {MODULI_TRIALS} {bits - 1} '
+                    f'{generator:x} {p:X}\n')
+
+
+def generate(options: dict, outfile: str) -> int:
+    """
+    Writes FAKE_SSH_KEYGEN_CANDIDATES candidate lines, seeded by the bits and start options.
+    """
+    write_candidates(outfile, int(options['bits']), int(os.environ.get('FAKE_SSH_KEYGEN_CANDIDATES', 10000)),
+                     seed=int(options.get('start', '0'), 16))
+    return 0
+
+
+def accepted(modulus: str, rate: float) -> bool:
+    """
+    Stable pseudo-random verdict for one candidate, the same on every run.
+    """
+    return zlib.crc32(modulus.encode()) < rate * (1 << 32)
+
+
+def screen(options: dict, infile: str, outfile: str) -> int:
+    """
+    Screens the `start-line`/`lines` range of a candidate file, resuming from and updating the checkpoint,
+    which is removed once the range is complete.
+    """
+    rate = float(os.environ.get('FAKE_SSH_KEYGEN_YIELD', 0.002))
+    checkpoint = options.get('checkpoint')
+    first = int(options.get('start-line', 0))
+    last = first + int(options['lines']) if 'lines' in options else None
+    if checkpoint and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            first = max(first, int(f.read().strip() or 0))
+
+    def save(line_number: int) -> None:
+        if checkpoint:
+            with open(f'{checkpoint}.tmp', 'w') as f:
+                f.write(f'{line_number}\n')
+            os.replace(f'{checkpoint}.tmp', checkpoint)
+
+    timestamp = _timestamp()
+    with _open(infile, 'r') as src, _open(outfile, 'a') as dst:
+        for line_number, line in enumerate(src):
+            if line_number < first:
+                continue
+            if last is not None and line_number >= last:
+                break
+            fields = line.split()
+            if len(fields) == 7 and int(fields[1]) == MODULI_TYPE_SOPHIE_GERMAIN and accepted(fields[6], rate):
+                p = (int(fields[6], 16) << 1) + 1
+                dst.write(f'{timestamp} {MODULI_TYPE_SAFE} {MODULI_TESTS_SCREENED} {MODULI_TRIALS} '
+                          f'{int(fields[4]) + 1} {options.get("generator", "2")} {p:X}\n')
+            if (line_number + 1) % CHECKPOINT_INTERVAL == 0:
+                save(line_number + 1)
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.unlink(checkpoint)
+    return 0
+
+
+def main(argv: list = None) -> int:
+    mode, options, infile, outfile = parse(sys.argv[1:] if argv is None else argv)
+    time.sleep(float(os.environ.get('FAKE_SSH_KEYGEN_LATENCY', 0)))
+    if mode == 'generate':
+        return generate(options, outfile)
+    if mode == 'screen':
+        return screen(options, infile, outfile)
+    print(f'fake ssh-keygen: unsupported mode {mode}', file=sys.stderr)
+    return 1
+
+
+if __name__ == '__main__':
+    exit(main())
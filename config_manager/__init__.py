@@ -1,5 +1,6 @@
 from json import (dumps, loads)
 from pathlib import PosixPath as Path
+from typing import Iterable
 
 # _path_parameters are those properties that become `Path` objects in runtime
 # NOTE: Supply ONLY the NAMES - Not the path in which they reside.
@@ -80,26 +81,20 @@ def _enable_path_properties(config: dict, root_dir=None) -> dict:
 
 def _disable_path_properties(config: dict) -> dict:
     """
-    Disables specific path-related properties ('config_dir' and 'config_file') in
-    the given configuration dictionary by replacing their values with their
-    `name` attribute. If the property is not 'config_dir' or 'config_file',
-    it assigns the 'name' attribute of 'config_file' to the key 'config_file'.
+    Disables path properties in the given configuration dictionary, for saving, by
+    replacing every `Path` value ('config_dir', 'config_file', and any other) with
+    its `name` attribute. All other properties are kept as they are.
 
     Args:
-        config: Configuration dictionary containing potential path
-        properties such as 'config_dir' or 'config_file'. The values for
-        these keys are expected to have a `name` attribute.
+        config: Configuration dictionary containing path properties such as
+        'config_dir' or 'config_file'.
 
     Returns:
-        A modified configuration dictionary with updated values for
-        'config_dir' and 'config_file' keys.
+        A new configuration dictionary with path values replaced by their names.
     """
     new_config = dict()
     for prop in config:
-        if prop in ['config_dir', 'config_file']:
-            new_config[prop] = config[prop].name
-        else:
-            new_config['config_file'] = config['config_file'].name
+        new_config[prop] = config[prop].name if isinstance(config[prop], Path) else config[prop]
 
     return new_config
 
@@ -148,9 +143,9 @@ class ConfigManager(object):
     def __init__(cls, config: dict = None, root_dir: Path = None) -> None:
         """
         Initializes the class with the provided configuration dictionary and root directory. If no
-        configuration or root directory is provided, it will use default values. Ensures the creation
-        of necessary directories as defined in the configuration. Handles reading and writing
-        of configuration files to the disk, effectively storing and retrieving configuration state.
+        configuration or root directory is provided, it will use default values. A saved configuration
+        file is read back; nothing is written, the configuration directory and file are created by
+        `save_config`.
 
         Args:
             config: Configuration dictionary containing parameters and paths for initialization.
@@ -165,17 +160,43 @@ class ConfigManager(object):
             config = default_config()
 
         config['config_dir'] = root_dir / config['config_dir']
-        if not config['config_dir'].exists():
-            config['config_dir'].mkdir(parents=True, exist_ok=True)
-
         config_file = config['config_dir'] / config["config_file"]
 
         # Read Configuration File, Continue
-        if config_file.exists() and config_file.is_file() and config_file.stat().st_size > 0:
-            cls.config = _enable_path_properties(loads(config_file.read_text()))
-        else:  # Save Current Config
+        try:
+            text = config_file.read_text()
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            text = ''
+        if text:
+            cls.config = _enable_path_properties(loads(text), root_dir)
+        else:
             cls.config = _enable_path_properties(config)
-            config_file.write_text(dumps(_disable_path_properties(cls.config)))
+
+    @classmethod
+    def save_config(cls, properties: Iterable[str] = None) -> Path:
+        """
+        Saves the configuration to its configuration file, atomically, so it is read back on the next
+        initialization. The configuration directory is created if needed, and a file that already holds
+        the same configuration is left untouched.
+
+        Args:
+            properties: Optional names of the properties to save, besides 'config_dir' and 'config_file',
+                        which are always saved. Defaults to all properties.
+
+        Returns:
+            Path to the configuration file.
+        """
+        config = {prop: value for prop, value in cls.config.items()
+                  if properties is None or prop in _path_parameters() or prop in properties}
+        config_file = cls.config['config_file']
+        text = dumps(_disable_path_properties(config))
+        if config_file.exists() and config_file.read_text() == text:
+            return config_file
+        config_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = config_file.parent / f'.{config_file.name}.tmp'
+        tmp_file.write_text(text)
+        tmp_file.replace(config_file)
+        return config_file
 
     # The Config Directory will be deleted when using program implements if this __del__ is implemented
     @classmethod
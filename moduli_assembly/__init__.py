@@ -1,18 +1,42 @@
-import importlib.metadata as importlib_metadata
+import os
 import shutil
 import subprocess
-import tempfile
+from contextvars import copy_context
 from datetime import datetime, timezone
-from logging import (INFO, basicConfig, getLogger)
+from json import (dumps, loads)
+from logging import getLogger
+from math import ceil
 from pathlib import PosixPath as Path
 from random import shuffle
+from threading import Lock
+from typing import (BinaryIO, Callable, Dict, List, Optional, Tuple)
 
 from config_manager import (ConfigManager)
+from moduli_assembly.history import (DEFAULT_SAFE_PRIMES_PER_RUN, RunHistory)
+from moduli_assembly.spool import (COMPRESSIONS, compress_command, compression_of, decompress_command,
+                                   open_candidates, run_pipeline)
+from moduli_assembly.trace import (annotate, charge, children_cpu, job_cost, metered, traced)
 
-basicConfig(level=INFO)
 logger = getLogger(__name__)
 
-__version__ = importlib_metadata.version('moduli_assembly')
+# Distance between the `-O start=` points of parallel `ssh-keygen -M generate` workers. ssh-keygen sieves a
+# window of about 2^25 numbers (more with `-O memory=`) above its start point, so windows never overlap.
+GENERATE_START_STRIDE = 1 << 64
+
+# Screening backends: `ssh-keygen -M screen`, or the in-process safe prime engine of `moduli_assembly.safe_primes`
+SCREENING_BACKENDS = ('ssh-keygen', 'native')
+
+
+def __getattr__(name: str) -> str:
+    """
+    `__version__` is read from the distribution metadata on first use only: importing `importlib.metadata` costs
+    more than the rest of the package, and most commands never need it.
+    """
+    if name == '__version__':
+        from importlib.metadata import version
+        globals()['__version__'] = version('moduli_assembly')
+        return globals()['__version__']
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def ISO_UTC_TIMESTAMP() -> str:
@@ -48,6 +72,7 @@ class ModuliAssembly(ConfigManager):
 
             version
         """
+        from moduli_assembly import __version__
 
         return __version__
 
@@ -57,8 +82,8 @@ class ModuliAssembly(ConfigManager):
 
         This constructor function initializes the class by setting up the configuration
         and operational directories. It ensures all required configuration attributes
-        are present, sets up the necessary paths for operational files, and creates missing
-        directories if needed.
+        are present and sets up the necessary paths for operational files. Nothing is
+        written: directories are created by `make_dirs`, once something is stored in them.
 
         Args:
 
@@ -83,13 +108,22 @@ class ModuliAssembly(ConfigManager):
 
         # Operational Config has 'moduli_dir' as a full path under the selected config dir
         self.config['moduli_dir'] = self.config['config_dir'] / Path(config['moduli_dir'])
-
-        self.config['moduli_dir'].mkdir(exist_ok=True)
         self.config['moduli_file'] = self.config['config_dir'] / Path(config['moduli_file'])
 
         self.config['auth_bitsizes'] = config['auth_bitsizes']
         self.config['generator_type'] = config['generator_type']
 
+    def make_dirs(self) -> None:
+        """
+        Creates the configuration and moduli directories, and saves the configuration file if there is none, the
+        first time anything is written to them. Read-only commands never call it.
+        """
+        if self.config['moduli_dir'].is_dir():
+            return
+        self.config['moduli_dir'].mkdir(parents=True, exist_ok=True)
+        if not self.config['config_file'].exists():
+            self.save_config(properties=tuple(default_config()) + ('tuning',))
+
     def create_checkpoint_filename(self, path: Path) -> Path:
         """Creates a checkpoint filename based on the provided path.
 
@@ -105,7 +139,9 @@ class ModuliAssembly(ConfigManager):
     def create_candidate_path(self, key_length: int):
         """
         Generates a candidate file path for a given key length and timestamp in the moduli directory
-        specified in the configuration. The candidate file is then created in the determined path.
+        specified in the configuration. The candidate file is then created in the determined path. With the
+        optional `candidate_compression` configuration attribute, one of COMPRESSIONS, the candidate file is
+        a compressed spool, named with the compression suffix.
 
         Args:
 
@@ -114,7 +150,9 @@ class ModuliAssembly(ConfigManager):
         Returns:
             The path of the candidate file as a Path object.
         """
-        candidate_path = self.config['moduli_dir'] / Path(f'{key_length}.candidate_{ISO_UTC_TIMESTAMP()}')
+        self.make_dirs()
+        suffix = COMPRESSIONS.get(self.config.get('candidate_compression'), '')
+        candidate_path = self.config['moduli_dir'] / Path(f'{key_length}.candidate_{ISO_UTC_TIMESTAMP()}{suffix}')
         candidate_path.touch()
         return candidate_path
 
@@ -123,7 +161,8 @@ class ModuliAssembly(ConfigManager):
         """
         Constructs a new file path by replacing the substring "candidate" in the
         file name with "screened". The directory of the given file path remains
-        unchanged in the new path.
+        unchanged in the new path. Screened files are never compressed, so the
+        suffix of a compressed candidate spool is dropped.
 
         Args:
             path: The original file path from which the directory and file
@@ -135,89 +174,970 @@ class ModuliAssembly(ConfigManager):
             replaced by "screened".
         """
 
-        return path.parent / Path(str(path.name).replace('candidate', 'screened'))
+        name = str(path.name).replace('candidate', 'screened')
+        compression = compression_of(path)
+        return path.parent / Path(name[:-len(COMPRESSIONS[compression])] if compression else name)
 
-    def screen_candidates(self, candidate_path: Path) -> Path:
+    @property
+    def history(self) -> RunHistory:
+        """
+        Returns:
+
+            Run history of generation and screening jobs, kept in the configuration directory
+        """
+        if '_history' not in self.__dict__:
+            self._history = RunHistory(self.config['config_dir'] / Path('.run_history'))
+        return self._history
+
+    @property
+    def store(self) -> 'ModuliStore':
+        """
+        Returns:
+
+            Indexed store of screened moduli, kept in the configuration directory
+        """
+        if '_store' not in self.__dict__:
+            from moduli_assembly.store import ModuliStore
+            self.make_dirs()
+            self._store = ModuliStore(self.config['config_dir'] / Path('moduli.db'))
+        return self._store
+
+    def tuning(self, key_length: int) -> dict:
+        """
+        Calibrated settings of a key length, saved by `save_tuning`.
+
+        Args:
+            key_length: Moduli key length.
+
+        Returns:
+            {'memory', 'jobs', 'shards', ...}, empty when the key length was never calibrated.
+        """
+        return self.config.get('tuning', {}).get(str(key_length), {})
+
+    def save_tuning(self, tuning: Dict[int, dict]) -> Path:
+        """
+        Saves calibrated settings per key length to the configuration file, where later runs pick them up.
+        Only the default configuration attributes and the tuning are saved, not per run settings.
+
+        Args:
+            tuning: {key_length: settings}, merged over any saved earlier.
+
+        Returns:
+            Path to the configuration file.
+        """
+        self.config['tuning'] = {**self.config.get('tuning', {}),
+                                 **{str(key_length): settings for key_length, settings in tuning.items()}}
+        return self.save_config(properties=tuple(default_config()) + ('tuning',))
+
+    @staticmethod
+    def key_length_of(path: Path) -> int:
+        """
+        Key length of a candidate or screened file, from its `NNNN.` name prefix.
+
+        Args:
+            path: Candidate or screened file.
+
+        Returns:
+            Key length
+        """
+        return int(path.name.split('.')[0])
+
+    @staticmethod
+    def count_lines(path: Path) -> int:
+        """
+        Counts the lines of a candidate or screened file, or the uncompressed lines of a candidate spool,
+        without loading it into memory.
+
+        Args:
+            path: File whose lines are counted.
+
+        Returns:
+            Number of newline terminated lines in the file.
+        """
+        count = 0
+        with open_candidates(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                count += chunk.count(b'\n')
+        return count
+
+    @staticmethod
+    def shard_ranges(line_count: int, shards: int) -> List[Tuple[int, int]]:
+        """
+        Splits `line_count` candidate lines into at most `shards` contiguous (start_line, lines) ranges,
+        suitable for ssh-keygen's `-O start-line=` and `-O lines=` options.
+
+        Args:
+            line_count: Number of lines in the candidate file.
+            shards: Requested number of shards.
+
+        Returns:
+            List of (start_line, lines) tuples covering every line exactly once.
+        """
+        if shards <= 0:
+            raise ValueError("shards must be a positive integer")
+
+        shards = max(1, min(shards, line_count))
+        size, extra = divmod(line_count, shards)
+        ranges, start = [], 0
+        for shard in range(shards):
+            lines = size + (1 if shard < extra else 0)
+            ranges.append((start, lines))
+            start += lines
+        return ranges
+
+    def create_shard_paths(self, candidate_path: Path, start_line: int, lines: int) -> Tuple[Path, Path]:
+        """
+        Names the screened output and checkpoint of one shard of a candidate file. The line range is
+        encoded in the name, so an interrupted sharded screening can be resumed with the same ranges.
+
+        Args:
+            candidate_path: Candidate file being screened.
+            start_line: First line (zero based) of the shard.
+            lines: Number of lines in the shard.
+
+        Returns:
+            (shard screened path, shard checkpoint path)
+        """
+        suffix = f'{start_line}+{lines}'
+        return (self.config['moduli_dir'] / Path(f'.{self.get_screened_path(candidate_path).name}.{suffix}'),
+                self.config['moduli_dir'] / Path(f'.{candidate_path.name}.{suffix}'))
+
+    def existing_shard_ranges(self, candidate_path: Path) -> List[Tuple[int, int]]:
+        """
+        Recovers the shard ranges of an interrupted sharded screening from its shard screened files.
+
+        Args:
+            candidate_path: Candidate file being screened.
+
+        Returns:
+            Sorted list of (start_line, lines) tuples, empty if the file was never screened in shards.
+        """
+        ranges = []
+        screened_name = self.get_screened_path(candidate_path).name
+        for shard_path in self.config['moduli_dir'].glob(f'.{screened_name}.*+*'):
+            start_line, lines = shard_path.name.rsplit('.', 1)[1].split('+')
+            ranges.append((int(start_line), int(lines)))
+        return sorted(ranges)
+
+    def screen_command(self, candidate_path: Path, screened_path: Path, checkpoint: Path,
+                       start_line: Optional[int] = None, lines: Optional[int] = None,
+                       generator: Optional[int] = None) -> List[str]:
+        """
+        Builds the `ssh-keygen -M screen` command line for a candidate file, or a line range of it. The executable
+        is the optional `ssh_keygen` configuration attribute, `ssh-keygen` on the PATH by default. A compressed
+        candidate spool is read from standard input, see `screen_pipeline`.
+
+        Args:
+            candidate_path: Candidate file to screen.
+            screened_path: Output file for safe primes found.
+            checkpoint: ssh-keygen checkpoint file.
+            start_line: Optional first line (zero based) to screen.
+            lines: Optional number of lines to screen.
+            generator: Optional generator, defaults to the `generator_type` configuration attribute.
+
+        Returns:
+            ssh-keygen argument list
+        """
+        command = [
+            self.config.get('ssh_keygen', 'ssh-keygen'),
+            '-M', 'screen',
+            '-O', f'generator={generator or self.config["generator_type"]}',
+            '-O', f'checkpoint={checkpoint}',
+        ]
+        if start_line:
+            command.extend(['-O', f'start-line={start_line}'])
+        if lines:
+            command.extend(['-O', f'lines={lines}'])
+        command.extend(['-f', '-' if compression_of(candidate_path) else str(candidate_path), str(screened_path)])
+        return command
+
+    def screen_pipeline(self, candidate_path: Path, screened_path: Path, checkpoint: Path,
+                        start_line: Optional[int] = None, lines: Optional[int] = None) -> List[List[str]]:
+        """
+        The `screen_command` of a candidate file, behind its decompressor when the file is a compressed spool,
+        so no decompressed copy is ever written. ssh-keygen skips to its checkpoint or start line on standard
+        input just as in a file.
+
+        Returns:
+            Argument lists for `run_pipeline`.
+        """
+        command = self.screen_command(candidate_path, screened_path, checkpoint, start_line, lines)
+        return [decompress_command(candidate_path), command] if compression_of(candidate_path) else [command]
+
+    def prefilter_candidates(self, candidate_path: Path) -> Path:
+        """Drops candidates without the configured generator from a candidate file before screening, and those
+        with a small prime factor in q or 2q+1 when the `prefilter_bound` configuration attribute is above
+        SSH_KEYGEN_SIEVE_BOUND: ssh-keygen has already sieved its candidates by every smaller prime.
+
+        Args:
+            candidate_path: Path to the file containing generated moduli.
+
+        Returns:
+            Path to the, rewritten, candidate file.
+        """
+        from moduli_assembly.prefilter import prefilter_file
+
+        stats = prefilter_file(candidate_path, bound=self.config.get('prefilter_bound') or 0,
+                               generator=self.config['generator_type'])
+        logger.info(f'Prefiltered {candidate_path}: kept {stats["kept"]} of {stats["candidates"]} candidates '
+                    f'in {stats["seconds"]:.1f} seconds')
+        return candidate_path
+
+    @traced('screen')
+    @metered()
+    def screen_candidates(self, candidate_path: Path, shards: int = None) -> Path:
         """Screens candidate moduli for safe primes.
 
+        The backend is selected by the optional `screening_backend` configuration attribute, one of
+        SCREENING_BACKENDS, and defaults to `ssh-keygen`. When the optional `prefilter_bound` configuration
+        attribute is set, the candidate file is first passed through `prefilter_candidates`.
+
         Args:
             candidate_path: Path to the file containing generated moduli.
+            shards: Number of line ranges screened in parallel, defaults to the calibrated setting, else 1. An
+                    interrupted sharded screening is always resumed with its original ranges. The native backend
+                    uses `shards` screening processes.
 
         Returns:
             Path to the screened moduli file.
 
         Raises:
+            ValueError: If the configured screening backend is unknown.
             RuntimeError: If screening fails.
         """
-        logger.info(f'Screening {candidate_path} for Safe Primes (generator={self.config["generator_type"]})')
+        backend = self.config.get('screening_backend', 'ssh-keygen')
+        if backend not in SCREENING_BACKENDS:
+            raise ValueError(f'Unknown screening backend: {backend}. Available: {SCREENING_BACKENDS}')
+
+        shards = shards or self.tuning(self.key_length_of(candidate_path)).get('shards', 1)
+        candidates = self.count_lines(candidate_path)
+        self.prefilter_unscreened(candidate_path)
+
+        if backend == 'native':
+            screened_path = self.screen_candidates_native(candidate_path, workers=shards)
+        elif shards > 1 or self.existing_shard_ranges(candidate_path):
+            screened_path = self.screen_candidates_sharded(candidate_path, shards)
+        else:
+            logger.info(f'Screening {candidate_path} for Safe Primes (generator={self.config["generator_type"]})')
+
+            try:
+                run_pipeline(self.screen_pipeline(candidate_path,
+                                                  self.get_screened_path(candidate_path),
+                                                  self.create_checkpoint_filename(candidate_path)))
+            except subprocess.CalledProcessError as e:
+                raise RuntimeError(
+                    f'Error screening candidates for {candidate_path.name.split(".")[0]} bit length: {e}')
+
+            if candidate_path.exists():
+                candidate_path.unlink()
+
+            screened_path = self.get_screened_path(candidate_path)
+
+        return self.record_screening(candidate_path, candidates, screened_path)
+
+    def prefilter_unscreened(self, candidate_path: Path) -> None:
+        """
+        Applies `prefilter_candidates` when the `prefilter_bound` configuration attribute is set, and screening
+        of the candidate file has not started: prefiltering renumbers the lines that checkpoints refer to.
+
+        Args:
+            candidate_path: Candidate file about to be screened.
+        """
+        if self.config.get('prefilter_bound') and not self.create_checkpoint_filename(candidate_path).exists() \
+                and not self.existing_shard_ranges(candidate_path):
+            self.prefilter_candidates(candidate_path)
+
+    def record_screening(self, candidate_path: Path, candidates: int, screened_path: Path) -> Path:
+        """
+        Records a completed screening job, with its cost if metered, in the run history and the moduli store.
+
+        Args:
+            candidate_path: Candidate file screened.
+            candidates: Candidate lines screened.
+            screened_path: Screened moduli file.
+
+        Returns:
+            screened_path
+        """
+        safe_primes = self.count_lines(screened_path)
+        self.history.record('screen', self.key_length_of(candidate_path),
+                            candidates=candidates, safe_primes=safe_primes, **job_cost())
+        annotate(key_length=self.key_length_of(candidate_path), candidates=candidates, safe_primes=safe_primes,
+                 screened_bytes=screened_path.stat().st_size)
+        self.store.ingest(screened_path)
+        return screened_path
+
+    def screen_candidates_native(self, candidate_path: Path, workers: int = 1) -> Path:
+        """Screens candidate moduli for safe primes with the in-process engine of `moduli_assembly.safe_primes`.
+
+        Miller-Rabin runs on both q and 2q+1 across a pool of `workers` processes, with the optional
+        `prime_tests` configuration attribute as the number of rounds. Output lines are byte compatible
+        with `ssh-keygen -M screen`, and the ssh-keygen checkpoint file is used for restarts.
+
+        Args:
+            candidate_path: Path to the file containing generated moduli.
+            workers: Number of screening processes.
+
+        Returns:
+            Path to the screened moduli file.
+        """
+        from moduli_assembly.safe_primes import (DEFAULT_PRIME_TESTS, screen_file)
+
+        logger.info(f'Screening {candidate_path} for Safe Primes with {workers} native workers '
+                    f'(generator={self.config["generator_type"]})')
+
+        # The worker processes are reaped with the pool: charge every child reaped meanwhile to this job
+        cpu_before = children_cpu()
+        stats = screen_file(candidate_path, self.get_screened_path(candidate_path),
+                            checkpoint=self.create_checkpoint_filename(candidate_path),
+                            generator=self.config['generator_type'],
+                            trials=self.config.get('prime_tests', DEFAULT_PRIME_TESTS),
+                            workers=workers)
+        charge(children_cpu() - cpu_before)
+        logger.info(f'Found {stats["safe_primes"]} safe primes of {stats["candidates"]} candidates in '
+                    f'{stats["seconds"]:.1f} seconds ({stats["candidates_per_second"]:.2f} candidates/second)')
+
+        if candidate_path.exists():
+            candidate_path.unlink()
+
+        return self.get_screened_path(candidate_path)
+
+    def screen_candidates_sharded(self, candidate_path: Path, shards: int) -> Path:
+        """Screens a candidate file as parallel line range shards, then merges the shards, in line order,
+        into the usual screened file.
+
+        Each shard is a separate `ssh-keygen -M screen` process with its own checkpoint, so the pool
+        keeps `shards` cores busy on a single bitsize.
+
+        Args:
+            candidate_path: Path to the file containing generated moduli.
+            shards: Number of line ranges screened in parallel.
+
+        Returns:
+            Path to the screened moduli file.
+
+        Raises:
+            RuntimeError: If screening of any shard fails.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        ranges = self.claim_shard_ranges(candidate_path, shards)
+
+        logger.info(f'Screening {candidate_path} for Safe Primes in {len(ranges)} shards '
+                    f'(generator={self.config["generator_type"]})')
+
+        def screen_shard(shard: Tuple[int, int]) -> None:
+            screened_path, checkpoint = self.create_shard_paths(candidate_path, *shard)
+            # ssh-keygen removes the checkpoint of a completed screening, so a missing one marks a finished shard
+            if not checkpoint.exists():
+                return
+            run_pipeline(self.screen_pipeline(candidate_path, screened_path, checkpoint, *shard))
+            checkpoint.unlink(missing_ok=True)
 
         try:
-            screen_command = [
-                'ssh-keygen',
-                '-M', 'screen',
-                '-O', f'generator={self.config["generator_type"]}',
-                '-O', f'checkpoint={self.create_checkpoint_filename(candidate_path)}',
-                '-f', str(candidate_path),
-                str(self.get_screened_path(candidate_path))
-            ]
-            subprocess.run(screen_command, text=True, check=True)
+            with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+                # Each shard in a copy of this context, to charge its ssh-keygen process to this job
+                for future in [pool.submit(copy_context().run, screen_shard, shard) for shard in ranges]:
+                    future.result()
         except subprocess.CalledProcessError as e:
             raise RuntimeError(f'Error screening candidates for {candidate_path.name.split(".")[0]} bit length: {e}')
 
+        return self.merge_shards(candidate_path, ranges)
+
+    def claim_shard_ranges(self, candidate_path: Path, shards: int) -> List[Tuple[int, int]]:
+        """
+        The shard ranges of a candidate file: those of an interrupted sharded screening, or new ones, claimed
+        with a shard screened file and checkpoint each, so an interruption resumes with the same ones.
+
+        Args:
+            candidate_path: Candidate file to screen.
+            shards: Number of line ranges for a new sharded screening.
+
+        Returns:
+            Sorted list of (start_line, lines) tuples.
+        """
+        ranges = self.existing_shard_ranges(candidate_path)
+        if not ranges:
+            ranges = self.shard_ranges(self.count_lines(candidate_path), shards)
+            for start_line, lines in ranges:
+                screened_path, checkpoint = self.create_shard_paths(candidate_path, start_line, lines)
+                screened_path.touch()
+                checkpoint.write_text(f'{start_line}\n')
+        return ranges
+
+    def merge_shards(self, candidate_path: Path, ranges: List[Tuple[int, int]]) -> Path:
+        """
+        Merges screened shards, in line order, into the usual screened file, then removes the shard files
+        and the candidate file.
+
+        Args:
+            candidate_path: Candidate file screened.
+            ranges: Shard ranges from `claim_shard_ranges`.
+
+        Returns:
+            Path to the screened moduli file.
+        """
+        screened_path = self.get_screened_path(candidate_path)
+        with screened_path.open('a') as dst:
+            for shard in ranges:
+                shard_path, _ = self.create_shard_paths(candidate_path, *shard)
+                if shard_path.exists():
+                    with shard_path.open('r') as src:
+                        shutil.copyfileobj(src, dst)
+
+        for shard in ranges:
+            for path in self.create_shard_paths(candidate_path, *shard):
+                path.unlink(missing_ok=True)
+
         if candidate_path.exists():
             candidate_path.unlink()
 
-        return self.get_screened_path(candidate_path)
+        return screened_path
+
+    @staticmethod
+    def generate_start_points(key_length: int, count: int) -> List[int]:
+        """
+        Picks `count` non-overlapping `-O start=` points for `ssh-keygen -M generate` runs of one key length.
+        The points are spaced GENERATE_START_STRIDE apart from a random base, so parallel workers sieve
+        disjoint candidate ranges.
+
+        Args:
+            key_length: Moduli key length.
+            count: Number of start points.
+
+        Returns:
+            Start points, as integers of key_length - 1 bits (the Sophie Germain candidate size).
+        """
+        # Top bit set, next bit clear: adding count strides can never overflow into another bit length
+        import secrets
+
+        base = (1 << (key_length - 2)) | secrets.randbits(key_length - 3)
+        return [base + (index * GENERATE_START_STRIDE) for index in range(count)]
+
+    def generate_command(self, key_length: int, output: Path, start: Optional[int] = None,
+                         memory: Optional[int] = None) -> List[str]:
+        """
+        Builds the `ssh-keygen -M generate` command line for one generation run. The executable is the optional
+        `ssh_keygen` configuration attribute, `ssh-keygen` on the PATH by default.
+
+        Args:
+            key_length: Moduli key length.
+            output: Output candidate file.
+            start: Optional sieve start point.
+            memory: Optional sieve memory in MB, `-O memory=`, defaults to the calibrated setting, if any; 0 leaves
+                ssh-keygen's default.
+
+        Returns:
+            ssh-keygen argument list
+        """
+        if memory is None:
+            memory = self.tuning(key_length).get('memory')
+        command = [
+            self.config.get('ssh_keygen', 'ssh-keygen'),
+            '-M', 'generate',
+            '-O', f'bits={key_length}',
+        ]
+        if memory:
+            command.extend(['-O', f'memory={memory}'])
+        if start:
+            command.extend(['-O', f'start={start:x}'])
+        command.append(str(output))
+        return command
+
+    def generate_pipeline(self, key_length: int, output: Path, start: Optional[int] = None,
+                          compression: Optional[str] = None) -> Tuple[List[List[str]], Optional[Path]]:
+        """
+        The `generate_command` of one generation run. When the output is a compressed spool, ssh-keygen writes
+        to standard output, through the compressor, so uncompressed candidates never reach the disk.
+
+        Args:
+            key_length: Moduli key length.
+            output: Output candidate file, or compressed spool.
+            start: Optional sieve start point.
+            compression: Compression of the output, defaults to that of its suffix.
+
+        Returns:
+            (argument lists, file receiving the pipeline output or None) for `run_pipeline`.
+        """
+        compression = compression or compression_of(output)
+        if not compression:
+            return [self.generate_command(key_length, output, start)], None
+        return [self.generate_command(key_length, Path('-'), start), compress_command(compression)], output
 
-    def generate_candidates(self, key_length: int, count: int) -> Path:
+    def create_generation_state_path(self, candidate_path: Path) -> Path:
+        """
+        Names the generation checkpoint of a candidate file, which exists while the file is being generated.
+
+        Args:
+            candidate_path: Candidate file being generated.
+
+        Returns:
+            Path to the generation checkpoint.
+        """
+        return self.config['moduli_dir'] / Path(f'.{candidate_path.name}.generate')
+
+    @traced('generate')
+    @metered()
+    def generate_candidates(self, key_length: int, count: int, jobs: int = None, candidate_path: Path = None) -> Path:
         """Generates candidate moduli files for the specified key length.
 
+        Each of the `count` ssh-keygen runs gets its own `-O start=` point. The start points, the runs
+        completed and the candidate file size after the last completed run are kept in a generation
+        checkpoint, so an interrupted generation resumes with only the runs it had not finished.
+
         Args:
             key_length: Maximum moduli key length.
             count: Number of moduli to generate.
+            jobs: Number of concurrent ssh-keygen generation workers, defaults to the calibrated setting, else 1.
+                  Each run has its own start point, so the workers never generate overlapping candidates.
+            candidate_path: Candidate file of an interrupted generation to resume, see
+                            `resume_candidate_generation`. Its checkpoint supplies the start points.
 
         Returns:
             Path to the candidate file.
 
         Raises:
-            ValueError: If key_length or count is invalid.
+            ValueError: If key_length, count or jobs is invalid.
             RuntimeError: If generation fails.
         """
-        if key_length <= 0 or count <= 0:
-            raise ValueError("key_length and count must be positive integers")
+        from concurrent.futures import ThreadPoolExecutor
 
-        logger.info(f'Generating candidate files for modulus size: {key_length}')
-        candidate_file = self.create_candidate_path(key_length)
+        if jobs is None:
+            jobs = self.tuning(key_length).get('jobs', 1)
+        if key_length <= 0 or count <= 0 or jobs <= 0:
+            raise ValueError("key_length, count and jobs must be positive integers")
+
+        candidate_file, state = self.begin_generation(key_length, count, candidate_path)
+        append_lock = Lock()
 
-        for _ in range(count):
+        def generate(run: int) -> None:
+            part = self.create_generation_part_path(candidate_file, run)
             try:
-                with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                    gen_command = [
-                        'ssh-keygen',
-                        '-M', 'generate',
-                        '-O', f'bits={key_length}',
-                        temp_file.name
-                    ]
-                    subprocess.run(gen_command, check=True, text=True)
-
-                    # Append temporary file content to candidate file
-                    with open(temp_file.name, 'r') as src, candidate_file.open('a') as dst:
-                        shutil.copyfileobj(src, dst)
+                run_pipeline(*self.generate_pipeline(key_length, part, int(state['starts'][run], 16),
+                                                     compression_of(candidate_file)))
+                with append_lock:
+                    self.append_generation_run(candidate_file, state, run, part)
 
             except subprocess.CalledProcessError as e:
                 raise RuntimeError(f'Error generating {key_length}-bit prime: {e}')
 
             finally:
-                if Path(temp_file.name).exists():
-                    Path(temp_file.name).unlink()
+                part.unlink(missing_ok=True)
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            # Each run in a copy of this context, to charge its ssh-keygen process to this job
+            for future in [pool.submit(copy_context().run, generate, run)
+                           for run in self.pending_generation_runs(state)]:
+                future.result()
 
-        return candidate_file
+        return self.finish_generation(candidate_file, state)
 
-    def create_moduli_file(self, f_path: Path = None) -> Path:
+    def begin_generation(self, key_length: int, count: int, candidate_path: Path = None) -> Tuple[Path, dict]:
+        """
+        Starts a candidate generation with a new candidate file and checkpoint, or reopens an interrupted one,
+        dropping any partial append of a run that never completed.
+
+        Args:
+            key_length: Moduli key length.
+            count: Number of ssh-keygen runs.
+            candidate_path: Candidate file of an interrupted generation to resume.
+
+        Returns:
+            (candidate file, generation state): 'key_length', 'starts' (hex start points), 'completed' (run
+            indexes) and 'size' (candidate file size after the last completed run).
+        """
+        if candidate_path:
+            state = loads(self.create_generation_state_path(candidate_path).read_text())
+            with candidate_path.open('r+b') as f:
+                f.truncate(state['size'])
+            logger.info(f'Resuming generation of {candidate_path}: {len(state["completed"])} of '
+                        f'{len(state["starts"])} runs complete')
+            return candidate_path, state
+
+        logger.info(f'Generating candidate files for modulus size: {key_length}')
+        candidate_file = self.create_candidate_path(key_length)
+        state = {'key_length': key_length,
+                 'starts': [f'{start:x}' for start in self.generate_start_points(key_length, count)],
+                 'completed': [], 'size': 0}
+        self._write_generation_state(self.create_generation_state_path(candidate_file), state)
+        return candidate_file, state
+
+    def create_generation_part_path(self, candidate_path: Path, run: int) -> Path:
+        """
+        Args:
+            candidate_path: Candidate file being generated.
+            run: Run index.
+
+        Returns:
+            Output file of one ssh-keygen generation run, appended to the candidate file once complete.
+        """
+        return self.config['moduli_dir'] / Path(f'.{candidate_path.name}.{run}.part')
+
+    @staticmethod
+    def pending_generation_runs(state: dict) -> List[int]:
+        """
+        Args:
+            state: Generation state from `begin_generation`.
+
+        Returns:
+            Indexes of the runs not yet completed.
+        """
+        return [run for run in range(len(state['starts'])) if run not in state['completed']]
+
+    def append_generation_run(self, candidate_path: Path, state: dict, run: int, part: Path) -> None:
+        """
+        Appends a completed run's candidates, then checkpoints the run as complete with the new file size.
+        Callers serialize appends to one candidate file. Compressed runs are appended as they are: gzip members
+        and zstd frames concatenate into a valid spool.
+
+        Args:
+            candidate_path: Candidate file being generated.
+            state: Generation state from `begin_generation`, updated in place.
+            run: Run index.
+            part: Run output file.
+        """
+        with part.open('rb') as src, candidate_path.open('ab') as dst:
+            shutil.copyfileobj(src, dst)
+            dst.flush()
+            state['size'] = dst.tell()
+        state['completed'].append(run)
+        self._write_generation_state(self.create_generation_state_path(candidate_path), state)
+
+    def finish_generation(self, candidate_path: Path, state: dict) -> Path:
+        """
+        Removes the generation checkpoint of a complete candidate file and records the job, with its cost if
+        metered.
+
+        Args:
+            candidate_path: Candidate file generated.
+            state: Generation state from `begin_generation`.
+
+        Returns:
+            Path to the candidate file.
+        """
+        self.create_generation_state_path(candidate_path).unlink()
+        candidates = self.count_lines(candidate_path)
+        self.history.record('generate', state['key_length'], runs=len(state['starts']), candidates=candidates,
+                            **job_cost())
+        annotate(key_length=state['key_length'], runs=len(state['starts']), candidates=candidates,
+                 candidate_bytes=candidate_path.stat().st_size)
+        return candidate_path
+
+    @staticmethod
+    def _write_generation_state(state_path: Path, state: dict) -> None:
+        tmp = state_path.parent / Path(f'{state_path.name}.tmp')
+        with tmp.open('w') as f:
+            f.write(dumps(state))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, state_path)
+
+    def resume_candidate_generation(self, jobs: int = None) -> List[Path]:
+        """
+        Resumes every interrupted candidate generation found in the moduli directory.
+
+        Args:
+            jobs: Number of concurrent ssh-keygen generation workers per candidate file.
+
+        Returns:
+            Paths to the completed candidate files.
+        """
+        resumed = []
+        for candidate_path in sorted(self.config['moduli_dir'].glob('????.candidate*')):
+            state_path = self.create_generation_state_path(candidate_path)
+            if state_path.exists():
+                state = loads(state_path.read_text())
+                resumed.append(self.generate_candidates(state['key_length'], len(state['starts']), jobs,
+                                                        candidate_path=candidate_path))
+        return resumed
+
+    def is_generating(self, candidate_path: Path) -> bool:
+        """
+        Args:
+            candidate_path: Candidate file.
+
+        Returns:
+            True while the candidate file's generation is incomplete.
+        """
+        return self.create_generation_state_path(candidate_path).exists()
+
+    def pipeline_candidates(self, jobs: List[Tuple[int, int]], generators: int = 1, screeners: int = 1,
+                            shards: int = None, on_candidate: Callable[[Path], None] = None,
+                            generate_jobs: int = None) -> List[Path]:
+        """Generates and screens candidate files as a two stage pipeline.
+
+        Each candidate file is handed to the screening pool as soon as its generation finishes, while
+        generation of the remaining jobs continues, so total time approaches the longest stage rather
+        than the sum of both. Generation jobs go out longest first: largest key length first.
+
+        Args:
+            jobs: (key_length, count) generation jobs, as passed to `generate_candidates`.
+            generators: Maximum number of concurrent generation jobs.
+            screeners: Maximum number of concurrent screening jobs.
+            shards: Number of line range shards per screening job.
+            on_candidate: Optional callback, called with each candidate file as it enters screening.
+            generate_jobs: Number of ssh-keygen workers within each generation job.
+
+        Returns:
+            Paths to the screened moduli files, in order of generation completion.
+
+        Raises:
+            ValueError: If generators or screeners is not positive.
+            RuntimeError: If generation or screening fails.
+        """
+        from concurrent.futures import (ThreadPoolExecutor, as_completed)
+
+        if generators <= 0 or screeners <= 0:
+            raise ValueError("generators and screeners must be positive integers")
+
+        with ThreadPoolExecutor(max_workers=generators) as gen_pool, \
+                ThreadPoolExecutor(max_workers=screeners) as screen_pool:
+            generating = [gen_pool.submit(self.generate_candidates, key_length, count, generate_jobs)
+                          for key_length, count in sorted(jobs, key=lambda job: job[0], reverse=True)]
+            screening = []
+            try:
+                for future in as_completed(generating):
+                    candidate = future.result()
+                    if on_candidate:
+                        on_candidate(candidate)
+                    screening.append(screen_pool.submit(self.screen_candidates, candidate, shards))
+                return [future.result() for future in screening]
+            except Exception:
+                for future in generating + screening:
+                    future.cancel()
+                raise
+
+    def screened_counts(self) -> Dict[int, int]:
+        """
+        Counts the safe primes already screened, per key length.
+
+        Returns:
+            {key_length: safe primes in `NNNN.screened*` files}
+        """
+        counts: Dict[int, int] = {}
+        for screened in self.config['moduli_dir'].glob('????.screened*'):
+            key_length = self.key_length_of(screened)
+            counts[key_length] = counts.get(key_length, 0) + self.count_lines(screened)
+        return counts
+
+    def plan_quota(self, quota: Dict[int, int], have: Dict[int, int] = None) -> Dict[int, int]:
+        """
+        Sizes the generation needed to reach a quota of safe primes per key length, from the screening
+        yield recorded in the run history. Key lengths without history use DEFAULT_SAFE_PRIMES_PER_RUN.
+
+        Args:
+            quota: {key_length: target number of safe primes}
+            have: {key_length: safe primes already held}, defaults to `screened_counts()`.
+
+        Returns:
+            {key_length: ssh-keygen generation runs needed}, zero for a quota already met.
+        """
+        model = self.history.yield_model()
+        have = self.screened_counts() if have is None else have
+        plan = {}
+        for key_length, target in quota.items():
+            shortfall = target - have.get(key_length, 0)
+            per_run = model.get(key_length, {}).get('safe_primes_per_run') or DEFAULT_SAFE_PRIMES_PER_RUN
+            plan[key_length] = max(0, ceil(shortfall / per_run))
+        return plan
+
+    @metered()
+    def screen_candidates_until(self, candidate_path: Path, needed: int) -> int:
+        """
+        Screens a candidate file in consecutive line range chunks with ssh-keygen, stopping as soon as
+        `needed` safe primes are found. The unscreened rest of the candidate file is discarded.
+
+        Args:
+            candidate_path: Path to the file containing generated moduli.
+            needed: Number of safe primes wanted.
+
+        Returns:
+            Number of safe primes found.
+
+        Raises:
+            RuntimeError: If screening fails.
+        """
+        key_length = self.key_length_of(candidate_path)
+        if self.config.get('prefilter_bound') and not self.create_checkpoint_filename(candidate_path).exists():
+            self.prefilter_candidates(candidate_path)
+
+        total = self.count_lines(candidate_path)
+        screened_path = self.get_screened_path(candidate_path)
+        checkpoint = self.create_checkpoint_filename(candidate_path)
+        per_candidate = self.history.yield_model().get(key_length, {}).get('safe_primes_per_candidate')
+        # Screen about a quarter of the expected need per chunk, to stop close to the quota
+        chunk = max(64, ceil(needed / per_candidate / 4)) if per_candidate else max(64, total // 8)
+
+        logger.info(f'Screening {candidate_path} for {needed} Safe Primes in chunks of {chunk} lines')
+        start_line = int(checkpoint.read_text().split()[0]) if checkpoint.exists() else 0
+        found = self.count_lines(screened_path) if screened_path.exists() else 0
+        while found < needed and start_line < total:
+            lines = min(chunk, total - start_line)
+            try:
+                run_pipeline(self.screen_pipeline(candidate_path, screened_path, checkpoint, start_line, lines))
+            except subprocess.CalledProcessError as e:
+                raise RuntimeError(f'Error screening candidates for {key_length} bit length: {e}')
+            start_line += lines
+            checkpoint.write_text(f'{start_line}\n')
+            found = self.count_lines(screened_path)
+
+        checkpoint.unlink(missing_ok=True)
+        candidate_path.unlink(missing_ok=True)
+        self.history.record('screen', key_length, candidates=start_line, safe_primes=found, **job_cost())
+        if screened_path.exists():
+            self.store.ingest(screened_path)
+        return found
+
+    def produce_quota(self, quota: Dict[int, int], generate_jobs: int = None, generators: int = 1,
+                      max_rounds: int = 8) -> Dict[int, int]:
+        """
+        Generates and screens until every key length holds its quota of safe primes. Each round sizes
+        generation with `plan_quota`, and screening of a key length stops as soon as its quota is met, so
+        no work goes into surplus moduli of one key length while another is short.
+
+        Args:
+            quota: {key_length: target number of safe primes}
+            generate_jobs: Number of ssh-keygen workers within each generation job.
+            generators: Number of key lengths produced concurrently.
+            max_rounds: Maximum generate and screen rounds per key length.
+
+        Returns:
+            {key_length: safe primes screened}
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        def produce(key_length: int) -> None:
+            for _ in range(max_rounds):
+                runs = self.plan_quota({key_length: quota[key_length]})[key_length]
+                if not runs:
+                    return
+                logger.info(f'Quota {quota[key_length]} for {key_length}: generating {runs} runs')
+                candidate = self.generate_candidates(key_length, runs, generate_jobs)
+                self.screen_candidates_until(candidate, quota[key_length] - self.screened_counts().get(key_length, 0))
+            logger.warning(f'Quota {quota[key_length]} for {key_length} not met after {max_rounds} rounds')
+
+        with ThreadPoolExecutor(max_workers=generators) as pool:
+            list(pool.map(produce, sorted(quota, reverse=True)))
+
+        return self.screened_counts()
+
+    @staticmethod
+    def file_signature(path: Path, digest: bool = True) -> dict:
+        """
+        Size, mtime and, optionally, SHA-256 of a file, as recorded in a moduli file manifest.
+
+        Args:
+            path: File to sign.
+            digest: Include the SHA-256 hex digest, read in chunks.
+
+        Returns:
+            {'size', 'mtime'[, 'sha256']}
+        """
+        stat = path.stat()
+        signature = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        if digest:
+            import hashlib
+            sha256 = hashlib.sha256()
+            with path.open('rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    sha256.update(chunk)
+            signature['sha256'] = sha256.hexdigest()
+        return signature
+
+    @staticmethod
+    def get_manifest_path(f_path: Path) -> Path:
+        """
+        The manifest of a moduli file: the screened files merged into its current version.
+
+        Args:
+            f_path: Moduli file (symlink) path.
+
+        Returns:
+            Manifest path, a hidden file next to the moduli file.
+        """
+        return f_path.parent / Path(f'.{f_path.name}.manifest')
+
+    def _unchanged_manifest(self, f_path: Path) -> Optional[dict]:
+        """
+        Loads the manifest of a moduli file, if its previous version and every screened file merged into it
+        are still unchanged. A changed size or mtime falls back to comparing SHA-256.
+
+        Returns:
+            The manifest, or None when the moduli file has to be assembled from scratch.
+        """
+        manifest_path = self.get_manifest_path(f_path)
+        if not manifest_path.exists():
+            return None
+
+        manifest = loads(manifest_path.read_text())
+        if not Path(manifest['moduli_file']).exists():
+            return None
+
+        for name, signature in manifest['files'].items():
+            path = self.config['moduli_dir'] / Path(name)
+            if not path.exists():
+                return None
+            current = self.file_signature(path, digest=False)
+            if (current['size'], current['mtime']) != (signature['size'], signature['mtime']):
+                if current['size'] != signature['size'] or \
+                        self.file_signature(path)['sha256'] != signature['sha256']:
+                    return None
+        return manifest
+
+    def _publish_moduli_file(self, f_path: Path, write_body: Callable[[BinaryIO], None]) -> Path:
+        """
+        Writes a new timestamped version of a moduli file: header, then `write_body`, to a temporary file
+        that is fsynced and renamed into place. Only then is `f_path` atomically linked to the new version.
+
+        Args:
+            f_path: Path to the moduli file (symlink).
+            write_body: Writes the moduli lines to the binary file it is given.
+
+        Returns:
+            Path to the new version.
+        """
+        self.make_dirs()
+        ts = ISO_UTC_TIMESTAMP()
+        ts_name = f"{f_path.absolute()}_{ts}"
+        path = Path(ts_name)
+        temp_path = path.parent / Path(f'.{path.name}.tmp')
+
+        with temp_path.open('wb') as dst:
+            dst.write(f'#/etc/ssh/moduli: creation_date: moduli_assembly: {ts}\n'.encode())
+            write_body(dst)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(temp_path, path)
+
+        # Point the moduli file at the complete new version, atomically
+        temp_link = f_path.parent / Path(f'.{f_path.name}.link')
+        temp_link.unlink(missing_ok=True)
+        temp_link.symlink_to(path)
+        os.replace(temp_link, f_path)
+
+        annotate(moduli_bytes=path.stat().st_size)
+        return path
+
+    @traced('create_moduli_file')
+    def create_moduli_file(self, f_path: Path = None, from_store: bool = False, per_bitsize: int = None) -> Path:
         """Creates a moduli file by combining screened moduli.
 
+        Assembly is incremental: a manifest next to the moduli file records the screened files merged
+        into its current version (size, mtime, SHA-256). While those are unchanged, the new version is the
+        previous body, copied in the kernel where possible, plus the lines of the new screened files only.
+        Screened files are streamed one at a time, each shuffled, and the new version is written to a
+        temporary file, renamed into place, and only then linked from `f_path`.
+
+        With `from_store`, the moduli are instead selected from the indexed store, deduplicated across runs,
+        with one query.
+
+        With `per_bitsize`, the moduli file is a balanced selection of that many moduli per bitsize, drawn
+        uniformly at random; see `create_balanced_moduli_file`.
+
         Args:
             f_path: Path to the moduli file. Defaults to the configured moduli file.
+            from_store: Select the moduli from the store rather than the screened files.
+            per_bitsize: Optional number of moduli per bitsize.
 
         Returns:
             Path to the created moduli file.
@@ -225,33 +1145,248 @@ class ModuliAssembly(ConfigManager):
         if not f_path:
             f_path = self.config['config_dir'] / self.config['moduli_file']
 
-        ts = ISO_UTC_TIMESTAMP()
-        ts_name = f"{f_path.absolute()}_{ts}"
-        path = Path(ts_name)
-        path.touch()
+        if per_bitsize:
+            return self.create_balanced_moduli_file(per_bitsize, f_path, from_store)
+
+        if from_store:
+            self.ingest_screened_files()
+            return self._publish_moduli_file(f_path, lambda dst: dst.writelines(
+                line.encode() for line in self.store.select(generator=self.config['generator_type'])))
+
+        manifest = self._unchanged_manifest(f_path)
+        merged = manifest['files'] if manifest else {}
+        moduli_files = [modulus_file for modulus_file in sorted(self.config['moduli_dir'].glob('????.screened*'))
+                        if modulus_file.name not in merged]
+
+        def write_body(dst: BinaryIO) -> None:
+            if manifest:
+                with Path(manifest['moduli_file']).open('rb') as src:
+                    src.readline()  # Previous header
+                    self._copy_file_range(src, dst)
+
+            for modulus_file in moduli_files:
+                lines = [line for line in modulus_file.read_text().split('\n') if line]
+                shuffle(lines)
+                dst.writelines(f'{line}\n'.encode() for line in lines)
+
+        path = self._publish_moduli_file(f_path, write_body)
+
+        merged.update({modulus_file.name: self.file_signature(modulus_file) for modulus_file in moduli_files})
+        manifest_path = self.get_manifest_path(f_path)
+        temp_manifest = manifest_path.parent / Path(f'{manifest_path.name}.tmp')
+        temp_manifest.write_text(dumps({'moduli_file': str(path), 'files': merged}))
+        os.replace(temp_manifest, manifest_path)
+
+        return path
+
+    def create_balanced_moduli_file(self, per_bitsize: int, f_path: Path = None, from_store: bool = False) -> Path:
+        """Creates a moduli file of `per_bitsize` moduli per bitsize, selected uniformly at random.
+
+        Screened files are streamed line by line through a reservoir per bitsize, driven by a generator seeded
+        from the operating system CSPRNG, so memory is bounded by the output size however large the pool
+        grows. A bitsize holding fewer moduli contributes all it has. The selection is new every time, so the
+        manifest of incremental assembly is dropped.
+
+        Args:
+            per_bitsize: Moduli per bitsize.
+            f_path: Path to the moduli file. Defaults to the configured moduli file.
+            from_store: Select the moduli from the store, deduplicated, rather than the screened files.
+
+        Returns:
+            Path to the created moduli file.
+
+        Raises:
+            ValueError: If per_bitsize is not positive.
+        """
+        from moduli_assembly.reservoir import sample_moduli_files
+
+        if per_bitsize <= 0:
+            raise ValueError("per_bitsize must be a positive integer")
+        if not f_path:
+            f_path = self.config['config_dir'] / self.config['moduli_file']
 
-        if f_path.exists():
-            f_path.unlink(missing_ok=True)
-        f_path.symlink_to(path)
+        if from_store:
+            self.ingest_screened_files()
+            path = self._publish_moduli_file(f_path, lambda dst: dst.writelines(
+                line.encode() for line in self.store.select(generator=self.config['generator_type'],
+                                                            limit_per_size=per_bitsize)))
+        else:
+            reservoirs = sample_moduli_files(sorted(self.config['moduli_dir'].glob('????.screened*')), per_bitsize)
+            for size, reservoir in sorted(reservoirs.items()):
+                if reservoir.seen < per_bitsize:
+                    logger.warning(f'Only {reservoir.seen} of {per_bitsize} moduli of bitsize {size + 1} available')
 
-        moduli_files = sorted(self.config['moduli_dir'].glob('????.screened*'))
-        content = [f'#/etc/ssh/moduli: creation_date: moduli_assembly: {ts}']
+            def write_body(dst: BinaryIO) -> None:
+                for _, reservoir in sorted(reservoirs.items()):
+                    dst.writelines(line.encode() for line in reservoir.sample())
 
-        for modulus_file in moduli_files:
-            lines = modulus_file.read_text().strip().split('\n')
-            shuffle(lines)
-            content.extend(lines)
+            path = self._publish_moduli_file(f_path, write_body)
 
-        path.write_text('\n'.join(content))
+        self.get_manifest_path(f_path).unlink(missing_ok=True)
         return path
 
-    def restart_candidate_screening(self):
+    def bundle_moduli_file(self, bundle_dir: Path = None, f_path: Path = None) -> dict:
+        """
+        Writes the moduli file as the next version of a distribution bundle, with a delta from the previous
+        version, for `moduli_assembly.bundle.apply_bundles` on each host.
+
+        Args:
+            bundle_dir: Bundle directory, defaults to `bundles` in the configuration directory.
+            f_path: Moduli file, defaults to the configured moduli file.
+
+        Returns:
+            See `moduli_assembly.bundle.create_bundle`.
+        """
+        from moduli_assembly.bundle import create_bundle
+
+        return create_bundle((f_path or self.config['moduli_file']).resolve(),
+                             bundle_dir or self.config['config_dir'] / Path('bundles'))
+
+    def pack_moduli_file(self, pack_path: Path = None, f_path: Path = None) -> Dict[int, int]:
+        """
+        Writes the moduli file as a binary pack, for `moduli_assembly.pack.ModuliPack`.
+
+        Args:
+            pack_path: Pack file, defaults to the moduli file with a `.pack` suffix.
+            f_path: Moduli file, defaults to the configured moduli file.
+
+        Returns:
+            {bitsize: moduli packed}
+
+        Raises:
+            ValueError: If a moduli line cannot be packed.
+        """
+        from moduli_assembly.pack import write_pack
+
+        f_path = (f_path or self.config['moduli_file']).resolve()
+        with f_path.open('r') as f:
+            return write_pack(f, pack_path or f_path.with_name(f'{f_path.name}.pack'))
+
+    def ingest_screened_files(self) -> int:
+        """
+        Ingests every screened file into the store. Files already ingested, unchanged, are skipped.
+
+        Returns:
+            Number of new moduli stored.
+        """
+        return sum(self.store.ingest(screened) for screened in sorted(self.config['moduli_dir'].glob('????.screened*')))
+
+    @staticmethod
+    def _copy_file_range(src, dst) -> None:
+        """
+        Copies the rest of `src`, from its current position, to the end of `dst`. Uses copy_file_range(2),
+        which copies inside the kernel (or shares extents on a reflink filesystem), when available.
+        """
+        dst.flush()
+        if hasattr(os, 'copy_file_range'):
+            offset = src.tell()
+            try:
+                while True:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), 1 << 30, offset)
+                    if not copied:
+                        break
+                    offset += copied
+                dst.seek(0, os.SEEK_END)
+                return
+            except OSError:
+                src.seek(offset)
+                dst.seek(0, os.SEEK_END)
+        shutil.copyfileobj(src, dst, 1 << 20)
+
+    def verify_moduli_file(self, f_path: Path = None, workers: int = None, fail_fast: bool = False) -> dict:
+        """
+        Independently re-verifies a moduli file: every line must be a safe prime with its stated size and
+        generator. Lines are streamed and checked across a pool of processes.
+
+        Args:
+            f_path: Moduli file to verify. Defaults to the configured moduli file.
+            workers: Number of verification processes, defaults to the number of CPUs.
+            fail_fast: Stop at the first failure.
+
+        Returns:
+            Verification report, see `moduli_assembly.verify.verify_file`.
+        """
+        from moduli_assembly.safe_primes import DEFAULT_PRIME_TESTS
+        from moduli_assembly.verify import verify_file
+
+        if not f_path:
+            f_path = self.config['moduli_file']
+
+        logger.info(f'Verifying {f_path}')
+        return verify_file(f_path, trials=self.config.get('prime_tests', DEFAULT_PRIME_TESTS), workers=workers,
+                           fail_fast=fail_fast)
+
+    def screening_progress(self, keep_samples: bool = False) -> dict:
         """
-        Restart Screening of Any Interrupted Screening of Candidate Modulus Files
+        Reports the progress of every candidate file in the moduli directory from its screening checkpoints,
+        one per file or one per shard. Rates are estimated from the lines screened between the candidate file's
+        modification and the last checkpoint write. Nothing is written, unless `keep_samples` is set.
 
+        Args:
+            keep_samples: Keep the checkpoint readings, and line counts, in `config_dir/.progress`, so rates are
+                measured between the checkpoint writes seen by successive calls.
+
+        Returns:
+            'timestamp', 'files' ([{'file', 'key_length', 'lines', 'done', 'percent', 'lines_per_second',
+            'eta_seconds', 'checkpoint_age_seconds'}]) and 'bitsizes' ({key_length: totals}).
+        """
+        from moduli_assembly.progress import (ProgressSamples, estimate, read_checkpoint, summarize)
+
+        now = datetime.now(tz=timezone.utc).timestamp()
+        samples = ProgressSamples(self.config['config_dir'] / '.progress') if keep_samples else None
+        files = []
+        for candidate_path in sorted(self.config['moduli_dir'].glob('????.candidate*')):
+            if self.is_generating(candidate_path):
+                continue
+            try:
+                stat = candidate_path.stat()
+            except FileNotFoundError:
+                continue
+            sample = samples.get(candidate_path.name) if samples else {}
+            if sample.get('signature') != [stat.st_size, stat.st_mtime_ns]:
+                sample = {'signature': [stat.st_size, stat.st_mtime_ns], 'lines': self.count_lines(candidate_path)}
+            lines = sample['lines']
+
+            # A sharded screening has one checkpoint per line range, removed as each range completes
+            ranges = self.existing_shard_ranges(candidate_path)
+            readings = [(start_line, range_lines, read_checkpoint(self.create_shard_paths(candidate_path,
+                                                                                          start_line,
+                                                                                          range_lines)[1]))
+                        for start_line, range_lines in ranges] or \
+                       [(0, lines, read_checkpoint(self.create_checkpoint_filename(candidate_path)))]
+            done, updated = 0, None
+            for start_line, range_lines, reading in readings:
+                if reading is None:
+                    done += range_lines if ranges else 0
+                    continue
+                done += min(range_lines, max(0, reading[0] - start_line))
+                updated = max(updated or 0.0, reading[1])
+
+            record = estimate(lines, done, updated, sample.get('previous', {}), stat.st_mtime, now)
+            record.update(file=candidate_path.name, key_length=self.key_length_of(candidate_path))
+            files.append(record)
+            if samples:
+                if updated is not None and updated != sample.get('previous', {}).get('updated'):
+                    sample['previous'] = {'done': done, 'updated': updated}
+                samples.update(candidate_path.name, **sample)
+
+        # Nothing to save, or drop, leaves the configuration directory untouched
+        if samples and (files or samples.samples):
+            samples.save([record['file'] for record in files])
+        return {'timestamp': now, 'files': files, 'bitsizes': summarize(files)}
+
+    def restart_candidate_screening(self, shards: int = None, jobs: int = None):
+        """
+        Restart Screening of Any Interrupted Screening of Candidate Modulus Files, after completing any
+        interrupted generation of them
+
+        Args:
+            shards: Number of parallel shards for candidate files not yet screened in shards.
+            jobs: Number of ssh-keygen workers resuming each interrupted candidate generation.
         """
+        self.resume_candidate_generation(jobs=jobs)
         for modulus_file in [moduli for moduli in self.config['moduli_dir'].glob('????.candidate*')]:
-            self.screen_candidates(candidate_path=modulus_file)
+            self.screen_candidates(candidate_path=modulus_file, shards=shards)
 
     def clear_artifacts(self) -> None:
         """
@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 
 import argparse
+from json import loads
+from logging import (INFO, basicConfig)
 from pathlib import Path
-from typing import (Dict, List, Optional)
+from typing import (Dict, List, Tuple)
 
-from moduli_assembly import ModuliAssembly  # Assuming this is correct, adjust if necessary
-from moduli_assembly.scripts.moduli_infile import moduli_infile
+from moduli_assembly import (COMPRESSIONS, SCREENING_BACKENDS, ModuliAssembly)
 
 
 def cl_args() -> argparse.ArgumentParser:
@@ -22,17 +23,45 @@ def cl_args() -> argparse.ArgumentParser:
     # Moduli Generation Functions
 
     me_group.add_argument('-C', '--remove-config-dir', action='store_true', help='Delete configuration directory.')
-    me_group.add_argument('-D', '--moduli-distribution', action='store_true',
-                          help='Print frequency distribution of the given moduli file.')
+    me_group.add_argument('-D', '--moduli-distribution', nargs='*', type=Path, default=None,
+                          help='Print frequency distribution of the given moduli files, default=MODULI_FILE')
     me_group.add_argument('-M', '--display-moduli-frequencies', action='store_true',
-                          help='Show Production Stats of moduli_assembly')
+                          help='Show production statistics from the run history: yield, throughput and CPU per '
+                               'safe prime, per bitsize and --period')
     me_group.add_argument('-a', '--all', action='store_true', help='Generate moduli for all supported it sizes')
     me_group.add_argument('-b', '--bitsizes', nargs='*', type=int, help='Space-delimited list of modulus sizes')
     me_group.add_argument('-r', '--restart', action='store_true',
-                          help='Restart interrupted moduli screening. Ignores `-b, -a, -all')
+                          help='Restart interrupted moduli generation and screening. Ignores `-b, -a, -all')
 
     me_group.add_argument('-w', '--generate-moduli-file', action='store_true',
                           help='Write moduli to .moduli/MODULI_FILE from current screened files and exit.')
+    me_group.add_argument('--status', action='store_true',
+                          help='Report screening progress, rate and ETA per candidate file and bitsize.')
+    me_group.add_argument('--store-counts', action='store_true',
+                          help='Ingest screened files into the moduli store and print its moduli count per size.')
+    me_group.add_argument('--verify', nargs='?', type=Path, const=True, default=None,
+                          help='Verify every modulus of a moduli file is a safe prime, default=MODULI_FILE')
+    me_group.add_argument('--worker', type=str, default=None, metavar='URL',
+                          help='Run jobs for the coordinator at URL, e.g. http://builder-1:8080, until it is done')
+    me_group.add_argument('--bundle', nargs='?', type=Path, const=True, default=None, metavar='DIR',
+                          help='Write MODULI_FILE as the next bundle version, with a delta from the previous one, '
+                               'default=${CONFIG_DIR}/bundles')
+    me_group.add_argument('--apply', nargs='+', type=Path, default=None, metavar='BUNDLE',
+                          help='Update --target to a bundle version, from a bundle or deltas, atomically')
+    me_group.add_argument('--daemon', nargs='*', type=int, default=None, metavar='BITSIZE',
+                          help='Keep a pool of at least --low-water moduli per bitsize, and serve balanced moduli '
+                               'files from it on --socket, until SIGTERM, default=all supported bitsizes')
+    me_group.add_argument('--fetch', type=Path, default=None, metavar='FILE',
+                          help='Write a fresh balanced moduli file of -n moduli per bitsize kept by --daemon to '
+                               'FILE, atomically, default -n 40')
+    me_group.add_argument('--pack', nargs='?', type=Path, const=True, default=None, metavar='PACK',
+                          help='Write MODULI_FILE as a binary pack, indexed by bitsize, default=MODULI_FILE.pack')
+    me_group.add_argument('--unpack', type=Path, default=None, metavar='PACK',
+                          help='Print a binary pack as a moduli file')
+    me_group.add_argument('--calibrate', nargs='*', type=int, default=None, metavar='BITSIZE',
+                          help='Benchmark ssh-keygen settings per bitsize on this host and save the fastest to the '
+                               'configuration file, default=all supported bitsizes. Each trial is a full '
+                               'ssh-keygen run, stopped after --timeout seconds, default=600')
     me_group.add_argument('-x', '--export-config', action='store_true', help="Print running configuration.")
 
     # Universal parameters - Available to all functions above
@@ -41,27 +70,171 @@ def cl_args() -> argparse.ArgumentParser:
     parser.add_argument('-f', '--config-file', default=Path.home() / '.moduli_assembly' / 'config_file', type=Path,
                         help='Select Moduli File Path, default=$HOME/.moduli_assembly/config_file')
     parser.add_argument('-m', '--moduli-dir', default=Path.home() / '.moduli', type=Path, )
+    parser.add_argument('-s', '--shards', default=None, type=int,
+                        help='Screen each candidate file as SHARDS parallel line ranges, default=calibrated, else 1')
+    parser.add_argument('-j', '--jobs', default=None, type=int,
+                        help='Run JOBS ssh-keygen generation workers per candidate file, default=calibrated, else 1')
+    parser.add_argument('-q', '--quota', type=int, default=None,
+                        help='With -a or -b, produce QUOTA safe primes per bitsize, sized from the recorded yield')
+    parser.add_argument('--generators', default=1, type=int,
+                        help='Maximum concurrent candidate generation jobs, default=1')
+    parser.add_argument('--screeners', default=1, type=int,
+                        help='Maximum concurrent candidate screening jobs, default=1')
+    parser.add_argument('--asyncio', action='store_true',
+                        help='Drive ssh-keygen from one asyncio controller; --generators and --screeners then bound '
+                             'the concurrent ssh-keygen processes of each stage')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='With --asyncio or --calibrate, seconds allowed for each ssh-keygen process')
+    parser.add_argument('--share-host', action='store_true',
+                        help='As --asyncio, with --generators and --screeners fitted to the idle CPUs of the host, '
+                             'within its cgroup CPU quota, and screening paused while the host is busy')
+    parser.add_argument('--nice', type=int, default=15,
+                        help='With --share-host, niceness increment of every ssh-keygen process, default=15')
+    parser.add_argument('--ionice', choices=('idle', 'best-effort', 'none'), default='idle',
+                        help='With --share-host, I/O scheduling class of every ssh-keygen process, default=idle')
+    parser.add_argument('--coordinate', type=str, default=None, metavar='[HOST:]PORT',
+                        help='With -a, -b or -r, hand generation and screening jobs to --worker processes over HTTP, '
+                             'on 127.0.0.1 unless HOST is given, which requires --token')
+    parser.add_argument('--lease', type=float, default=600.0,
+                        help='With --coordinate, seconds before a job of an unresponsive worker is reassigned')
+    parser.add_argument('--token', type=str, default=None,
+                        help='Shared secret between --coordinate and --worker processes')
+    parser.add_argument('--screening-backend', choices=SCREENING_BACKENDS, default=None,
+                        help='Safe prime screening engine, default=ssh-keygen')
+    parser.add_argument('--prime-tests', type=int, default=None,
+                        help='Miller-Rabin rounds per prime for the native screening backend, default=100')
+    parser.add_argument('--prefilter-bound', type=int, default=None,
+                        help='Before screening, drop candidates without the generator, and, for a PREFILTER_BOUND '
+                             'above the 2^32 ssh-keygen sieves to, those with a prime factor below it')
+    parser.add_argument('--compress', choices=tuple(COMPRESSIONS), default=None,
+                        help='Spool new candidate files compressed, streamed through gzip or zstd, default=uncompressed')
+    parser.add_argument('--ssh-keygen', type=str, default=None,
+                        help='ssh-keygen executable for generation and screening, default=ssh-keygen on the PATH')
+    parser.add_argument('--from-store', action='store_true',
+                        help='Write the moduli file from the deduplicated moduli store rather than the screened files.')
+    parser.add_argument('-n', '--per-bitsize', type=int, default=None,
+                        help='Write exactly PER_BITSIZE moduli per bitsize, sampled at random from all screened moduli')
+    parser.add_argument('--low-water', type=int, default=100,
+                        help='With --daemon, moduli per bitsize kept available in the pool, default=100')
+    parser.add_argument('--socket', type=Path, default=None,
+                        help='Unix socket of --daemon and --fetch, default=${CONFIG_DIR}/pool.sock')
+    parser.add_argument('--target', type=Path, default=Path('/etc/ssh/moduli'),
+                        help='Moduli file updated by --apply, default=/etc/ssh/moduli')
+    parser.add_argument('--period', choices=('day', 'week', 'month'), default='week',
+                        help='With -M, reporting period of the production statistics, default=week')
+    parser.add_argument('--progress-samples', action='store_true',
+                        help='With --status, keep checkpoint readings in ${CONFIG_DIR}/.progress, to measure rates '
+                             'between successive runs')
+    parser.add_argument('--prometheus-textfile', type=Path, default=None,
+                        help='With --status, also write progress metrics to PROMETHEUS_TEXTFILE, e.g. moduli.prom')
+    parser.add_argument('--trace', type=Path, default=None,
+                        help='Record each stage and ssh-keygen process, with wall time, CPU, peak RSS, I/O and line '
+                             'counts, to TRACE as Chrome trace-event JSON')
+    parser.add_argument('--profile', type=Path, default=None,
+                        help='Write a cProfile of the Python controller to PROFILE, for pstats or snakeviz')
+    parser.add_argument('--fail-fast', action='store_true', help='Stop --verify at the first failure.')
     parser.add_argument('-V', '--version', action='store_true', help='Display moduli-assembly version.')
 
     return parser
 
 
+def orchestrate(cm: ModuliAssembly, args: argparse.Namespace):
+    """
+    The asyncio orchestrator configured by the command line.
+    """
+    from moduli_assembly.orchestrator import AsyncOrchestrator
+    scheduler = None
+    if args.share_host:
+        from moduli_assembly.scheduler import LoadScheduler
+        scheduler = LoadScheduler(nice=args.nice, ionice=None if args.ionice == 'none' else args.ionice)
+    return AsyncOrchestrator(cm, generators=args.generators, screeners=args.screeners, timeout=args.timeout,
+                             scheduler=scheduler)
+
+
+def coordinate(cm: ModuliAssembly, args: argparse.Namespace, jobs: List[Tuple[int, int]]) -> None:
+    """
+    Serves `jobs`, and any interrupted work, to --worker processes until all are screened.
+    """
+    from moduli_assembly.distributed import Coordinator
+    host, _, port = args.coordinate.rpartition(':')
+    try:
+        Coordinator(cm, jobs, shards=args.shards or 4, lease_seconds=args.lease,
+                    token=args.token).run(host or '127.0.0.1', int(port))
+    except ValueError as e:
+        print(f'Error coordinating: {e}')
+        exit(1)
+
+
 def main() -> None:
     """
     Main entry point for all Moduli Assembly operations.
     """
     parser = cl_args()
     args = parser.parse_args()
+    basicConfig(level=INFO)
+
+    if args.trace or args.profile:
+        traced_run(args)
+    else:
+        run(args)
+
+
+def traced_run(args: argparse.Namespace) -> None:
+    """
+    `run`, recording a Chrome trace of its stages and subprocesses to --trace, and a cProfile of the
+    controller to --profile. Both are written however the run ends.
+    """
+    import resource
+    import sys
+    from moduli_assembly import trace
+
+    tracer = trace.start()
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with trace.span('moduli_assembly', category='run', argv=' '.join(sys.argv[1:])):
+            try:
+                run(args)
+            finally:
+                # Every child reaped, including those of the asyncio orchestrator
+                trace.annotate(**{f'children_{key}': value for key, value in
+                                  trace.usage_args(resource.getrusage(resource.RUSAGE_CHILDREN)).items()})
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        trace.stop()
+        if args.trace:
+            tracer.write(args.trace)
 
+
+def run(args: argparse.Namespace) -> None:
+    """
+    Runs the operation selected by the command line.
+    """
+    # The one ModuliAssembly of this run; constructing it reads the configuration and writes nothing
     if args.config_file.exists():
-        cm = ModuliAssembly(config={'config_file': args.config_file.read_text()}, root_dir=args.moduli_dir)
+        cm = ModuliAssembly(config=loads(args.config_file.read_text()), root_dir=args.moduli_dir)
     else:
         cm = ModuliAssembly()
 
+    if args.screening_backend:
+        cm.config['screening_backend'] = args.screening_backend
+    if args.prime_tests:
+        cm.config['prime_tests'] = args.prime_tests
+    if args.prefilter_bound:
+        cm.config['prefilter_bound'] = args.prefilter_bound
+    if args.ssh_keygen:
+        cm.config['ssh_keygen'] = args.ssh_keygen
+    if args.compress:
+        cm.config['candidate_compression'] = args.compress
+
     # Exclusive Functions
     if args.remove_config_dir:
         # Delete Config Directory At START (Refresh)
-        cm = ModuliAssembly()
         try:
             cm.remove_config()
         except Exception as e:
@@ -72,25 +245,146 @@ def main() -> None:
         cm.print_config()
         return
 
-    if args.moduli_distribution:
+    if args.moduli_distribution is not None:
+        from moduli_assembly.scripts.moduli_infile import (moduli_distribution, print_distribution)
         try:
-            moduli_infile(cm.config['moduli_file'])
+            print_distribution(moduli_distribution(*(args.moduli_distribution or [cm.config['moduli_file']])))
         except Exception as e:
             print(f'Error displaying moduli distribution: {e}')
 
+    if args.display_moduli_frequencies:
+        from moduli_assembly.history import print_production_stats
+        print_production_stats(cm.history.production_stats(args.period))
+        return
+
+    if args.verify:
+        from moduli_assembly.verify import print_report
+        try:
+            report = cm.verify_moduli_file(None if args.verify is True else args.verify, fail_fast=args.fail_fast)
+            print_report(report)
+        except Exception as e:
+            print(f'Error verifying moduli file: {e}')
+            exit(1)
+        if report['failures']:
+            exit(1)
+        return
+
+    if args.status:
+        from moduli_assembly.progress import (print_progress, prometheus_metrics, write_textfile)
+        report = cm.screening_progress(keep_samples=args.progress_samples)
+        print_progress(report)
+        if args.prometheus_textfile:
+            write_textfile(prometheus_metrics(report), args.prometheus_textfile)
+        return
+
+    if args.store_counts:
+        cm.ingest_screened_files()
+        print('Mod  Count')
+        for size, count in cm.store.count_by_size().items():
+            print(size, count)
+        return
+
     if args.generate_moduli_file:
         # Compile stored moduli into new MODULI_FILE
         try:
-            cm.create_moduli_file(cm.config['moduli_file'])
+            cm.create_moduli_file(cm.config['moduli_file'], from_store=args.from_store, per_bitsize=args.per_bitsize)
             print(f'Wrote moduli file to {cm.config["moduli_file"]} and exiting.')
         except Exception as e:
             print(f"Error creating moduli file: {e}")
         return
 
+    if args.bundle:
+        result = cm.bundle_moduli_file(None if args.bundle is True else args.bundle)
+        if result['delta']:
+            print(f'Bundle version {result["version"]}: {result["bundle"]} ({result["lines"]} moduli), delta '
+                  f'{result["delta"]} (+{result["added"]} -{result["removed"]})')
+        else:
+            print(f'Bundle version {result["version"]}: {result["bundle"]} ({result["lines"]} moduli)')
+        return
+
+    if args.apply:
+        from moduli_assembly.bundle import apply_bundles
+        try:
+            result = apply_bundles(args.target, args.apply)
+        except (OSError, ValueError) as e:
+            print(f'Error applying bundle: {e}')
+            exit(1)
+        print(f'{args.target}: version {result["version"]}, {"updated" if result["changed"] else "unchanged"}')
+        return
+
+    if args.daemon is not None:
+        from moduli_assembly.daemon import PoolKeeper
+        bitsizes = args.daemon or cm.config['auth_bitsizes']
+        PoolKeeper(cm, {key_length: args.low_water for key_length in bitsizes},
+                   args.socket or cm.config['config_dir'] / 'pool.sock', orchestrate(cm, args)).run()
+        return
+
+    if args.fetch:
+        from moduli_assembly.bundle import atomic_replace
+        from moduli_assembly.daemon import (DEFAULT_PER_BITSIZE, fetch)
+        try:
+            result = fetch(args.socket or cm.config['config_dir'] / 'pool.sock', args.per_bitsize or DEFAULT_PER_BITSIZE)
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f'Error fetching moduli: {e}')
+            exit(1)
+        atomic_replace(args.fetch, result['moduli'].encode())
+        print(f'Wrote {args.fetch}: ' + ', '.join(f'{bits}: {n}' for bits, n in result['counts'].items()))
+        return
+
+    if args.pack:
+        try:
+            counts = cm.pack_moduli_file(None if args.pack is True else args.pack)
+        except (OSError, ValueError) as e:
+            print(f'Error packing moduli file: {e}')
+            exit(1)
+        print(f'Packed {sum(counts.values())} moduli: ' + ', '.join(f'{bits}: {n}' for bits, n in counts.items()))
+        return
+
+    if args.unpack:
+        import sys
+        from moduli_assembly.pack import ModuliPack
+        try:
+            with ModuliPack(args.unpack) as pack:
+                pack.write_text(sys.stdout.buffer)
+        except (OSError, ValueError) as e:
+            print(f'Error reading pack: {e}', file=sys.stderr)
+            exit(1)
+        return
+
+    if args.calibrate is not None:
+        from moduli_assembly.calibrate import (DEFAULT_TRIAL_SECONDS, calibrate)
+        key_lengths = args.calibrate or cm.config['auth_bitsizes']
+        tuning = calibrate(cm, key_lengths, trial_seconds=args.timeout or DEFAULT_TRIAL_SECONDS)
+        print(f'{"Bits":<6} {"Memory":>7} {"Jobs":>5} {"Shards":>7} {"Candidates/s":>13} {"Screened/s":>11}')
+        for key_length, settings in tuning.items():
+            print(f'{key_length:<6} {settings["memory"] or "default":>7} {settings["jobs"]:>5} '
+                  f'{settings["shards"]:>7} {settings["candidates_per_second"]:>13.1f} '
+                  f'{settings["screened_per_second"]:>11.1f}')
+        for key_length in key_lengths:
+            if key_length not in tuning:
+                print(f'{key_length:<6} not calibrated: no generation trial finished within the --timeout')
+        if tuning:
+            print(f'Saved tuning to {cm.config["config_file"]}')
+        return
+
+    if args.worker:
+        from moduli_assembly.distributed import Worker
+        completed = Worker(cm, args.worker, jobs=args.jobs or 1, token=args.token).run()
+        print(f'Completed {completed} jobs for {args.worker}')
+        return
+
     if args.restart:
         print('Restarting candidate screening')
-        cm.restart_candidate_screening()
-        cm.create_moduli_file()
+        if args.coordinate:
+            coordinate(cm, args, [])
+        elif args.asyncio or args.share_host:
+            orchestrator = orchestrate(cm, args)
+            orchestrator.run(orchestrator.restart, shards=args.shards)
+            if orchestrator.interrupted:
+                exit(128 + orchestrator.interrupted)
+        else:
+            cm.restart_candidate_screening(shards=args.shards, jobs=args.jobs)
+        cm.create_moduli_file(from_store=args.from_store, per_bitsize=args.per_bitsize)
         return
 
     # Non-exclusive arguments - handle FIRST
@@ -121,21 +415,36 @@ def main() -> None:
                 return
             run_bits[key_length] = run_bits.get(key_length, 0) + 1
 
-        candidates: List[Optional[Path]] = []
-        for key_length, count in run_bits.items():
-            candidates.extend([cm.generate_candidates(key_length, count) for _ in range(count)])
+        if args.quota:
+            counts = cm.produce_quota({key_length: args.quota for key_length in run_bits},
+                                      generate_jobs=args.jobs, generators=args.generators)
+            print(f'Safe primes per bitsize: {counts}')
+            cm.create_moduli_file(from_store=args.from_store, per_bitsize=args.per_bitsize)
+            return
+
+        # One candidate file per bitsize, from `count` ssh-keygen runs
+        jobs: List[Tuple[int, int]] = list(run_bits.items())
 
+        cm.make_dirs()
         screened_file_path = cm.config["config_dir"] / 'screened-files.txt'
         with screened_file_path.open('a') as cf:
-            for candidate in candidates:
-                if candidate:
-                    cf.write(f'Screened File: {cm.get_screened_path(candidate)}\n')
+            def record_candidate(candidate: Path) -> None:
+                cf.write(f'Screened File: {cm.get_screened_path(candidate)}\n')
+                cf.flush()
 
-        for candidate in candidates:
-            if candidate:
-                cm.screen_candidates(candidate)
+            if args.coordinate:
+                coordinate(cm, args, jobs)
+            elif args.asyncio or args.share_host:
+                orchestrator = orchestrate(cm, args)
+                orchestrator.run(orchestrator.pipeline, jobs, shards=args.shards, on_candidate=record_candidate)
+                if orchestrator.interrupted:
+                    exit(128 + orchestrator.interrupted)
+            else:
+                cm.pipeline_candidates(jobs, generators=args.generators, screeners=args.screeners,
+                                       shards=args.shards, on_candidate=record_candidate,
+                                       generate_jobs=args.jobs)
 
-        cm.create_moduli_file()
+        cm.create_moduli_file(from_store=args.from_store, per_bitsize=args.per_bitsize)
 
         return
 
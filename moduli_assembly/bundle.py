@@ -0,0 +1,214 @@
+import gzip
+import hashlib
+import os
+from collections import Counter
+from json import (dumps, loads)
+from pathlib import PosixPath as Path
+from typing import (List, Optional, Tuple)
+
+BUNDLE_FORMAT = 'moduli-bundle'
+DELTA_FORMAT = 'moduli-delta'
+
+
+def moduli_lines(text: str) -> List[str]:
+    """
+    Returns:
+        The moduli lines of a moduli file, newline terminated, without comments or blank lines.
+    """
+    return [f'{line}\n' for line in text.splitlines() if line.strip() and not line.startswith('#')]
+
+
+HEADER = '#/etc/ssh/moduli: moduli_assembly bundle version '
+
+
+def render(version: int, lines: List[str]) -> bytes:
+    """
+    The installed moduli file of a bundle version: a header comment, then the moduli lines.
+    """
+    return (f'{HEADER}{version}\n' + ''.join(lines)).encode()
+
+
+def installed_version(data: bytes) -> Optional[int]:
+    """
+    Returns:
+        The bundle version of an installed moduli file, from its header comment, or None.
+    """
+    first = data.split(b'\n', 1)[0].decode(errors='replace')
+    version = first[len(HEADER):]
+    return int(version) if first.startswith(HEADER) and version.isdigit() else None
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write(path: Path, header: dict, lines: List[str]) -> None:
+    tmp = path.parent / f'.{path.name}.tmp'
+    with gzip.open(tmp, 'wt', compresslevel=9) as f:
+        f.write(dumps(header) + '\n')
+        f.writelines(lines)
+    os.replace(tmp, path)
+
+
+def read_bundle(path: Path) -> Tuple[dict, List[str]]:
+    """
+    Reads a bundle or delta file.
+
+    Returns:
+        (header, lines): moduli lines of a bundle, `+`/`-` prefixed lines of a delta.
+
+    Raises:
+        ValueError: If the file is neither.
+    """
+    with gzip.open(path, 'rt') as f:
+        header = loads(f.readline())
+        if header.get('format') not in (BUNDLE_FORMAT, DELTA_FORMAT):
+            raise ValueError(f'{path} is not a moduli bundle or delta')
+        return header, f.readlines()
+
+
+def latest_bundle(bundle_dir: Path) -> Optional[Path]:
+    """
+    Returns:
+        The full bundle of the highest version in `bundle_dir`, or None.
+    """
+    bundles = sorted(bundle_dir.glob('moduli-*.bundle.gz'))
+    return bundles[-1] if bundles else None
+
+
+def patch(lines: List[str], delta: List[str]) -> List[str]:
+    """
+    Applies a delta to moduli lines: removed lines go, in any position, and added lines follow the rest,
+    in delta order.
+    """
+    removed = Counter(line[1:] for line in delta if line.startswith('-'))
+    kept = []
+    for line in lines:
+        if removed[line]:
+            removed[line] -= 1
+        else:
+            kept.append(line)
+    return kept + [line[1:] for line in delta if line.startswith('+')]
+
+
+def create_bundle(moduli_file: Path, bundle_dir: Path) -> dict:
+    """
+    Writes the next bundle version of a moduli file, and a delta from the previous version.
+
+    A version's lines are those of the previous version, less the removed ones, followed by the added ones, so
+    a host can reproduce the exact file, and its checksum, from the delta alone.
+
+    Args:
+        moduli_file: New moduli file, e.g. from `create_moduli_file`.
+        bundle_dir: Bundle directory, holding the previous versions.
+
+    Returns:
+        'version', 'sha256', 'lines', 'bundle' (path), and for any version after the first, 'delta' (path),
+        'added' and 'removed'. The bundle is not written when the moduli are unchanged: 'bundle' is then the
+        current one and 'delta' is None.
+    """
+    bundle_dir.mkdir(parents=True, exist_ok=True)
+    lines = moduli_lines(moduli_file.read_text())
+    previous = latest_bundle(bundle_dir)
+    if previous:
+        header, base = read_bundle(previous)
+        added = Counter(lines) - Counter(base)
+        removed = Counter(base) - Counter(lines)
+        if not added and not removed:
+            return {'version': header['version'], 'sha256': header['sha256'], 'lines': len(base),
+                    'bundle': previous, 'delta': None, 'added': 0, 'removed': 0}
+        delta = []
+        for sign, source, changes in (('-', base, removed), ('+', lines, added)):
+            for line in source:
+                if changes[line]:
+                    changes[line] -= 1
+                    delta.append(f'{sign}{line}')
+        lines = patch(base, delta)
+        version = header['version'] + 1
+    else:
+        header, delta, version = None, None, 1
+
+    digest = sha256(render(version, lines))
+    bundle = bundle_dir / f'moduli-{version:06d}.bundle.gz'
+    _write(bundle, {'format': BUNDLE_FORMAT, 'version': version, 'sha256': digest, 'lines': len(lines)}, lines)
+    result = {'version': version, 'sha256': digest, 'lines': len(lines), 'bundle': bundle, 'delta': None}
+    if header:
+        delta_path = bundle_dir / f'moduli-{header["version"]:06d}-{version:06d}.delta.gz'
+        _write(delta_path, {'format': DELTA_FORMAT, 'from': header['version'], 'from_sha256': header['sha256'],
+                            'version': version, 'sha256': digest}, delta)
+        result.update(delta=delta_path, added=sum(line.startswith('+') for line in delta),
+                      removed=sum(line.startswith('-') for line in delta))
+    return result
+
+
+def atomic_replace(path: Path, data: bytes) -> None:
+    """
+    Replaces a file's contents atomically: a temporary file in the same directory, with the file's mode, is
+    written and fsynced, renamed over the file, and the directory fsynced, so a crash leaves either the old or
+    the new file, complete.
+    """
+    mode = path.stat().st_mode & 0o7777 if path.exists() else 0o644
+    tmp = path.parent / f'.{path.name}.{os.getpid()}.tmp'
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def apply_bundles(target: Path, paths: List[Path]) -> dict:
+    """
+    Brings an installed moduli file to a bundle version: from a full bundle, or with deltas, applied in order.
+    Deltas are checked against the checksum of the file they patch, and every result against its version
+    checksum, before the target is atomically replaced, once. Deltas to versions already installed, and full
+    bundles of older versions, are skipped, so applying the same updates twice is harmless and an old bundle
+    never downgrades the target.
+
+    Args:
+        target: Installed moduli file, e.g. /etc/ssh/moduli.
+        paths: Bundle and delta files.
+
+    Returns:
+        'version' installed (None when unchanged and unknown), 'sha256', and 'changed'.
+
+    Raises:
+        ValueError: If a delta does not apply to the target, or a result fails its checksum.
+    """
+    data = target.read_bytes() if target.exists() else b''
+    current, version, lines = sha256(data), installed_version(data), None
+    installed = current
+
+    for path in paths:
+        header, body = read_bundle(path)
+        # A full bundle of the installed version is reinstalled, repairing a modified target
+        installed_newer = version is not None and (header['version'] < version or
+                                                   header['format'] == DELTA_FORMAT and header['version'] == version)
+        if header['sha256'] == current or installed_newer:
+            version = max(version or 0, header['version'])
+            continue
+        if header['format'] == BUNDLE_FORMAT:
+            lines = body
+        elif header['from_sha256'] == current:
+            lines = patch(lines if lines is not None else moduli_lines(data.decode()), body)
+        else:
+            raise ValueError(f'{path.name} updates version {header["from"]}, but {target} is not that version: '
+                             f'apply a full bundle')
+        data = render(header['version'], lines)
+        if sha256(data) != header['sha256']:
+            raise ValueError(f'{path.name}: checksum mismatch for version {header["version"]}')
+        current, version = header['sha256'], header['version']
+
+    if current != installed:
+        atomic_replace(target, data)
+    return {'version': version, 'sha256': current, 'changed': current != installed}
@@ -0,0 +1,209 @@
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from typing import (Dict, List, Optional, Sequence)
+
+from moduli_assembly.trace import run_process
+
+logger = getLogger(__name__)
+
+# `ssh-keygen -M generate -O memory=` accepts 8 to 127 MB; None leaves ssh-keygen's default
+MEMORY_SETTINGS = (None, 8, 32, 127)
+
+# Candidate lines screened per screening trial
+DEFAULT_SAMPLE_LINES = 2000
+
+# Seconds each trial may run: its ssh-keygen processes are then killed and the setting is not chosen
+DEFAULT_TRIAL_SECONDS = 600.0
+
+
+def mem_available() -> Optional[int]:
+    """
+    Returns:
+        MemAvailable of /proc/meminfo in MB, or None where there is no /proc/meminfo.
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def worker_settings(cpus: int = None) -> List[int]:
+    """
+    Worker and shard counts worth trying on a host: 1, then doubling up to the number of CPUs.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    settings = [1]
+    while settings[-1] * 2 <= cpus:
+        settings.append(settings[-1] * 2)
+    if settings[-1] != cpus:
+        settings.append(cpus)
+    return settings
+
+
+def _generate_trial(ma, key_length: int, memory: Optional[int], jobs: int, tmp: Path,
+                    timeout: float) -> Optional[dict]:
+    """
+    Runs `jobs` concurrent ssh-keygen generation runs with one memory setting, for at most `timeout` seconds.
+
+    Returns:
+        'candidates_per_second' over all runs, and 'candidates', the first run's output file, or None when a run
+        did not finish in time.
+    """
+    starts = ma.generate_start_points(key_length, jobs)
+    outputs = [tmp / f'{key_length}.{memory}.{jobs}.{run}' for run in range(jobs)]
+
+    def generate(run: int) -> bool:
+        try:
+            run_process(ma.generate_command(key_length, outputs[run], starts[run], memory=memory or 0),
+                        timeout=timeout, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except subprocess.TimeoutExpired:
+            return False
+        return True
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        finished = all(list(pool.map(generate, range(jobs))))
+    seconds = time.monotonic() - started
+    if not finished:
+        return None
+
+    candidates = sum(ma.count_lines(output) for output in outputs)
+    return {'candidates_per_second': candidates / seconds if seconds else 0.0, 'candidates': outputs[0]}
+
+
+def _screen_trial(ma, candidates: Path, lines: int, shards: int, tmp: Path, timeout: float) -> Optional[float]:
+    """
+    Screens the first `lines` candidate lines as `shards` concurrent ssh-keygen line ranges, for at most `timeout`
+    seconds.
+
+    Returns:
+        Candidate lines screened per second, or None when a range did not finish in time.
+    """
+    ranges = ma.shard_ranges(lines, shards)
+
+    def screen(index: int) -> bool:
+        start_line, range_lines = ranges[index]
+        try:
+            run_process(ma.screen_command(candidates, tmp / f'screened.{shards}.{index}',
+                                          tmp / f'checkpoint.{shards}.{index}', start_line, range_lines),
+                        timeout=timeout, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except subprocess.TimeoutExpired:
+            return False
+        return True
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+        finished = all(list(pool.map(screen, range(len(ranges)))))
+    seconds = time.monotonic() - started
+    if not finished:
+        return None
+    return lines / seconds if seconds else 0.0
+
+
+def calibrate_key_length(ma, key_length: int, memory_settings: Sequence[Optional[int]] = MEMORY_SETTINGS,
+                         job_settings: Sequence[int] = None, shard_settings: Sequence[int] = None,
+                         sample_lines: int = DEFAULT_SAMPLE_LINES,
+                         trial_seconds: float = DEFAULT_TRIAL_SECONDS) -> Optional[dict]:
+    """
+    Benchmarks generation and screening of one key length on this host, in a scratch directory.
+
+    Sieve memory is compared on single runs, then the number of concurrent runs with the best memory, among
+    those that fit in MemAvailable. Shard counts are compared by screening the same candidate sample. A
+    generation trial is a complete ssh-keygen run, which cannot sieve a shorter range, so every trial is stopped
+    after `trial_seconds`, and a setting whose trial did not finish is not chosen: calibration takes at most
+    one `trial_seconds` per setting tried.
+
+    Args:
+        ma: ModuliAssembly supplying the ssh-keygen command lines.
+        key_length: Moduli key length.
+        memory_settings: `-O memory=` settings in MB to try, None for ssh-keygen's default.
+        job_settings: Concurrent generation runs to try, defaults to `worker_settings()`.
+        shard_settings: Screening shard counts to try, defaults to `worker_settings()`.
+        sample_lines: Candidate lines screened per screening trial.
+        trial_seconds: Seconds each trial may run.
+
+    Returns:
+        Best settings: 'memory' (None for the default), 'jobs', 'shards', with the measured
+        'candidates_per_second' and 'screened_per_second', or None when no generation trial finished in time.
+    """
+    available = mem_available()
+    job_settings = job_settings or worker_settings()
+    shard_settings = shard_settings or worker_settings()
+
+    with TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        memory, best = None, None
+        for setting in memory_settings:
+            if setting and available and setting > available // 2:
+                continue
+            trial = _generate_trial(ma, key_length, setting, 1, tmp, trial_seconds)
+            if not trial:
+                logger.warning(f'{key_length}: memory={setting or "default"}: not finished in {trial_seconds}s')
+                continue
+            logger.info(f'{key_length}: memory={setting or "default"}: '
+                        f'{trial["candidates_per_second"]:.1f} candidates/s')
+            if not best or trial['candidates_per_second'] > best['candidates_per_second']:
+                memory, best = setting, trial
+        if not best:
+            return None
+
+        jobs, generated = 1, best
+        for setting in job_settings:
+            if setting == 1 or (memory and available and memory * setting > available // 2):
+                continue
+            trial = _generate_trial(ma, key_length, memory, setting, tmp, trial_seconds)
+            if not trial:
+                logger.warning(f'{key_length}: jobs={setting}: not finished in {trial_seconds}s')
+                continue
+            logger.info(f'{key_length}: jobs={setting}: {trial["candidates_per_second"]:.1f} candidates/s')
+            if trial['candidates_per_second'] > generated['candidates_per_second']:
+                jobs, generated = setting, trial
+
+        lines = min(sample_lines, ma.count_lines(best['candidates']))
+        shards, screened = 1, 0.0
+        for setting in shard_settings:
+            if setting > lines:
+                continue
+            rate = _screen_trial(ma, best['candidates'], lines, setting, tmp, trial_seconds)
+            if rate is None:
+                logger.warning(f'{key_length}: shards={setting}: not finished in {trial_seconds}s')
+                continue
+            logger.info(f'{key_length}: shards={setting}: {rate:.1f} lines/s')
+            if rate > screened:
+                shards, screened = setting, rate
+
+    return {'memory': memory, 'jobs': jobs, 'shards': shards,
+            'candidates_per_second': round(generated['candidates_per_second'], 3),
+            'screened_per_second': round(screened, 3)}
+
+
+def calibrate(ma, key_lengths: Sequence[int], **settings) -> Dict[int, dict]:
+    """
+    Calibrates each key length with `calibrate_key_length`, then saves the results with `ma.save_tuning`,
+    so later runs use them whenever `--jobs` or `--shards` is not given.
+
+    Args:
+        ma: ModuliAssembly.
+        key_lengths: Moduli key lengths.
+        settings: Trial settings passed to `calibrate_key_length`.
+
+    Returns:
+        {key_length: best settings}, without the key lengths none of whose generation trials finished in time.
+    """
+    tuning = {}
+    for key_length in key_lengths:
+        best = calibrate_key_length(ma, key_length, **settings)
+        if best:
+            tuning[key_length] = best
+    if tuning:
+        ma.save_tuning(tuning)
+    return tuning
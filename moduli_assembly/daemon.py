@@ -0,0 +1,223 @@
+import asyncio
+import os
+import signal
+import socket
+import sqlite3
+import threading
+from json import (dumps, loads)
+from logging import getLogger
+from pathlib import PosixPath as Path
+from socketserver import (StreamRequestHandler, ThreadingUnixStreamServer)
+from typing import (Dict, List)
+
+logger = getLogger(__name__)
+
+# Seconds between pool checks while no request has drawn it down
+DEFAULT_INTERVAL = 300.0
+
+# Moduli per bitsize of a fetched moduli file, by default
+DEFAULT_PER_BITSIZE = 40
+
+
+class PoolKeeper(object):
+    """
+    Long-running keeper of a warm pool of screened moduli: the available, never handed out, moduli of the
+    store. Whenever a bitsize falls below its low-water mark, it generates and screens, sized from the yield of
+    past runs, until the pool is back above it. Meanwhile it serves balanced moduli files over a Unix socket,
+    assembled from the pool in one store transaction that retires the moduli it hands out.
+
+    Production runs in the main thread on an AsyncOrchestrator, so SIGINT or SIGTERM stops its ssh-keygen
+    children with their checkpoints consistent; the next start resumes the interrupted work.
+    """
+
+    def __init__(self, ma, low_water: Dict[int, int], socket_path: Path, orchestrator,
+                 interval: float = DEFAULT_INTERVAL) -> None:
+        """
+        Args:
+            ma: ModuliAssembly whose store holds the pool.
+            low_water: {key_length: moduli kept available}
+            socket_path: Unix socket served.
+            orchestrator: AsyncOrchestrator of `ma`, running production.
+            interval: Seconds between pool checks while no request has drawn it down.
+        """
+        self.ma = ma
+        self.low_water = low_water
+        self.socket_path = socket_path
+        self.orchestrator = orchestrator
+        self.interval = interval
+        self.stopped = threading.Event()
+        self._wake = threading.Event()
+
+    def pool(self) -> Dict[int, int]:
+        """
+        Returns:
+            {key_length: available moduli}, for every key length kept.
+        """
+        counts = self.ma.store.count_by_size(generator=self.ma.config['generator_type'], available=True)
+        return {key_length: counts.get(key_length - 1, 0) for key_length in sorted(self.low_water)}
+
+    def moduli_file(self, per_bitsize: int, bitsizes: List[int] = None) -> dict:
+        """
+        Hands out a balanced moduli file from the pool, retiring its moduli, and wakes production.
+
+        Args:
+            per_bitsize: Moduli per bitsize.
+            bitsizes: Key lengths, defaults to every key length kept.
+
+        Returns:
+            'moduli', the moduli file, and 'counts', {key_length: moduli}, short of `per_bitsize` for a bitsize
+            whose pool is.
+
+        Raises:
+            ValueError: If per_bitsize is not positive.
+        """
+        from moduli_assembly import ISO_UTC_TIMESTAMP
+
+        if per_bitsize <= 0:
+            raise ValueError("per_bitsize must be a positive integer")
+        bitsizes = bitsizes or sorted(self.low_water)
+        lines = self.ma.store.take(per_bitsize, sizes=[key_length - 1 for key_length in bitsizes],
+                                   generator=self.ma.config['generator_type'])
+        counts = {key_length: 0 for key_length in bitsizes}
+        for line in lines:
+            counts[int(line.split()[4]) + 1] += 1
+        self._wake.set()
+        header = f'#/etc/ssh/moduli: creation_date: moduli_assembly: {ISO_UTC_TIMESTAMP()}\n'
+        return {'moduli': header + ''.join(lines), 'counts': counts}
+
+    async def refill(self, resume: bool = False) -> Dict[int, int]:
+        """
+        One production round: every key length below its low-water mark is generated and screened, in one
+        orchestrator pipeline, for its shortfall.
+
+        Args:
+            resume: First finish any generation or screening interrupted by a previous run.
+
+        Returns:
+            {key_length: generation runs}
+        """
+        if resume:
+            await self.orchestrator.restart()
+        await asyncio.to_thread(self.ma.ingest_screened_files)
+        pool = await asyncio.to_thread(self.pool)
+        low = {key_length: mark for key_length, mark in self.low_water.items() if pool[key_length] < mark}
+        plan = {key_length: runs for key_length, runs in self.ma.plan_quota(low, pool).items() if runs}
+        if plan:
+            logger.info(f'Pool {pool} below low water: generating {plan} runs')
+            await self.orchestrator.pipeline(list(plan.items()))
+        return plan
+
+    def server(self) -> ThreadingUnixStreamServer:
+        """
+        Returns:
+            Server of the pool socket, readable and writable by its owner only. A stale socket is replaced.
+        """
+        keeper = self
+
+        class Handler(_PoolHandler):
+            pass
+
+        Handler.keeper = keeper
+        self.socket_path.unlink(missing_ok=True)
+        # Created owner-only: no other user can connect between bind and chmod
+        umask = os.umask(0o177)
+        try:
+            server = ThreadingUnixStreamServer(str(self.socket_path), Handler)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        return server
+
+    def stop(self, *_) -> None:
+        self.stopped.set()
+        self._wake.set()
+
+    def run(self) -> None:
+        """
+        Serves the socket and keeps the pool until SIGINT or SIGTERM.
+        """
+        self.ma.make_dirs()
+        server = self.server()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        logger.info(f'Keeping moduli pool {self.pool()} above {self.low_water} on {self.socket_path}')
+        resume = True
+        try:
+            while not self.stopped.is_set():
+                self._wake.clear()
+                try:
+                    self.orchestrator.run(self.refill, resume)
+                    resume = False
+                except RuntimeError as e:
+                    # A failed ssh-keygen run keeps its checkpoint: resume it in the next round
+                    logger.error(f'Pool production failed: {e}')
+                if self.orchestrator.interrupted:
+                    break
+                # The orchestrator handles the signals while it runs, the keeper while it waits
+                for signum in (signal.SIGINT, signal.SIGTERM):
+                    signal.signal(signum, self.stop)
+                self._wake.wait(self.interval)
+        finally:
+            server.shutdown()
+            server.server_close()
+            self.socket_path.unlink(missing_ok=True)
+
+
+class _PoolHandler(StreamRequestHandler):
+    """
+    Pool socket protocol: one JSON request line, one JSON reply line.
+
+        {"op": "moduli", "per_bitsize": N, "bitsizes": [...]} -> {"moduli": "...", "counts": {...}}
+        {"op": "status"}                                      -> {"pool": {...}, "low_water": {...}}
+
+    Errors reply {"error": "..."}.
+    """
+    keeper: PoolKeeper = None
+
+    def handle(self) -> None:
+        try:
+            request = loads(self.rfile.readline())
+            if request.get('op') == 'moduli':
+                reply = self.keeper.moduli_file(int(request.get('per_bitsize') or DEFAULT_PER_BITSIZE),
+                                                request.get('bitsizes'))
+            elif request.get('op') == 'status':
+                reply = {'pool': self.keeper.pool(), 'low_water': self.keeper.low_water}
+            else:
+                reply = {'error': f'Unknown op: {request.get("op")}'}
+        except (ValueError, TypeError, AttributeError, sqlite3.Error, OSError) as e:
+            reply = {'error': str(e)}
+        self.wfile.write(dumps(reply).encode() + b'\n')
+
+
+def request(socket_path: Path, message: dict, timeout: float = 60.0) -> dict:
+    """
+    Sends one request to a PoolKeeper.
+
+    Returns:
+        The reply, with JSON object keys of key lengths as ints.
+
+    Raises:
+        OSError: If the keeper is not reachable.
+        ValueError: If the reply is not JSON, e.g. empty.
+        RuntimeError: If it replies with an error.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(str(socket_path))
+        client.sendall(dumps(message).encode() + b'\n')
+        with client.makefile('rb') as f:
+            reply = loads(f.readline())
+    if 'error' in reply:
+        raise RuntimeError(reply['error'])
+    return {key: {int(k): v for k, v in value.items()} if isinstance(value, dict) else value
+            for key, value in reply.items()}
+
+
+def fetch(socket_path: Path, per_bitsize: int = DEFAULT_PER_BITSIZE, bitsizes: List[int] = None) -> dict:
+    """
+    Fetches a fresh balanced moduli file from a PoolKeeper.
+
+    Returns:
+        See `PoolKeeper.moduli_file`.
+    """
+    return request(socket_path, {'op': 'moduli', 'per_bitsize': per_bitsize, 'bitsizes': bitsizes})
@@ -0,0 +1,607 @@
+import hmac
+import ipaddress
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from http.client import HTTPException
+from http.server import (BaseHTTPRequestHandler, ThreadingHTTPServer)
+from itertools import (count, islice)
+from json import (dumps, loads)
+from logging import getLogger
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from typing import (Dict, List, Optional, Tuple)
+from urllib.error import HTTPError
+from urllib.parse import (parse_qs, quote, urlsplit)
+from urllib.request import (Request, urlopen)
+
+from moduli_assembly.safe_primes import (DEFAULT_PRIME_TESTS, MODULI_TYPE_SOPHIE_GERMAIN)
+from moduli_assembly.spool import (compress_bytes, compression_of, open_candidates)
+from moduli_assembly.trace import run_process
+from moduli_assembly.verify import verify_line
+
+logger = getLogger(__name__)
+
+# Seconds a leased job stays with a worker without a renewal
+DEFAULT_LEASE_SECONDS = 600.0
+
+# Seconds an idle worker waits before asking for work again
+DEFAULT_POLL_SECONDS = 5.0
+
+# Seconds a worker waits for the coordinator to verify and accept a job result
+DEFAULT_COMPLETE_TIMEOUT = 3600.0
+
+TOKEN_HEADER = 'X-Moduli-Token'
+
+
+def is_loopback(host: str) -> bool:
+    """
+    Returns:
+        Whether a bind address is only reachable from this host.
+    """
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def candidate_modulus(line: str) -> Optional[int]:
+    """
+    Returns:
+        The modulus p a candidate line would screen to, p = 2q + 1 for a Sophie Germain candidate, or None for a
+        comment or malformed line.
+    """
+    fields = line.split()
+    if len(fields) != 7 or line.startswith('#'):
+        return None
+    try:
+        value = int(fields[6], 16)
+        return (value << 1) + 1 if int(fields[1]) == MODULI_TYPE_SOPHIE_GERMAIN else value
+    except ValueError:
+        return None
+
+
+class Coordinator(object):
+    """
+    Splits moduli production into jobs for `Worker` processes on other hosts: one generation job per
+    ssh-keygen run (key length and `-O start=` point), and one screening job per candidate file shard
+    (line range). Jobs are leased, and a lease that is not renewed expires and the job goes to another worker.
+
+    Results are collected into the coordinator's moduli directory through the same generation and shard
+    checkpoints as local production, so an interrupted coordinator resumes its work from disk. Workers are not
+    trusted: a generation result must be candidates of the job's key length, and a screening result safe primes,
+    checked with `moduli_assembly.verify.verify_line`, of candidates of the leased line range. A rejected result
+    returns its job to the queue.
+    """
+
+    def __init__(self, ma, jobs: List[Tuple[int, int]], shards: int = 4,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS, token: str = None,
+                 trials: int = DEFAULT_PRIME_TESTS) -> None:
+        """
+        Args:
+            ma: ModuliAssembly whose moduli directory collects the results.
+            jobs: New (key_length, count) generation jobs, as for `pipeline_candidates`. Interrupted generation
+                  and screening found in the moduli directory is always resumed.
+            shards: Number of screening jobs per candidate file.
+            lease_seconds: Seconds a job stays leased without renewal.
+            token: Optional shared secret, required from workers in the X-Moduli-Token header. Required to serve
+                   other hosts than this one.
+            trials: Number of Miller-Rabin rounds for each of q and p, verifying returned safe primes.
+        """
+        self.ma = ma
+        self.shards = shards
+        self.lease_seconds = lease_seconds
+        self.token = token
+        self.trials = trials
+        self.screened: List[Path] = []
+        self.done = threading.Event()
+        self._lock = threading.RLock()
+        self._ids = count(1)
+        self._jobs: Dict[str, dict] = {}
+        self._candidates: Dict[str, dict] = {}
+        self._verify_pool: Optional[ProcessPoolExecutor] = None
+
+        with self._lock:
+            for candidate_path in sorted(self.ma.config['moduli_dir'].glob('????.candidate*')):
+                if self.ma.is_generating(candidate_path):
+                    self._add_generation(*self.ma.begin_generation(0, 0, candidate_path))
+                else:
+                    self._add_screening(candidate_path)
+            for key_length, runs in sorted(jobs, key=lambda job: job[0], reverse=True):
+                self._add_generation(*self.ma.begin_generation(key_length, runs))
+            self._check_done()
+
+    def _add_job(self, candidate_path: Path, **fields) -> str:
+        job_id = str(next(self._ids))
+        self._jobs[job_id] = {'id': job_id, 'candidate': candidate_path, 'status': 'pending', 'worker': None,
+                              'expires': None, **fields}
+        self._candidates[candidate_path.name]['pending'].add(job_id)
+        return job_id
+
+    def _add_generation(self, candidate_path: Path, state: dict) -> None:
+        self._candidates[candidate_path.name] = {'state': state, 'pending': set()}
+        for run in self.ma.pending_generation_runs(state):
+            self._add_job(candidate_path, kind='generate', key_length=state['key_length'], run=run,
+                          start=state['starts'][run])
+        if not self._candidates[candidate_path.name]['pending']:
+            self._generated(candidate_path)
+
+    def _add_screening(self, candidate_path: Path) -> None:
+        self.ma.prefilter_unscreened(candidate_path)
+        ranges = self.ma.claim_shard_ranges(candidate_path, self.shards)
+        self._candidates[candidate_path.name] = {'ranges': ranges, 'pending': set(),
+                                                 'candidates': sum(lines for _, lines in ranges)}
+        for shard in ranges:
+            if self.ma.create_shard_paths(candidate_path, *shard)[1].exists():
+                self._add_job(candidate_path, kind='screen', key_length=self.ma.key_length_of(candidate_path),
+                              shard=shard)
+        if not self._candidates[candidate_path.name]['pending']:
+            self._screened(candidate_path)
+
+    def _generated(self, candidate_path: Path) -> None:
+        self.ma.finish_generation(candidate_path, self._candidates[candidate_path.name]['state'])
+        self._add_screening(candidate_path)
+
+    def _screened(self, candidate_path: Path) -> None:
+        candidate = self._candidates.pop(candidate_path.name)
+        screened_path = self.ma.merge_shards(candidate_path, candidate['ranges'])
+        self.screened.append(self.ma.record_screening(candidate_path, candidate['candidates'], screened_path))
+        logger.info(f'Screened {screened_path}')
+
+    def _check_done(self) -> None:
+        if all(job['status'] == 'done' for job in self._jobs.values()):
+            self.done.set()
+
+    def lease(self, worker: str) -> Optional[dict]:
+        """
+        Leases the next job to a worker, expired leases first returning to the queue. Screening jobs go first,
+        so candidate files are finished, and removed, as early as possible.
+
+        Args:
+            worker: Worker name.
+
+        Returns:
+            Job description for the worker, or None when no job is pending.
+        """
+        with self._lock:
+            now = time.monotonic()
+            for job in self._jobs.values():
+                if job['status'] == 'leased' and job['expires'] < now:
+                    logger.warning(f'Lease of job {job["id"]} by {job["worker"]} expired, reassigning')
+                    job['status'] = 'pending'
+
+            pending = [job for job in self._jobs.values() if job['status'] == 'pending']
+            if not pending:
+                return None
+            job = min(pending, key=lambda job: job['kind'] != 'screen')
+            job.update(status='leased', worker=worker, expires=now + self.lease_seconds)
+
+            description = {'id': job['id'], 'kind': job['kind'], 'key_length': job['key_length'],
+                           'generator': self.ma.config['generator_type'], 'lease_seconds': self.lease_seconds}
+            logger.info(f'Leased {job["kind"]} job {job["id"]} ({job["candidate"].name}) to {worker}')
+
+        if job['kind'] == 'generate':
+            description['start'] = job['start']
+        else:
+            # The candidate file stays until all of its shards are complete, and this one is leased
+            start_line, lines = job['shard']
+            try:
+                with open_candidates(job['candidate']) as f:
+                    description['lines'] = ''.join(islice(f, start_line, start_line + lines))
+            except FileNotFoundError:
+                # Completed meanwhile by the worker whose lease had expired
+                return None
+        return description
+
+    def renew(self, job_id: str, worker: str) -> bool:
+        """
+        Extends a lease.
+
+        Returns:
+            False when the worker no longer holds the lease.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job['status'] != 'leased' or job['worker'] != worker:
+                return False
+            job['expires'] = time.monotonic() + self.lease_seconds
+            return True
+
+    def fail(self, job_id: str, worker: str) -> None:
+        """
+        Returns a job the worker could not complete to the queue.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job['status'] == 'leased' and job['worker'] == worker:
+                logger.warning(f'Job {job_id} failed on {worker}, reassigning')
+                job['status'] = 'pending'
+
+    def _check_generated(self, job: dict, lines: List[str]) -> Optional[str]:
+        """
+        Returns:
+            None when every line is a Sophie Germain candidate of the job's key length, otherwise the reason.
+        """
+        for line in lines:
+            fields = line.split()
+            try:
+                if len(fields) != 7 or int(fields[1]) != MODULI_TYPE_SOPHIE_GERMAIN \
+                        or int(fields[4]) != job['key_length'] - 2 \
+                        or int(fields[6], 16).bit_length() != job['key_length'] - 1:
+                    return f'not a {job["key_length"]} bit candidate: {line[:80]}'
+            except ValueError:
+                return f'malformed line: {line[:80]}'
+        return None
+
+    def _check_screened(self, job: dict, lines: List[str]) -> Optional[str]:
+        """
+        Returns:
+            None when every line is a verified safe prime screened from the job's candidate line range, otherwise
+            the reason.
+        """
+        start_line, count = job['shard']
+        with open_candidates(job['candidate']) as f:
+            moduli = {candidate_modulus(line) for line in islice(f, start_line, start_line + count)}
+        for line in lines:
+            if candidate_modulus(line) not in moduli:
+                return f'not a candidate of lines {start_line}-{start_line + count}: {line[:80]}'
+        for line, reason in zip(lines, self._verify(lines)):
+            if reason:
+                return f'{reason}: {line[:80]}'
+        return None
+
+    def _verify(self, lines: List[str]) -> List[Optional[str]]:
+        """
+        Verifies moduli lines across a process pool, started on first use.
+
+        Returns:
+            `verify_line` result of each line.
+        """
+        with self._lock:
+            if self._verify_pool is None:
+                self._verify_pool = ProcessPoolExecutor()
+        return list(self._verify_pool.map(partial(verify_line, trials=self.trials), lines))
+
+    def complete(self, job_id: str, worker: str, output: bytes) -> bool:
+        """
+        Collects a job result: candidates of a generation run, or safe primes of a screened shard. The first
+        result of a job is kept, even from a worker whose lease expired, and later ones are ignored. A result that
+        fails its checks is discarded and the job returns to the queue.
+
+        Args:
+            job_id: Job id.
+            worker: Worker name.
+            output: ssh-keygen output file contents.
+
+        Returns:
+            False for an unknown, already completed or rejected job result.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job['status'] in ('done', 'verifying'):
+                return False
+            # Held while its result is checked, outside the lock: verifying safe primes takes a while
+            job['status'] = 'verifying'
+
+        try:
+            lines = [line + '\n' for line in output.decode().splitlines() if line.strip()]
+            check = self._check_generated if job['kind'] == 'generate' else self._check_screened
+            reason = check(job, lines)
+        except (UnicodeDecodeError, OSError) as e:
+            reason = str(e)
+        except BaseException:
+            with self._lock:
+                job['status'] = 'pending'
+            raise
+
+        with self._lock:
+            if reason:
+                logger.warning(f'Rejected {job["kind"]} job {job_id} result from {worker}, reassigning: {reason}')
+                job['status'] = 'pending'
+                return False
+            candidate_path = job['candidate']
+            candidate = self._candidates[candidate_path.name]
+
+            if job['kind'] == 'generate':
+                part = self.ma.create_generation_part_path(candidate_path, job['run'])
+                part.write_bytes(compress_bytes(''.join(lines).encode(), compression_of(candidate_path)))
+                try:
+                    self.ma.append_generation_run(candidate_path, candidate['state'], job['run'], part)
+                finally:
+                    part.unlink(missing_ok=True)
+            else:
+                shard_path, checkpoint = self.ma.create_shard_paths(candidate_path, *job['shard'])
+                shard_path.write_text(''.join(lines))
+                checkpoint.unlink(missing_ok=True)
+
+            job.update(status='done', worker=worker)
+            candidate['pending'].discard(job_id)
+            logger.info(f'Completed {job["kind"]} job {job_id} ({candidate_path.name}) from {worker}')
+            if not candidate['pending']:
+                if job['kind'] == 'generate':
+                    self._generated(candidate_path)
+                else:
+                    self._screened(candidate_path)
+            self._check_done()
+            return True
+
+    def status(self) -> dict:
+        """
+        Returns:
+            Number of jobs per status and kind, and whether all work is done.
+        """
+        with self._lock:
+            totals: Dict[str, Dict[str, int]] = {}
+            for job in self._jobs.values():
+                kind = totals.setdefault(job['kind'], {})
+                kind[job['status']] = kind.get(job['status'], 0) + 1
+            return {'jobs': totals, 'done': self.done.is_set()}
+
+    def server(self, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+        """
+        Builds the coordinator's HTTP server, not yet serving.
+
+        Args:
+            host: Bind address, this host only by default.
+            port: Port, 0 for any free port.
+
+        Returns:
+            Server, its address in `server_address`.
+
+        Raises:
+            ValueError: If the server would be reachable from other hosts without a token.
+        """
+        if not self.token and not is_loopback(host):
+            raise ValueError(f'A token is required to coordinate on {host or "all interfaces"}')
+        coordinator = self
+
+        class Handler(_CoordinatorHandler):
+            pass
+
+        Handler.coordinator = coordinator
+        return ThreadingHTTPServer((host, port), Handler)
+
+    def run(self, host: str = '127.0.0.1', port: int = 0, linger: float = 2 * DEFAULT_POLL_SECONDS) -> List[Path]:
+        """
+        Serves workers until all jobs are done.
+
+        Args:
+            host: Bind address, this host only by default.
+            port: Port.
+            linger: Seconds to keep serving once done, so polling workers are told to exit.
+
+        Returns:
+            Paths to the screened moduli files.
+        """
+        server = self.server(host, port)
+        logger.info(f'Coordinating {len(self._jobs)} jobs on {server.server_address[0]}:{server.server_address[1]}')
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            self.done.wait()
+            time.sleep(linger)
+        finally:
+            server.shutdown()
+            server.server_close()
+            if self._verify_pool:
+                self._verify_pool.shutdown()
+        return self.screened
+
+
+class _CoordinatorHandler(BaseHTTPRequestHandler):
+    """
+    Coordinator HTTP protocol. Requests carry JSON, except job results, which are the raw ssh-keygen output.
+
+        POST /lease                       {'worker'} -> 200 job, 204 no job pending, 410 all work done
+        POST /jobs/<id>/renew?worker=W    -> 200, or 409 lease lost
+        POST /jobs/<id>/complete?worker=W output -> 200 {'accepted'}
+        POST /jobs/<id>/fail?worker=W     -> 200
+        GET  /status                      -> 200 job counts
+    """
+    coordinator: Coordinator = None
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f'{self.address_string()} {format % args}')
+
+    def _reply(self, status: int, body: dict = None) -> None:
+        data = dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self) -> bool:
+        if self.coordinator.token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, '').encode(),
+                                                              self.coordinator.token.encode()):
+            self._reply(403, {'error': 'bad token'})
+            return False
+        return True
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        if self.path == '/status':
+            self._reply(200, self.coordinator.status())
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def do_POST(self) -> None:
+        if not self._authorized():
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        url = urlsplit(self.path)
+        worker = parse_qs(url.query).get('worker', [''])[0]
+        parts = url.path.strip('/').split('/')
+
+        if parts == ['lease']:
+            job = self.coordinator.lease(loads(body or b'{}').get('worker', self.address_string()))
+            if job:
+                self._reply(200, job)
+            else:
+                self._reply(410 if self.coordinator.done.is_set() else 204)
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'renew':
+            self._reply(200 if self.coordinator.renew(parts[1], worker) else 409)
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'complete':
+            self._reply(200, {'accepted': self.coordinator.complete(parts[1], worker, body)})
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'fail':
+            self.coordinator.fail(parts[1], worker)
+            self._reply(200)
+        else:
+            self._reply(404, {'error': 'not found'})
+
+
+class Worker(object):
+    """
+    Runs jobs leased from a `Coordinator` with the local ssh-keygen, renewing each lease while it runs.
+    """
+
+    def __init__(self, ma, url: str, name: str = None, jobs: int = 1, poll: float = DEFAULT_POLL_SECONDS,
+                 retries: int = 60, token: str = None) -> None:
+        """
+        Args:
+            ma: ModuliAssembly supplying the ssh-keygen command lines.
+            url: Coordinator URL, e.g. http://builder-1:8080
+            name: Worker name, defaults to the host name.
+            jobs: Number of jobs run concurrently.
+            poll: Seconds to wait before asking again when no job is pending, or the coordinator is unreachable.
+            retries: Consecutive failed connections to the coordinator before giving up.
+            token: Optional shared secret of the coordinator.
+        """
+        self.ma = ma
+        self.url = url.rstrip('/')
+        self.name = name or socket.gethostname()
+        self.jobs = jobs
+        self.poll = poll
+        self.retries = retries
+        self.token = token
+        self.completed = 0
+        self._lock = threading.Lock()
+
+    def _post(self, path: str, body: bytes = b'', content_type: str = 'application/json',
+              timeout: float = 60.0) -> Tuple[int, bytes]:
+        """
+        Raises:
+            OSError, http.client.HTTPException: If the coordinator cannot be reached, or the connection fails.
+        """
+        request = Request(f'{self.url}{path}', data=body, method='POST', headers={'Content-Type': content_type})
+        if self.token:
+            request.add_header(TOKEN_HEADER, self.token)
+        try:
+            with urlopen(request, timeout=timeout) as response:
+                return response.status, response.read()
+        except HTTPError as e:
+            return e.code, e.read()
+
+    def execute(self, job: dict) -> bytes:
+        """
+        Runs one job with ssh-keygen in a scratch directory.
+
+        Args:
+            job: Job description from the coordinator.
+
+        Returns:
+            ssh-keygen output: candidate lines for a generation job, safe prime lines for a screening job.
+
+        Raises:
+            subprocess.CalledProcessError: If ssh-keygen fails.
+        """
+        with TemporaryDirectory() as tmp:
+            if job['kind'] == 'generate':
+                output = Path(tmp) / 'candidates'
+                run_process(self.ma.generate_command(job['key_length'], output, int(job['start'], 16)))
+            else:
+                candidates, output = Path(tmp) / 'candidates', Path(tmp) / 'screened'
+                candidates.write_text(job['lines'])
+                run_process(self.ma.screen_command(candidates, output, Path(tmp) / 'checkpoint',
+                                                   generator=job['generator']))
+            return output.read_bytes() if output.exists() else b''
+
+    def _work(self) -> None:
+        failures = 0
+        while True:
+            try:
+                status, body = self._post('/lease', dumps({'worker': self.name}).encode())
+            except (OSError, HTTPException) as e:
+                failures += 1
+                if failures > self.retries:
+                    logger.error(f'Coordinator {self.url} unreachable: {e}')
+                    return
+                time.sleep(self.poll)
+                continue
+            failures = 0
+            if status == 410:
+                return
+            if status != 200:
+                time.sleep(self.poll)
+                continue
+
+            job = loads(body)
+            query = f'/jobs/{job["id"]}/%s?worker={quote(self.name)}'
+            finished = threading.Event()
+
+            def renew() -> None:
+                while not finished.wait(job['lease_seconds'] / 3):
+                    try:
+                        if self._post(query % 'renew')[0] == 409:
+                            logger.warning(f'Lost the lease of job {job["id"]}')
+                    except (OSError, HTTPException):
+                        pass
+
+            renewer = threading.Thread(target=renew, daemon=True)
+            renewer.start()
+            try:
+                output = self.execute(job)
+            except subprocess.CalledProcessError as e:
+                logger.error(f'Job {job["id"]} failed: {e}')
+                try:
+                    self._post(query % 'fail')
+                except (OSError, HTTPException) as e:
+                    # The lease expires instead
+                    logger.warning(f'Could not release job {job["id"]}: {e}')
+                continue
+            finally:
+                finished.set()
+                renewer.join()
+
+            if self._complete(query % 'complete', job['id'], output):
+                with self._lock:
+                    self.completed += 1
+
+    def _complete(self, path: str, job_id: str, output: bytes) -> bool:
+        """
+        Posts a job result, retrying while the coordinator cannot be reached. If it never can, the job goes to
+        another worker once its lease expires.
+
+        Returns:
+            Whether the result was delivered.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                self._post(path, output, content_type='text/plain', timeout=DEFAULT_COMPLETE_TIMEOUT)
+                return True
+            except (OSError, HTTPException) as e:
+                if attempt == self.retries:
+                    logger.error(f'Could not deliver the result of job {job_id}: {e}')
+                    return False
+                time.sleep(self.poll)
+        return False
+
+    def run(self) -> int:
+        """
+        Works until the coordinator reports all work done, or cannot be reached.
+
+        Returns:
+            Number of jobs completed.
+        """
+        threads = [threading.Thread(target=self._work, daemon=True) for _ in range(self.jobs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.completed
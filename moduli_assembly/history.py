@@ -0,0 +1,210 @@
+from datetime import (datetime, timezone)
+from json import (dumps, loads)
+from pathlib import PosixPath as Path
+from threading import Lock
+from typing import (Dict, Iterator, Optional)
+
+# Prior for a bitsize without history: four ssh-keygen runs yield about 80 safe primes
+DEFAULT_SAFE_PRIMES_PER_RUN = 20.0
+
+# Reporting periods of `production_stats`
+PERIODS = ('day', 'week', 'month')
+
+
+def period_of(timestamp: str, period: str) -> str:
+    """
+    Returns:
+        Reporting period of an ISO 8601 record timestamp, e.g. 2026-10-18, 2026-W42 or 2026-10.
+    """
+    if period == 'day':
+        return timestamp[:10]
+    if period == 'month':
+        return timestamp[:7]
+    year, week, _ = datetime.fromisoformat(timestamp).isocalendar()
+    return f'{year}-W{week:02}'
+
+
+def _ratio(numerator: float, denominator: float) -> Optional[float]:
+    return numerator / denominator if denominator else None
+
+
+def _production(total: Dict[str, float]) -> dict:
+    """
+    Production statistics of the summed job records of a bitsize and period.
+    """
+    per_candidate = _ratio(total['safe_primes'], total['screened'])
+    per_run = _ratio(total['generated'], total['runs'])
+    # CPU per safe prime: generating the candidates screened per safe prime, then screening them
+    generate_cost = _ratio(total['generate_cpu_s'], total['metered_generated'])
+    screen_cost = _ratio(total['screen_cpu_s'], total['metered_safe_primes'])
+    candidates_per_safe_prime = _ratio(total['screened'], total['safe_primes'])
+    return {
+        **{key: value for key, value in total.items() if not key.startswith('metered_')},
+        'safe_primes_per_candidate': per_candidate,
+        'safe_primes_per_run': per_run * per_candidate if per_run and per_candidate is not None else None,
+        'generated_per_cpu_hour': _ratio(3600 * total['metered_generated'], total['generate_cpu_s']),
+        'screened_per_cpu_hour': _ratio(3600 * total['metered_screened'], total['screen_cpu_s']),
+        'cpu_s_per_safe_prime': generate_cost * candidates_per_safe_prime + screen_cost
+        if None not in (generate_cost, candidates_per_safe_prime, screen_cost) else None,
+    }
+
+
+class RunHistory(object):
+    """
+    Append-only record of generation and screening jobs, one JSON object per line.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Args:
+            path: History file, created on first record.
+        """
+        self.path = path
+        self._lock = Lock()
+
+    def record(self, stage: str, key_length: int, **fields) -> dict:
+        """
+        Appends one job record.
+
+        Args:
+            stage: 'generate' or 'screen'.
+            key_length: Moduli key length of the job.
+            fields: Job measurements, e.g. runs, candidates, safe_primes, and its cost, wall_s and cpu_s.
+
+        Returns:
+            The record written.
+        """
+        entry = {'timestamp': datetime.now(tz=timezone.utc).isoformat(), 'stage': stage, 'key_length': key_length, **fields}
+        with self._lock, self.path.open('a') as f:
+            f.write(dumps(entry) + '\n')
+        return entry
+
+    def records(self, stage: str = None) -> Iterator[dict]:
+        """
+        Streams recorded jobs, oldest first.
+
+        Args:
+            stage: Optional stage filter.
+
+        Yields:
+            Job records.
+        """
+        if not self.path.exists():
+            return
+        with self.path.open('r') as f:
+            for line in f:
+                if line.strip():
+                    entry = loads(line)
+                    if not stage or entry['stage'] == stage:
+                        yield entry
+
+    def yield_model(self) -> Dict[int, dict]:
+        """
+        Screening yield per key length, from the recorded jobs.
+
+        Returns:
+            {key_length: {'candidates_per_run', 'safe_primes_per_candidate', 'safe_primes_per_run'}}, with
+            None for a ratio that has no history yet.
+        """
+        totals: Dict[int, Dict[str, int]] = {}
+        for entry in self.records():
+            total = totals.setdefault(entry['key_length'],
+                                      {'runs': 0, 'generated': 0, 'candidates': 0, 'safe_primes': 0})
+            if entry['stage'] == 'generate':
+                total['runs'] += entry.get('runs', 0)
+                total['generated'] += entry.get('candidates', 0)
+            elif entry['stage'] == 'screen':
+                total['candidates'] += entry.get('candidates', 0)
+                total['safe_primes'] += entry.get('safe_primes', 0)
+
+        model = {}
+        for key_length, total in totals.items():
+            per_run = total['generated'] / total['runs'] if total['runs'] else None
+            per_candidate = total['safe_primes'] / total['candidates'] if total['candidates'] else None
+            model[key_length] = {
+                'candidates_per_run': per_run,
+                'safe_primes_per_candidate': per_candidate,
+                'safe_primes_per_run': per_run * per_candidate if per_run and per_candidate is not None else None,
+            }
+        return model
+
+    def production_stats(self, period: str = 'week') -> Dict[int, dict]:
+        """
+        Production statistics per key length, overall and per period: yield, throughput per CPU hour and CPU
+        seconds per safe prime. Throughput and cost count only jobs recorded with their cost; a job resumed after
+        an interruption is recorded with the cost of the run that completed it.
+
+        Args:
+            period: One of PERIODS.
+
+        Returns:
+            {key_length: {'total': stats, 'periods': {period: stats}}}, periods oldest first, where stats holds the
+            summed runs, generated, screened and safe_primes and the wall_s and cpu_s of each stage, with the
+            ratios safe_primes_per_candidate, safe_primes_per_run, generated_per_cpu_hour, screened_per_cpu_hour
+            and cpu_s_per_safe_prime, None while undefined.
+
+        Raises:
+            ValueError: If the period is unknown.
+        """
+        if period not in PERIODS:
+            raise ValueError(f'Unknown period: {period}. Available: {PERIODS}')
+
+        totals: Dict[int, Dict[str, Dict[str, float]]] = {}
+        for entry in self.records():
+            by_period = totals.setdefault(entry['key_length'], {})
+            for label in ('total', period_of(entry['timestamp'], period)):
+                total = by_period.setdefault(label, dict.fromkeys((
+                    'runs', 'generated', 'generate_wall_s', 'generate_cpu_s', 'metered_generated', 'screened',
+                    'safe_primes', 'screen_wall_s', 'screen_cpu_s', 'metered_screened', 'metered_safe_primes'), 0))
+                metered = 'cpu_s' in entry
+                if entry['stage'] == 'generate':
+                    total['runs'] += entry.get('runs', 0)
+                    total['generated'] += entry.get('candidates', 0)
+                    if metered:
+                        total['generate_wall_s'] += entry['wall_s']
+                        total['generate_cpu_s'] += entry['cpu_s']
+                        total['metered_generated'] += entry.get('candidates', 0)
+                elif entry['stage'] == 'screen':
+                    total['screened'] += entry.get('candidates', 0)
+                    total['safe_primes'] += entry.get('safe_primes', 0)
+                    if metered:
+                        total['screen_wall_s'] += entry['wall_s']
+                        total['screen_cpu_s'] += entry['cpu_s']
+                        total['metered_screened'] += entry.get('candidates', 0)
+                        total['metered_safe_primes'] += entry.get('safe_primes', 0)
+
+        stats = {}
+        for key_length, by_period in sorted(totals.items()):
+            total = by_period.pop('total')
+            stats[key_length] = {'total': _production(total),
+                                 'periods': {label: _production(by_period[label]) for label in sorted(by_period)}}
+        return stats
+
+
+def _number(value: Optional[float], spec: str) -> str:
+    return '-' if value is None else format(value, spec)
+
+
+def print_production_stats(stats: Dict[int, dict]) -> None:
+    """
+    Prints `RunHistory.production_stats`, per bitsize: the overall line, then one line per period. Falling
+    candidates per CPU hour from one period to the next, with the same sieve settings, flag a slower ssh-keygen.
+
+    Args:
+        stats: Result of `production_stats`.
+    """
+    if not stats:
+        print('No generation or screening jobs recorded')
+        return
+    print(f'{"Bits":<6} {"Period":<10} {"Runs":>5} {"Generated":>10} {"Screened":>10} {"Primes":>7} {"Yield":>9} '
+          f'{"Primes/run":>10} {"Gen/CPU-h":>10} {"Scr/CPU-h":>10} {"CPU-s/prime":>11} {"CPU-h":>8} {"Wall-h":>8}')
+    for key_length, production in stats.items():
+        for label, row in [('all', production['total'])] + list(production['periods'].items()):
+            print(f'{key_length:<6} {label:<10} {row["runs"]:>5} {row["generated"]:>10} {row["screened"]:>10} '
+                  f'{row["safe_primes"]:>7} {_number(row["safe_primes_per_candidate"], ".5f"):>9} '
+                  f'{_number(row["safe_primes_per_run"], ".1f"):>10} '
+                  f'{_number(row["generated_per_cpu_hour"], ".0f"):>10} '
+                  f'{_number(row["screened_per_cpu_hour"], ".0f"):>10} '
+                  f'{_number(row["cpu_s_per_safe_prime"], ".1f"):>11} '
+                  f'{(row["generate_cpu_s"] + row["screen_cpu_s"]) / 3600:>8.2f} '
+                  f'{(row["generate_wall_s"] + row["screen_wall_s"]) / 3600:>8.2f}')
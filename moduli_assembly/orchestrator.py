@@ -0,0 +1,371 @@
+import asyncio
+import os
+import signal
+import time
+from json import loads
+from logging import getLogger
+from pathlib import PosixPath as Path
+from typing import (Awaitable, Callable, List, Optional, Set, Tuple)
+
+from moduli_assembly.spool import compression_of
+from moduli_assembly.trace import (charge, children_cpu, metered, process_name, record_process, span)
+
+logger = getLogger(__name__)
+
+# Seconds an ssh-keygen child is given to exit after SIGTERM before it is killed
+DEFAULT_GRACE = 10.0
+
+
+class AsyncOrchestrator(object):
+    """
+    Drives the generate and screen stages of a ModuliAssembly as asyncio subprocesses, so one controller
+    process runs many ssh-keygen workers. Concurrency is bounded per stage, each ssh-keygen run can be given
+    a timeout, and SIGINT or SIGTERM stops every child with their checkpoints left consistent for `--restart`.
+    With a LoadScheduler, the bounds follow the idle capacity of the host, up to `generators` and `screeners`.
+    """
+
+    def __init__(self, ma, generators: int = 4, screeners: int = 4, timeout: float = None,
+                 grace: float = DEFAULT_GRACE, scheduler=None) -> None:
+        """
+        Args:
+            ma: ModuliAssembly whose files, checkpoints and history are used.
+            generators: Maximum concurrent `ssh-keygen -M generate` processes.
+            screeners: Maximum concurrent `ssh-keygen -M screen` processes.
+            timeout: Optional seconds allowed for each ssh-keygen process.
+            grace: Seconds a child is given to exit after SIGTERM before it is killed.
+            scheduler: Optional `moduli_assembly.scheduler.LoadScheduler`.
+
+        Raises:
+            ValueError: If generators or screeners is not positive.
+        """
+        if generators <= 0 or screeners <= 0:
+            raise ValueError("generators and screeners must be positive integers")
+        self.ma = ma
+        self.generators = generators
+        self.screeners = screeners
+        self.timeout = timeout
+        self.grace = grace
+        self.scheduler = scheduler
+        self.interrupted: Optional[int] = None
+        self._processes: Set[asyncio.subprocess.Process] = set()
+        self._screening: Set[asyncio.subprocess.Process] = set()
+        self._children_cpu = children_cpu()
+
+    async def _stop(self, process: asyncio.subprocess.Process) -> None:
+        """
+        Forwards SIGTERM to a child and waits for it to exit, killing it after the grace period.
+        """
+        if process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            # A child paused by the scheduler only acts on SIGTERM once continued
+            process.send_signal(signal.SIGCONT)
+        except ProcessLookupError:
+            pass
+        try:
+            await asyncio.wait_for(process.wait(), self.grace)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+    async def run_command(self, command: List[str], slots: asyncio.Semaphore) -> None:
+        """
+        Runs one ssh-keygen command once a slot is free.
+
+        Args:
+            command: Argument list.
+            slots: Stage concurrency bound.
+
+        Raises:
+            RuntimeError: If the command fails or times out.
+        """
+        await self.run_pipeline([command], slots)
+
+    async def run_pipeline(self, commands: List[List[str]], slots: asyncio.Semaphore, output: Path = None) -> None:
+        """
+        Runs an ssh-keygen command, with any decompressor or compressor of a candidate spool piped to it, once a
+        slot is free. The pipeline, timeout and stop all apply to every process, as to one command.
+
+        Children run in their own session, so a terminal Ctrl-C reaches only the controller, which decides
+        how they stop.
+
+        Args:
+            commands: Argument lists, see `moduli_assembly.spool.run_pipeline`.
+            slots: Stage concurrency bound.
+            output: Optional file receiving the standard output of the last command.
+
+        Raises:
+            RuntimeError: If a command fails or the pipeline times out.
+        """
+        name = ' '.join(next((command for command in commands if '-M' in command), commands[-1])[:3])
+        names = [process_name(command) for command in commands]
+        if self.scheduler:
+            commands = [self.scheduler.wrap(command) for command in commands]
+        screening = slots is self._screen_slots
+        async with slots:
+            processes: List[asyncio.subprocess.Process] = []
+            out = output.open('wb') if output else None
+            started = time.perf_counter()
+            try:
+                stdin = None
+                for index, command in enumerate(commands):
+                    last = index == len(commands) - 1
+                    read_fd, write_fd = (None, None) if last else os.pipe()
+                    try:
+                        process = await asyncio.create_subprocess_exec(*command, stdin=stdin,
+                                                                       stdout=out if last else write_fd,
+                                                                       start_new_session=True)
+                    except BaseException:
+                        if read_fd is not None:
+                            os.close(read_fd)
+                        raise
+                    finally:
+                        # The children hold the pipe ends now
+                        if stdin is not None:
+                            os.close(stdin)
+                        if write_fd is not None:
+                            os.close(write_fd)
+                    stdin = read_fd
+                    processes.append(process)
+                    self._processes.add(process)
+                    if screening:
+                        self._screening.add(process)
+                returncodes = await asyncio.wait_for(asyncio.gather(*(process.wait() for process in processes)),
+                                                     self.timeout)
+            except asyncio.TimeoutError:
+                await asyncio.gather(*(self._stop(process) for process in processes))
+                raise RuntimeError(f'{name} timed out after {self.timeout}s')
+            except BaseException:
+                await asyncio.gather(*(self._stop(process) for process in processes))
+                raise
+            finally:
+                self._processes.difference_update(processes)
+                self._screening.difference_update(processes)
+                # The event loop reaps the children, so their spans have wall time but no resource usage
+                for command, process, process_label in zip(commands, processes, names):
+                    record_process(command, started, process.pid, process.returncode, name=process_label)
+                # Charge the job with the CPU of the children reaped since the last pipeline finished: exact
+                # unless pipelines of two jobs finish in the same event loop iteration
+                cpu = children_cpu()
+                charge(cpu - self._children_cpu)
+                self._children_cpu = cpu
+                if out:
+                    out.close()
+
+        for index, returncode in enumerate(returncodes):
+            # A decompressor is cut off by SIGPIPE once ssh-keygen has read its line range
+            if returncode and not (index < len(commands) - 1 and returncode == -signal.SIGPIPE):
+                raise RuntimeError(f'{name} exited with status {returncode}')
+
+    @staticmethod
+    async def _all(awaitables: List[Awaitable]) -> list:
+        """
+        Gathers awaitables, cancelling and awaiting the rest as soon as one fails.
+        """
+        tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def generate(self, key_length: int, count: int, candidate_path: Path = None) -> Path:
+        """
+        Asynchronous `ModuliAssembly.generate_candidates`, with the same generation checkpoint.
+
+        Args:
+            key_length: Moduli key length.
+            count: Number of ssh-keygen runs.
+            candidate_path: Candidate file of an interrupted generation to resume.
+
+        Returns:
+            Path to the candidate file.
+        """
+        with span('generate'), metered():
+            candidate_file, state = await asyncio.to_thread(self.ma.begin_generation, key_length, count, candidate_path)
+            append_lock = asyncio.Lock()
+
+            async def generate_run(run: int) -> None:
+                part = self.ma.create_generation_part_path(candidate_file, run)
+                try:
+                    commands, output = self.ma.generate_pipeline(key_length, part, int(state['starts'][run], 16),
+                                                                 compression_of(candidate_file))
+                    await self.run_pipeline(commands, self._generate_slots, output)
+                    async with append_lock:
+                        await asyncio.to_thread(self.ma.append_generation_run, candidate_file, state, run, part)
+                finally:
+                    part.unlink(missing_ok=True)
+
+            await self._all([generate_run(run) for run in self.ma.pending_generation_runs(state)])
+            return await asyncio.to_thread(self.ma.finish_generation, candidate_file, state)
+
+    async def screen(self, candidate_path: Path, shards: int = None) -> Path:
+        """
+        Asynchronous `ModuliAssembly.screen_candidates`: ssh-keygen screening whole or in shards, or, with the
+        native backend, `ModuliAssembly.screen_candidates_native` in a thread, holding one screening slot.
+
+        Args:
+            candidate_path: Candidate file to screen.
+            shards: Number of line range shards, or native screening processes, defaults to the calibrated
+                    setting, else 1.
+
+        Returns:
+            Path to the screened moduli file.
+
+        Raises:
+            ValueError: If the configured screening backend is unknown.
+        """
+        from moduli_assembly import SCREENING_BACKENDS
+
+        backend = self.ma.config.get('screening_backend', 'ssh-keygen')
+        if backend not in SCREENING_BACKENDS:
+            raise ValueError(f'Unknown screening backend: {backend}. Available: {SCREENING_BACKENDS}')
+
+        with span('screen'), metered():
+            shards = shards or self.ma.tuning(self.ma.key_length_of(candidate_path)).get('shards', 1)
+            candidates = await asyncio.to_thread(self.ma.count_lines, candidate_path)
+            await asyncio.to_thread(self.ma.prefilter_unscreened, candidate_path)
+            logger.info(f'Screening {candidate_path} for Safe Primes')
+
+            if backend == 'native':
+                async with self._screen_slots:
+                    cpu = children_cpu()
+                    screened_path = await asyncio.to_thread(self.ma.screen_candidates_native, candidate_path,
+                                                            shards)
+                    # Charged by screen_candidates_native itself: keep it out of the next pipeline's charge
+                    self._children_cpu += children_cpu() - cpu
+            elif shards > 1 or self.ma.existing_shard_ranges(candidate_path):
+                ranges = await asyncio.to_thread(self.ma.claim_shard_ranges, candidate_path, shards)
+
+                async def screen_shard(shard: Tuple[int, int]) -> None:
+                    shard_path, checkpoint = self.ma.create_shard_paths(candidate_path, *shard)
+                    if not checkpoint.exists():
+                        return
+                    await self.run_pipeline(self.ma.screen_pipeline(candidate_path, shard_path, checkpoint, *shard),
+                                            self._screen_slots)
+                    checkpoint.unlink(missing_ok=True)
+
+                await self._all([screen_shard(shard) for shard in ranges])
+                screened_path = await asyncio.to_thread(self.ma.merge_shards, candidate_path, ranges)
+            else:
+                screened_path = self.ma.get_screened_path(candidate_path)
+                await self.run_pipeline(self.ma.screen_pipeline(candidate_path, screened_path,
+                                                                self.ma.create_checkpoint_filename(candidate_path)),
+                                        self._screen_slots)
+                candidate_path.unlink(missing_ok=True)
+
+            return await asyncio.to_thread(self.ma.record_screening, candidate_path, candidates, screened_path)
+
+    async def pipeline(self, jobs: List[Tuple[int, int]], shards: int = None,
+                       on_candidate: Callable[[Path], None] = None) -> List[Path]:
+        """
+        Asynchronous `ModuliAssembly.pipeline_candidates`: every job is generated then screened, with the
+        stage bounds, rather than the number of jobs, limiting concurrency.
+
+        Args:
+            jobs: (key_length, count) generation jobs.
+            shards: Number of line range shards per screening job.
+            on_candidate: Optional callback, called with each candidate file as it enters screening.
+
+        Returns:
+            Paths to the screened moduli files, in job order, largest key length first.
+        """
+
+        async def job(key_length: int, count: int) -> Path:
+            candidate = await self.generate(key_length, count)
+            if on_candidate:
+                on_candidate(candidate)
+            return await self.screen(candidate, shards)
+
+        return await self._all([job(key_length, count)
+                                for key_length, count in sorted(jobs, key=lambda job: job[0], reverse=True)])
+
+    async def restart(self, shards: int = None) -> List[Path]:
+        """
+        Asynchronous `ModuliAssembly.restart_candidate_screening`.
+
+        Returns:
+            Paths to the screened moduli files.
+        """
+        async def resume(candidate_path: Path) -> Path:
+            if self.ma.is_generating(candidate_path):
+                state = loads(self.ma.create_generation_state_path(candidate_path).read_text())
+                candidate_path = await self.generate(state['key_length'], len(state['starts']), candidate_path)
+            return await self.screen(candidate_path, shards)
+
+        return await self._all([resume(candidate_path)
+                                for candidate_path in sorted(self.ma.config['moduli_dir'].glob('????.candidate*'))])
+
+    def _flush_checkpoints(self) -> None:
+        """
+        Syncs every checkpoint in the moduli directory to disk and drops partial generation outputs.
+        """
+        moduli_dir = self.ma.config['moduli_dir']
+        for path in moduli_dir.glob('.*'):
+            if path.name.endswith('.part'):
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        fd = os.open(moduli_dir, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    async def _main(self, stage: Awaitable):
+        if self.scheduler:
+            from moduli_assembly.scheduler import AdaptiveSlots
+            self._generate_slots = AdaptiveSlots(self.generators)
+            self._screen_slots = AdaptiveSlots(self.screeners)
+            scheduling = asyncio.ensure_future(self.scheduler.run(self))
+        else:
+            self._generate_slots = asyncio.Semaphore(self.generators)
+            self._screen_slots = asyncio.Semaphore(self.screeners)
+            scheduling = None
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(stage)
+
+        def shutdown(signum: int) -> None:
+            if self.interrupted is None:
+                logger.warning(f'Received {signal.Signals(signum).name}: stopping {len(self._processes)} ssh-keygen '
+                               f'processes')
+                self.interrupted = signum
+                task.cancel()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, shutdown, signum)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if self.interrupted is None:
+                raise
+            return None
+        finally:
+            if scheduling:
+                scheduling.cancel()
+                await asyncio.gather(scheduling, return_exceptions=True)
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(signum)
+            await asyncio.to_thread(self._flush_checkpoints)
+
+    def run(self, stage: Callable[..., Awaitable], *args, **kwargs):
+        """
+        Runs one stage coroutine, e.g. `orchestrator.run(orchestrator.pipeline, jobs)`, in a new event loop.
+        On SIGINT or SIGTERM the stage is cancelled, its children stopped and checkpoints flushed, and
+        `interrupted` is set to the signal number.
+
+        Returns:
+            The stage result, or None when interrupted.
+        """
+        self.interrupted = None
+        return asyncio.run(self._main(stage(*args, **kwargs)))
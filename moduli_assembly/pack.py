@@ -0,0 +1,206 @@
+import mmap
+import os
+import struct
+from pathlib import PosixPath as Path
+from random import (Random, SystemRandom)
+from typing import (BinaryIO, Dict, Iterable, Iterator, List, Tuple)
+
+# Pack layout, all integers big-endian:
+#   header   MAGIC, format version (u16), number of sections (u16), reserved (u32)
+#   index    one entry per bitsize: size field (u32), modulus bytes (u32), moduli (u32), records offset (u64)
+#   records  per bitsize, fixed size: created YYYYMMDDHHMMSS (u64), type (u8), tests (u8), trials (u16),
+#            generator (u32), then the modulus, unsigned, in `modulus bytes`
+MAGIC = b'MODPACK\0'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('>8sHHI')
+INDEX_ENTRY = struct.Struct('>IIIQ')
+RECORD = struct.Struct('>QBBHI')
+
+
+def _modulus_bytes(size: int) -> int:
+    # The size field is the modulus bit length less one
+    return (size + 8) // 8
+
+
+def pack_records(lines: Iterable[str]) -> Dict[int, List[bytes]]:
+    """
+    Packs moduli lines, skipping comments, blank and malformed lines.
+
+    Returns:
+        {size field: packed records}
+
+    Raises:
+        ValueError: If a modulus is larger than its size field states.
+    """
+    sections: Dict[int, List[bytes]] = {}
+    for line in lines:
+        fields = line.split()
+        if len(fields) != 7 or line.startswith('#'):
+            continue
+        try:
+            created, moduli_type, tests, trials, size = (int(field) for field in fields[:5])
+            generator, modulus = int(fields[5], 16), int(fields[6], 16)
+        except ValueError:
+            continue
+        try:
+            record = RECORD.pack(created, moduli_type, tests, trials, generator) + \
+                modulus.to_bytes(_modulus_bytes(size), 'big')
+        except (OverflowError, struct.error) as e:
+            raise ValueError(f'Cannot pack moduli line, {e}: {line.strip()[:80]}')
+        sections.setdefault(size, []).append(record)
+    return sections
+
+
+def write_pack(lines: Iterable[str], path: Path) -> Dict[int, int]:
+    """
+    Writes moduli lines as a pack, atomically.
+
+    Args:
+        lines: Moduli file lines.
+        path: Pack file.
+
+    Returns:
+        {bitsize: moduli}
+    """
+    sections = pack_records(lines)
+    offset = HEADER.size + INDEX_ENTRY.size * len(sections)
+    index = []
+    for size, records in sorted(sections.items()):
+        index.append(INDEX_ENTRY.pack(size, _modulus_bytes(size), len(records), offset))
+        offset += (RECORD.size + _modulus_bytes(size)) * len(records)
+
+    tmp = path.parent / f'.{path.name}.tmp'
+    with tmp.open('wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), 0))
+        f.writelines(index)
+        for _, records in sorted(sections.items()):
+            f.writelines(records)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return {size + 1: len(records) for size, records in sorted(sections.items())}
+
+
+class ModuliPack(object):
+    """
+    Read-only, memory mapped moduli pack. Records have a fixed size per bitsize, so any modulus is found by
+    arithmetic on the index, and its bytes are returned as views of the mapping, without copying or parsing.
+
+        with ModuliPack(Path('moduli.pack')) as pack:
+            index = pack.random(4096)
+            modulus, generator = pack.modulus(4096, index), pack.generator(4096, index)
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Args:
+            path: Pack file.
+
+        Raises:
+            ValueError: If the file is not a moduli pack of a known format version.
+        """
+        with path.open('rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        if len(self._mmap) < HEADER.size:
+            self.close()
+            raise ValueError(f'{path} is not a moduli pack')
+        magic, version, count, _ = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f'{path} is not a moduli pack of format version {FORMAT_VERSION}')
+
+        # {bitsize: (size field, modulus bytes, moduli, records offset)}
+        self._index: Dict[int, Tuple[int, int, int, int]] = {}
+        for entry in range(count):
+            size, modulus_bytes, moduli, offset = INDEX_ENTRY.unpack_from(self._mmap,
+                                                                          HEADER.size + entry * INDEX_ENTRY.size)
+            self._index[size + 1] = (size, modulus_bytes, moduli, offset)
+
+    def __enter__(self) -> 'ModuliPack':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._view.release()
+        self._mmap.close()
+
+    def bitsizes(self) -> Dict[int, int]:
+        """
+        Returns:
+            {bitsize: moduli}
+        """
+        return {bitsize: entry[2] for bitsize, entry in sorted(self._index.items())}
+
+    def __len__(self) -> int:
+        return sum(entry[2] for entry in self._index.values())
+
+    def _record(self, bitsize: int, index: int) -> Tuple[int, int]:
+        if bitsize not in self._index:
+            raise KeyError(f'No {bitsize} bit moduli in the pack')
+        _, modulus_bytes, moduli, offset = self._index[bitsize]
+        if not 0 <= index < moduli:
+            raise IndexError(f'{bitsize} bit modulus {index} out of range ({moduli} moduli)')
+        return offset + index * (RECORD.size + modulus_bytes), modulus_bytes
+
+    def modulus_bytes(self, bitsize: int, index: int) -> memoryview:
+        """
+        Returns:
+            The big-endian bytes of a modulus, a view of the mapping, valid until the pack is closed.
+
+        Raises:
+            KeyError: If the pack holds no moduli of the bitsize.
+            IndexError: If index is out of range.
+        """
+        start, modulus_bytes = self._record(bitsize, index)
+        return self._view[start + RECORD.size:start + RECORD.size + modulus_bytes]
+
+    def modulus(self, bitsize: int, index: int) -> int:
+        return int.from_bytes(self.modulus_bytes(bitsize, index), 'big')
+
+    def generator(self, bitsize: int, index: int) -> int:
+        return RECORD.unpack_from(self._mmap, self._record(bitsize, index)[0])[4]
+
+    def random(self, bitsize: int, rng: Random = None) -> int:
+        """
+        Args:
+            bitsize: Moduli bitsize.
+            rng: Random number generator, by default a SystemRandom, drawing from the operating system CSPRNG.
+
+        Returns:
+            The index of a modulus of the bitsize, drawn uniformly, for `modulus`, `generator` or `line`.
+
+        Raises:
+            KeyError: If the pack has no moduli of the bitsize.
+        """
+        moduli = self.bitsizes().get(bitsize, 0)
+        if not moduli:
+            raise KeyError(f'No {bitsize} bit moduli in the pack')
+        return (rng or SystemRandom()).randrange(moduli)
+
+    def line(self, bitsize: int, index: int) -> str:
+        """
+        Returns:
+            The modulus as a moduli file line, as ssh-keygen writes it.
+        """
+        start, modulus_bytes = self._record(bitsize, index)
+        created, moduli_type, tests, trials, generator = RECORD.unpack_from(self._mmap, start)
+        modulus = int.from_bytes(self._view[start + RECORD.size:start + RECORD.size + modulus_bytes], 'big')
+        return f'{created:014d} {moduli_type} {tests} {trials} {bitsize - 1} {generator:x} {modulus:X}\n'
+
+    def lines(self) -> Iterator[str]:
+        """
+        Yields:
+            Every modulus as a moduli file line, by bitsize.
+        """
+        for bitsize, moduli in self.bitsizes().items():
+            for index in range(moduli):
+                yield self.line(bitsize, index)
+
+    def write_text(self, dst: BinaryIO) -> None:
+        """
+        Converts the pack back to a moduli file.
+        """
+        dst.writelines(line.encode() for line in self.lines())
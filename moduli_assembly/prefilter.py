@@ -0,0 +1,176 @@
+import os
+import time
+from functools import lru_cache
+from math import gcd
+from pathlib import PosixPath as Path
+from typing import (List, Optional)
+
+from moduli_assembly.safe_primes import (MODULI_TESTS_COMPOSITE, MODULI_TYPE_SOPHIE_GERMAIN, gmpy2, known_generator)
+from moduli_assembly.spool import (compression_of, open_candidates)
+
+# ssh-keygen -M generate sieves q and 2q + 1 by every prime below moduli.c's SMALL_MAXIMUM, so its candidates have
+# no prime factor below SSH_KEYGEN_SIEVE_BOUND and a batch GCD against a smaller primorial drops nothing
+SSH_KEYGEN_SIEVE_BOUND = 1 << 32
+
+
+def small_primes(bound: int) -> List[int]:
+    """
+    Primes below `bound`, by the sieve of Eratosthenes.
+
+    Args:
+        bound: Exclusive upper bound.
+
+    Returns:
+        Ascending list of primes.
+    """
+    sieve = bytearray([1]) * bound
+    sieve[0:2] = b'\x00\x00'
+    for n in range(2, int(bound ** 0.5) + 1):
+        if sieve[n]:
+            sieve[n * n::n] = bytes(len(range(n * n, bound, n)))
+    return [n for n in range(bound) if sieve[n]]
+
+
+def product_tree(values: List[int]) -> List[List[int]]:
+    """
+    Product tree of `values`: leaves first, root (the product of all values) last.
+
+    Args:
+        values: Non-empty list of integers.
+
+    Returns:
+        Tree levels, each the pairwise products of the level below.
+    """
+    tree = [values]
+    while len(tree[-1]) > 1:
+        level = tree[-1]
+        tree.append([level[i] * level[i + 1] if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)])
+    return tree
+
+
+@lru_cache(maxsize=4)
+def primorial(bound: int) -> int:
+    """
+    Product of all primes below `bound`.
+
+    Args:
+        bound: Exclusive upper bound.
+
+    Returns:
+        Primorial of bound, as a gmpy2 mpz when gmpy2 is installed.
+    """
+    primes = small_primes(bound)
+    if gmpy2:
+        primes = [gmpy2.mpz(p) for p in primes]
+    return product_tree(primes)[-1][0]
+
+
+def remainders(n: int, tree: List[List[int]]) -> List[int]:
+    """
+    `n` modulo every leaf of a product tree, by descending the remainder tree.
+
+    Args:
+        n: Dividend.
+        tree: Product tree from `product_tree`.
+
+    Returns:
+        n mod leaf, for every leaf in order.
+    """
+    rems = [n % tree[-1][0]]
+    for level in reversed(tree[:-1]):
+        rems = [rems[i // 2] % value for i, value in enumerate(level)]
+    return rems
+
+
+def small_factor_free(values: List[int], bound: int) -> List[bool]:
+    """
+    Batch GCD: tests which values have no prime factor below `bound`. The remainder tree pays off with
+    gmpy2's subquadratic division; with Python integers the cost is close to one `primorial % value` each.
+
+    Args:
+        values: Integers, all larger than `bound`.
+        bound: Exclusive upper bound of the small primes.
+
+    Returns:
+        True for each value with no small prime factor.
+    """
+    if not values:
+        return []
+    if gmpy2:
+        values = [gmpy2.mpz(value) for value in values]
+    rems = remainders(primorial(bound), product_tree(values))
+    return [gcd(rem, value) == 1 for rem, value in zip(rems, values)]
+
+
+def _candidate_q(line: str) -> Optional[int]:
+    """
+    The Sophie Germain candidate q of a candidate line, or None for any other line.
+    """
+    fields = line.split()
+    if len(fields) != 7 or line.startswith('#'):
+        return None
+    if int(fields[1]) != MODULI_TYPE_SOPHIE_GERMAIN or int(fields[2]) & MODULI_TESTS_COMPOSITE:
+        return None
+    return int(fields[6], 16)
+
+
+def prefilter_file(candidate_path: Path, bound: int = 0, generator: int = 0, batch_size: int = 2048,
+                   sieved: int = SSH_KEYGEN_SIEVE_BOUND) -> dict:
+    """
+    Drops candidate lines that screening is certain to reject: when `generator` is given, 2q + 1 without that
+    generator, and, when `bound` is above the `sieved` bound of the candidate generator, q or 2q + 1 with a prime
+    factor below `bound`, found with product/remainder trees against the primorial. Below `sieved` the batch GCD
+    cannot drop anything and is skipped. The candidate file, or compressed spool, is rewritten in place, atomically.
+
+    Args:
+        candidate_path: Candidate file from `ssh-keygen -M generate`.
+        bound: Exclusive upper bound of the small primes, 0 for no batch GCD.
+        generator: Wanted generator, 0 to keep candidates of any generator.
+        batch_size: Candidate lines per product tree.
+        sieved: Bound below which the candidates are already free of prime factors.
+
+    Returns:
+        Prefilter statistics: candidates, kept and seconds.
+    """
+    started = time.monotonic()
+    candidates = kept = 0
+    batch_gcd = bound > sieved
+    filtered_path = candidate_path.parent / Path(f'.{candidate_path.name}.prefilter')
+
+    def flush(batch: List[str], qs: List[int], dst) -> int:
+        if not batch_gcd:
+            dst.writelines(batch)
+            return len(batch)
+        values = []
+        for q in qs:
+            values.extend([q, (q << 1) + 1])
+        free = small_factor_free(values, bound)
+        written = 0
+        for index, line in enumerate(batch):
+            if free[2 * index] and free[2 * index + 1]:
+                dst.write(line)
+                written += 1
+        return written
+
+    with open_candidates(candidate_path) as src, \
+            open_candidates(filtered_path, 'w', compression_of(candidate_path)) as dst:
+        batch, qs = [], []
+        for line in src:
+            q = _candidate_q(line)
+            if q is None:
+                continue
+            candidates += 1
+            if generator and known_generator((q << 1) + 1) != generator:
+                continue
+            batch.append(line)
+            qs.append(q)
+            if len(batch) == batch_size:
+                kept += flush(batch, qs, dst)
+                batch, qs = [], []
+        if batch:
+            kept += flush(batch, qs, dst)
+        dst.flush()
+        os.fsync(dst.fileno())
+
+    os.replace(filtered_path, candidate_path)
+    return {'candidates': candidates, 'kept': kept, 'seconds': time.monotonic() - started}
@@ -0,0 +1,201 @@
+import os
+from json import (dumps, loads)
+from pathlib import PosixPath as Path
+from typing import (Dict, List, Optional, Tuple)
+
+
+def read_checkpoint(path: Path) -> Optional[Tuple[int, float]]:
+    """
+    Reads an ssh-keygen screening checkpoint.
+
+    Args:
+        path: Checkpoint file.
+
+    Returns:
+        (next line to screen, checkpoint modification time), or None when there is no checkpoint.
+    """
+    try:
+        stat = path.stat()
+        text = path.read_text().strip()
+    except FileNotFoundError:
+        return None
+    return (int(text) if text.isdigit() else 0), stat.st_mtime
+
+
+class ProgressSamples(object):
+    """
+    Last checkpoint sample and line count per candidate file, kept between `--status --progress-samples` runs
+    so screening rates are measured between checkpoint writes rather than estimated from a single reading.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Args:
+            path: Samples file, JSON.
+        """
+        self.path = path
+        self.samples: Dict[str, dict] = loads(path.read_text()) if path.exists() else {}
+
+    def get(self, name: str) -> dict:
+        return self.samples.get(name, {})
+
+    def update(self, name: str, **fields) -> None:
+        self.samples[name] = fields
+
+    def save(self, names: List[str]) -> None:
+        """
+        Atomically rewrites the samples of `names`, dropping those of finished candidate files.
+        """
+        self.samples = {name: sample for name, sample in self.samples.items() if name in names}
+        tmp = self.path.parent / f'.{self.path.name}.tmp'
+        tmp.write_text(dumps(self.samples))
+        os.replace(tmp, self.path)
+
+
+def estimate(lines: int, done: int, updated: Optional[float], previous: dict, started: float,
+             now: float) -> dict:
+    """
+    Screening rate, completion and ETA of one candidate file.
+
+    Args:
+        lines: Candidate lines in the file.
+        done: Lines screened.
+        updated: Time of the last checkpoint write, None before screening starts.
+        previous: Earlier sample of this file, {'done', 'updated'}, or {}.
+        started: Fallback start time, the candidate file modification time.
+        now: Current time.
+
+    Returns:
+        'lines', 'done', 'percent', 'lines_per_second' (None when unknown), 'eta_seconds' (None when unknown)
+        and 'checkpoint_age_seconds' (None before screening starts).
+    """
+    rate = None
+    if updated is not None:
+        if previous and updated > previous['updated'] and done >= previous['done']:
+            rate = (done - previous['done']) / (updated - previous['updated'])
+        elif updated > started:
+            rate = done / (updated - started)
+    remaining = max(0, lines - done)
+    return {
+        'lines': lines,
+        'done': done,
+        'percent': 100.0 * done / lines if lines else 100.0,
+        'lines_per_second': rate,
+        'eta_seconds': remaining / rate if rate else (0.0 if not remaining else None),
+        'checkpoint_age_seconds': now - updated if updated is not None else None,
+    }
+
+
+def summarize(files: List[dict]) -> Dict[int, dict]:
+    """
+    Totals the progress of candidate files per key length.
+
+    Args:
+        files: File progress records, each an `estimate` plus 'key_length'.
+
+    Returns:
+        {key_length: {'files', 'lines', 'done', 'percent', 'lines_per_second', 'eta_seconds'}}, the ETA that of
+        the key length's files screened one after another.
+    """
+    bitsizes: Dict[int, dict] = {}
+    for record in files:
+        total = bitsizes.setdefault(record['key_length'],
+                                    {'files': 0, 'lines': 0, 'done': 0, 'lines_per_second': None, 'eta_seconds': 0.0})
+        total['files'] += 1
+        total['lines'] += record['lines']
+        total['done'] += record['done']
+        if record['lines_per_second']:
+            total['lines_per_second'] = (total['lines_per_second'] or 0.0) + record['lines_per_second']
+        if total['eta_seconds'] is not None:
+            total['eta_seconds'] = None if record['eta_seconds'] is None \
+                else total['eta_seconds'] + record['eta_seconds']
+    for total in bitsizes.values():
+        total['percent'] = 100.0 * total['done'] / total['lines'] if total['lines'] else 100.0
+    return bitsizes
+
+
+def _duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return 'unknown'
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    return (f'{days}d' if days else '') + f'{hours:02d}:{minutes:02d}:{seconds:02d}'
+
+
+def _rate(rate: Optional[float]) -> str:
+    return f'{rate:.1f}' if rate is not None else '-'
+
+
+def print_progress(report: dict) -> None:
+    """
+    Prints a `ModuliAssembly.screening_progress` report, per file and per bitsize.
+
+    Args:
+        report: Result of `screening_progress`.
+    """
+    if not report['files']:
+        print('No candidate files are being screened')
+        return
+    print(f'{"File":<48} {"Done":>9} {"Lines":>9} {"%":>6} {"Lines/s":>9} {"ETA":>12} {"Idle":>9}')
+    for record in report['files']:
+        age = record['checkpoint_age_seconds']
+        print(f'{record["file"]:<48} {record["done"]:>9} {record["lines"]:>9} {record["percent"]:>6.1f} '
+              f'{_rate(record["lines_per_second"]):>9} {_duration(record["eta_seconds"]):>12} '
+              f'{_duration(age) if age is not None else "-":>9}')
+    print(f'\n{"Bits":<6} {"Files":>5} {"Done":>9} {"Lines":>9} {"%":>6} {"Lines/s":>9} {"ETA":>12}')
+    for key_length, total in sorted(report['bitsizes'].items()):
+        print(f'{key_length:<6} {total["files"]:>5} {total["done"]:>9} {total["lines"]:>9} {total["percent"]:>6.1f} '
+              f'{_rate(total["lines_per_second"]):>9} {_duration(total["eta_seconds"]):>12}')
+
+
+_METRICS = (
+    ('lines', 'Candidate lines to screen'),
+    ('done', 'Candidate lines screened'),
+    ('percent', 'Percent of candidate lines screened'),
+    ('lines_per_second', 'Screening rate, candidate lines per second'),
+    ('eta_seconds', 'Estimated seconds until screening completes'),
+    ('checkpoint_age_seconds', 'Seconds since the screening checkpoint was last written'),
+)
+
+
+def prometheus_metrics(report: dict) -> str:
+    """
+    Renders a `screening_progress` report in the Prometheus text exposition format. Unknown values are omitted.
+
+    Args:
+        report: Result of `screening_progress`.
+
+    Returns:
+        Metrics text, per file (`moduli_assembly_screening_*`) and per key length (`moduli_assembly_bitsize_*`).
+    """
+    lines = ['# HELP moduli_assembly_status_timestamp_seconds Time of this progress report',
+             '# TYPE moduli_assembly_status_timestamp_seconds gauge',
+             f'moduli_assembly_status_timestamp_seconds {report["timestamp"]:.3f}']
+    for prefix, records in (('screening', [({'file': record['file'], 'key_length': record['key_length']}, record)
+                                           for record in report['files']]),
+                            ('bitsize', [({'key_length': key_length}, total)
+                                         for key_length, total in sorted(report['bitsizes'].items())])):
+        for field, description in _METRICS:
+            values = [(labels, record[field]) for labels, record in records if record.get(field) is not None]
+            if not values:
+                continue
+            name = f'moduli_assembly_{prefix}_{field}'
+            lines.extend([f'# HELP {name} {description}', f'# TYPE {name} gauge'])
+            for labels, value in values:
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f'{name}{{{label_text}}} {round(value, 3) if isinstance(value, float) else value}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_textfile(text: str, path: Path) -> None:
+    """
+    Atomically writes metrics for the node_exporter textfile collector, which must never read a partial file.
+
+    Args:
+        text: Metrics text.
+        path: Target `*.prom` file.
+    """
+    tmp = path.parent / f'.{path.name}.{os.getpid()}.tmp'
+    tmp.write_text(text)
+    os.replace(tmp, path)
@@ -0,0 +1,95 @@
+import os
+from math import (exp, floor, log)
+from pathlib import PosixPath as Path
+from random import Random
+from typing import (Dict, Iterable, List)
+
+
+def system_seeded_random() -> Random:
+    """
+    Returns:
+        A Mersenne Twister seeded with 256 bits from the operating system CSPRNG: unpredictable selections,
+        without a system call per random draw.
+    """
+    return Random(int.from_bytes(os.urandom(32), 'big'))
+
+
+class Reservoir(object):
+    """
+    Uniform random sample of at most `size` items from a stream of unknown length, in memory bounded by `size`:
+    Li's Algorithm L, which draws random numbers only for the items it keeps, not for every item offered.
+    """
+
+    def __init__(self, size: int, rng: Random) -> None:
+        """
+        Args:
+            size: Sample size.
+            rng: Random number generator.
+
+        Raises:
+            ValueError: If size is negative.
+        """
+        if size < 0:
+            raise ValueError("size must not be negative")
+        self.size = size
+        self.rng = rng
+        self.items: List[str] = []
+        self.seen = 0
+        self._w = 1.0
+        self._next = 0
+
+    def _skip(self) -> None:
+        # Random() is in [0, 1): 1 - random() is in (0, 1], safe for log
+        self._w *= exp(log(1.0 - self.rng.random()) / self.size)
+        self._next = self.seen + floor(log(1.0 - self.rng.random()) / log(1.0 - self._w)) if self._w < 1.0 \
+            else self.seen
+
+    def offer(self, item: str) -> None:
+        """
+        Offers the next item of the stream.
+        """
+        index = self.seen
+        self.seen += 1
+        if index < self.size:
+            self.items.append(item)
+            if self.seen == self.size:
+                self._skip()
+        elif self.size and index == self._next:
+            self.items[self.rng.randrange(self.size)] = item
+            self._skip()
+
+    def sample(self) -> List[str]:
+        """
+        Returns:
+            The sample, in random order.
+        """
+        items = list(self.items)
+        self.rng.shuffle(items)
+        return items
+
+
+def sample_moduli_files(paths: Iterable[Path], per_size: int, rng: Random = None) -> Dict[int, Reservoir]:
+    """
+    Streams moduli files line by line, sampling `per_size` moduli per size field uniformly at random.
+
+    Args:
+        paths: Screened moduli files.
+        per_size: Moduli kept per size.
+        rng: Random number generator, defaults to `system_seeded_random()`.
+
+    Returns:
+        {size field: Reservoir}, where size is the moduli file size field (key length less one).
+    """
+    rng = rng or system_seeded_random()
+    reservoirs: Dict[int, Reservoir] = {}
+    for path in paths:
+        with path.open('r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) != 7 or line.startswith('#'):
+                    continue
+                size = int(fields[4])
+                if size not in reservoirs:
+                    reservoirs[size] = Reservoir(per_size, rng)
+                reservoirs[size].offer(line if line.endswith('\n') else f'{line}\n')
+    return reservoirs
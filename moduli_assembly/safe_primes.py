@@ -0,0 +1,232 @@
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import PosixPath as Path
+from typing import (Iterator, List, Optional, Tuple)
+
+from moduli_assembly.spool import open_candidates
+
+try:
+    import gmpy2
+except ImportError:
+    gmpy2 = None
+
+# ssh-keygen moduli line fields, see moduli(5)
+MODULI_TYPE_UNSTRUCTURED = 1
+MODULI_TYPE_SAFE = 2
+MODULI_TYPE_SCHNORR = 3
+MODULI_TYPE_SOPHIE_GERMAIN = 4
+
+MODULI_TESTS_COMPOSITE = 0x01
+MODULI_TESTS_MILLER_RABIN = 0x04
+
+# ssh-keygen prints 100 trials for its default screening
+DEFAULT_PRIME_TESTS = 100
+
+SMALL_PRIMES = [p for p in range(3, 2000, 2) if all(p % d for d in range(3, int(p ** 0.5) + 1, 2))]
+
+
+def miller_rabin(n: int, trials: int) -> bool:
+    """
+    Miller-Rabin probable prime test, with random bases.
+
+    Args:
+        n: Odd integer to test.
+        trials: Number of random bases.
+
+    Returns:
+        False if n is composite, True if n is a probable prime.
+    """
+    if n < 5:
+        return n in (2, 3)
+    if not n & 1:
+        return False
+
+    d, s = n - 1, 0
+    while not d & 1:
+        d >>= 1
+        s += 1
+
+    for _ in range(trials):
+        x = pow(2 + secrets.randbelow(n - 3), d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def is_probable_prime(n: int, trials: int = DEFAULT_PRIME_TESTS) -> bool:
+    """
+    Probable prime test: trial division by small primes, then Miller-Rabin.
+    Uses gmpy2 when it is installed, Python's built-in `pow` otherwise.
+
+    Args:
+        n: Integer to test.
+        trials: Number of Miller-Rabin rounds.
+
+    Returns:
+        False if n is composite, True if n is a probable prime.
+    """
+    for p in SMALL_PRIMES:
+        if n % p == 0:
+            return n == p
+    if gmpy2:
+        return bool(gmpy2.is_prime(n, trials))
+    return miller_rabin(n, trials)
+
+
+def known_generator(p: int) -> int:
+    """
+    The DH generator ssh-keygen assigns to safe prime `p`.
+
+    Args:
+        p: Safe prime.
+
+    Returns:
+        2 or 5, or 0 when ssh-keygen would not know a generator for `p`.
+    """
+    if p % 24 == 11:
+        return 2
+    if p % 10 in (3, 7):
+        return 5
+    return 0
+
+
+def moduli_line(p: int, size: int, generator: int, tests: int, trials: int, timestamp: str = None) -> str:
+    """
+    Formats a safe prime as an /etc/ssh/moduli line, byte compatible with `ssh-keygen -M screen` output.
+
+    Args:
+        p: Safe prime.
+        size: Size field, the bit length of p less one.
+        generator: DH generator.
+        tests: Tests bitmask.
+        trials: Number of trials printed.
+        timestamp: UTC YYYYMMDDHHMMSS timestamp, defaults to now.
+
+    Returns:
+        Newline terminated moduli line.
+    """
+    if not timestamp:
+        timestamp = time.strftime('%Y%m%d%H%M%S', time.gmtime())
+    return f'{timestamp} {MODULI_TYPE_SAFE} {tests} {trials} {size} {generator:x} {p:X}\n'
+
+
+def screen_line(line: str, generator: int = 0, trials: int = DEFAULT_PRIME_TESTS) -> Optional[str]:
+    """
+    Screens one candidate line for a safe prime, the way `ssh-keygen -M screen` does: q and p = 2q + 1
+    must both be probable primes, and p must have a known generator.
+
+    Args:
+        line: Candidate line from `ssh-keygen -M generate`, or a moduli line.
+        generator: Wanted generator, 0 for any known generator.
+        trials: Number of Miller-Rabin rounds for each of q and p.
+
+    Returns:
+        Moduli line of the safe prime, or None when the candidate is rejected.
+    """
+    fields = line.split()
+    if len(fields) != 7 or line.startswith('#'):
+        return None
+
+    in_type, in_tests, in_size = int(fields[1]), int(fields[2]), int(fields[4])
+    if in_tests & MODULI_TESTS_COMPOSITE:
+        return None
+
+    if in_type == MODULI_TYPE_SOPHIE_GERMAIN:
+        q = int(fields[6], 16)
+        p = (q << 1) + 1
+        in_size += 1
+    elif in_type in (MODULI_TYPE_UNSTRUCTURED, MODULI_TYPE_SAFE, MODULI_TYPE_SCHNORR):
+        p = int(fields[6], 16)
+        q = p >> 1
+    else:
+        return None
+
+    generator_known = known_generator(p)
+    if not generator_known or (generator and generator != generator_known):
+        return None
+
+    # One cheap round on each of q and p rejects most candidates before the full rounds
+    if not is_probable_prime(q, 1) or not is_probable_prime(p, 1):
+        return None
+    if not is_probable_prime(q, trials) or not is_probable_prime(p, trials):
+        return None
+
+    return moduli_line(p, in_size, generator_known, in_tests | MODULI_TESTS_MILLER_RABIN, trials)
+
+
+def _batches(path: Path, start_line: int, batch_size: int) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Reads a candidate file in batches of lines, skipping the first `start_line` lines.
+
+    Yields:
+        (line number of the last line in the batch, batch lines)
+    """
+    batch, line_number = [], 0
+    with open_candidates(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            if line_number <= start_line:
+                continue
+            batch.append(line)
+            if len(batch) == batch_size:
+                yield line_number, batch
+                batch = []
+    if batch:
+        yield line_number, batch
+
+
+def screen_file(candidate_path: Path, screened_path: Path, checkpoint: Path = None, generator: int = 0,
+                trials: int = DEFAULT_PRIME_TESTS, workers: int = None, batch_size: int = 256) -> dict:
+    """
+    Screens a candidate file for safe primes across a process pool, appending the safe primes found to
+    `screened_path`. The checkpoint holds the last line screened, in ssh-keygen's checkpoint format, and is
+    removed once the file is complete.
+
+    Args:
+        candidate_path: Candidate file.
+        screened_path: Output moduli file, appended to.
+        checkpoint: Optional checkpoint file.
+        generator: Wanted generator, 0 for any known generator.
+        trials: Number of Miller-Rabin rounds for each of q and p.
+        workers: Number of screening processes, defaults to the number of CPUs.
+        batch_size: Lines screened between checkpoints.
+
+    Returns:
+        Screening statistics: candidates, safe_primes, seconds and candidates_per_second.
+    """
+    start_line = 0
+    if checkpoint and checkpoint.exists() and checkpoint.read_text().strip():
+        start_line = int(checkpoint.read_text().split()[0])
+
+    started = time.monotonic()
+    candidates = safe_primes = 0
+    screen = partial(screen_line, generator=generator, trials=trials)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, screened_path.open('a') as out:
+        for last_line, batch in _batches(candidate_path, start_line, batch_size):
+            for result in pool.map(screen, batch, chunksize=max(1, batch_size // 32)):
+                if result:
+                    out.write(result)
+                    safe_primes += 1
+            out.flush()
+            candidates += len(batch)
+            if checkpoint:
+                checkpoint.write_text(f'{last_line}\n')
+
+    if checkpoint:
+        checkpoint.unlink(missing_ok=True)
+
+    seconds = time.monotonic() - started
+    return {
+        'candidates': candidates,
+        'safe_primes': safe_primes,
+        'seconds': seconds,
+        'candidates_per_second': candidates / seconds if seconds else 0.0,
+    }
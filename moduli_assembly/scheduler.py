@@ -0,0 +1,228 @@
+import asyncio
+import os
+import shutil
+import signal
+from logging import getLogger
+from math import floor
+from pathlib import PosixPath as Path
+from typing import (List, Optional, Set)
+
+from moduli_assembly.calibrate import mem_available
+
+logger = getLogger(__name__)
+
+# ionice scheduling classes, by name
+IONICE_CLASSES = {'idle': '3', 'best-effort': '2'}
+# Seconds between host load samples
+DEFAULT_INTERVAL = 5.0
+# MemAvailable, in MB, below which the host is busy
+DEFAULT_MIN_MEMORY = 256
+
+
+def _quota(path: Path, v1: bool) -> Optional[float]:
+    try:
+        if v1:
+            quota = int((path / 'cpu.cfs_quota_us').read_text())
+            period = int((path / 'cpu.cfs_period_us').read_text())
+            return quota / period if quota > 0 else None
+        quota, period = (path / 'cpu.max').read_text().split()
+        return int(quota) / int(period) if quota != 'max' else None
+    except (OSError, ValueError):
+        return None
+
+
+def cgroup_cpus(root: Path = Path('/sys/fs/cgroup'), proc_cgroup: Path = Path('/proc/self/cgroup')) -> Optional[float]:
+    """
+    Returns:
+        CPUs allowed by the tightest CPU quota of this process's cgroup and its ancestors, cgroup v2 `cpu.max`
+        or v1 `cpu.cfs_quota_us`, or None without a quota.
+    """
+    try:
+        lines = proc_cgroup.read_text().splitlines()
+    except OSError:
+        return None
+    quotas = []
+    for line in lines:
+        _, controllers, group = line.split(':', 2)
+        if controllers and 'cpu' not in controllers.split(','):
+            continue
+        # v1 hierarchies are mounted per controller, v2 at the root
+        base = root / controllers if controllers else root
+        path = base / group.strip().lstrip('/')
+        while True:
+            quota = _quota(path, bool(controllers))
+            if quota:
+                quotas.append(quota)
+            if path == base:
+                break
+            path = path.parent
+    return min(quotas) if quotas else None
+
+
+class HostProbe(object):
+    """
+    Samples the capacity and load of the host: CPUs, cgroup quota, load average and available memory.
+    """
+
+    def cpus(self) -> float:
+        """
+        Returns:
+            CPUs this process may use: its affinity, capped by any cgroup quota.
+        """
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+        quota = cgroup_cpus()
+        return min(cpus, quota) if quota else float(cpus)
+
+    def load(self) -> float:
+        """
+        Returns:
+            One minute load average.
+        """
+        return os.getloadavg()[0]
+
+    def memory(self) -> Optional[int]:
+        """
+        Returns:
+            MemAvailable in MB, or None where unknown.
+        """
+        return mem_available()
+
+
+class AdaptiveSlots(object):
+    """
+    Stage concurrency bound whose limit the scheduler moves. Lowering it lets running jobs finish, but starts
+    no more until the active count drops below it; a limit of zero holds every new job.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.active = 0
+        self._changed = asyncio.Condition()
+
+    async def __aenter__(self) -> None:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def __aexit__(self, *exc) -> None:
+        async with self._changed:
+            self.active -= 1
+            self._changed.notify_all()
+
+    async def set_limit(self, limit: int) -> None:
+        async with self._changed:
+            self.limit = limit
+            self._changed.notify_all()
+
+
+class LoadScheduler(object):
+    """
+    Fits the ssh-keygen workers of an AsyncOrchestrator to the idle capacity of a shared host. Every `interval`
+    seconds it samples the host and sets both stage bounds to the CPUs left over by the foreground load, within
+    the configured maxima. When no CPU is left, or memory runs low, it holds new jobs and pauses running
+    screening jobs with SIGSTOP, and resumes them with SIGCONT once a CPU is free again. Every process runs
+    under `nice` and, where available, `ionice`.
+    """
+
+    def __init__(self, probe: HostProbe = None, interval: float = DEFAULT_INTERVAL, nice: int = 15,
+                 ionice: Optional[str] = 'idle', reserve: float = 0.0, min_memory: int = DEFAULT_MIN_MEMORY) -> None:
+        """
+        Args:
+            probe: Host sampler, defaults to HostProbe().
+            interval: Seconds between samples.
+            nice: Niceness increment of every process.
+            ionice: I/O scheduling class of every process, a key of IONICE_CLASSES, or None to leave it.
+            reserve: CPUs always left to the foreground.
+            min_memory: MemAvailable, in MB, below which the host is busy.
+
+        Raises:
+            ValueError: If ionice is not a known class.
+        """
+        if ionice is not None and ionice not in IONICE_CLASSES:
+            raise ValueError(f'ionice must be one of {", ".join(IONICE_CLASSES)}')
+        self.probe = probe or HostProbe()
+        self.interval = interval
+        self.nice = nice
+        self.ionice = ionice
+        self.reserve = reserve
+        self.min_memory = min_memory
+        self.paused = False
+        self._stopped: Set[asyncio.subprocess.Process] = set()
+        self._ionice = shutil.which('ionice') if ionice else None
+
+    def wrap(self, command: List[str]) -> List[str]:
+        """
+        Returns:
+            The command, run under nice and ionice. Both exec the command, so its pid is the process's.
+        """
+        prefix = ['nice', '-n', str(self.nice)] if self.nice else []
+        if self._ionice:
+            prefix += [self._ionice, '-c', IONICE_CLASSES[self.ionice]]
+        return prefix + command
+
+    def plan(self, running: int) -> int:
+        """
+        Decides the number of workers from a host sample.
+
+        Args:
+            running: Own processes running, counted in the load average.
+
+        Returns:
+            Workers to run, 0 when the host is busy.
+        """
+        free = self.probe.cpus() - max(0.0, self.probe.load() - running) - self.reserve
+        memory = self.probe.memory()
+        if memory is not None and memory < self.min_memory:
+            return 0
+        # Resume only once a CPU and a half is free, so a load hovering at capacity does not flap
+        return floor(free) if free >= (1.5 if self.paused else 1.0) else 0
+
+    def _signal(self, processes: Set[asyncio.subprocess.Process], signum: int) -> None:
+        for process in processes:
+            if process.returncode is None:
+                try:
+                    process.send_signal(signum)
+                except ProcessLookupError:
+                    pass
+
+    def pause(self, processes: Set[asyncio.subprocess.Process]) -> None:
+        self._stopped |= processes
+        self._signal(processes, signal.SIGSTOP)
+
+    def resume(self) -> None:
+        self._signal(self._stopped, signal.SIGCONT)
+        self._stopped.clear()
+
+    async def step(self, orchestrator) -> int:
+        """
+        Samples the host once and applies the plan to an orchestrator's stage bounds and screening processes.
+
+        Returns:
+            Planned workers.
+        """
+        running = len(orchestrator._processes - self._stopped)
+        workers = self.plan(running)
+        await orchestrator._generate_slots.set_limit(min(orchestrator.generators, workers))
+        await orchestrator._screen_slots.set_limit(min(orchestrator.screeners, workers))
+        if not workers:
+            if not self.paused:
+                logger.info(f'Host busy: pausing {len(orchestrator._screening)} screening processes')
+            self.paused = True
+            # Processes started since the last pause are stopped too
+            self.pause(orchestrator._screening - self._stopped)
+        elif self.paused:
+            logger.info(f'Host idle: resuming {len(self._stopped)} screening processes, {workers} workers')
+            self.paused = False
+            self.resume()
+        return workers
+
+    async def run(self, orchestrator) -> None:
+        """
+        Steps until cancelled, then resumes anything it paused.
+        """
+        try:
+            while True:
+                await self.step(orchestrator)
+                await asyncio.sleep(self.interval)
+        finally:
+            self.resume()
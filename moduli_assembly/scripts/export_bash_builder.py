@@ -10,16 +10,16 @@ def main():
 
     NICE="nice +15"
     GEN_MODULI="python -m moduli_assembly"
-    GEN_OPTS="-b 3072 4096 6144 7680 8192"
+    GEN_OPTS="-b 3072 3072 3072 3072 4096 4096 4096 4096 6144 6144 6144 6144 7680 7680 7680 7680 8192 8192 8192 8192"
+    JOBS="--jobs 4"
     LOG="all.gen.log"
 
-    rm $LOG
+    rm -f $LOG
     touch $LOG
 
     # Four Runs of ssh-keygen Per Bitsize will generate a file with sufficient entries per bitsize (~80)
-    for ((ii = 0; i < 4; i++)); do
-      ${NICE} ${GEN_MODULI} ${GEN_OPTS} > $LOG 2>1
-    done
+    # Runs as parallel workers with non-overlapping start points
+    ${NICE} ${GEN_MODULI} ${GEN_OPTS} ${JOBS} >> $LOG 2>&1
 
     ''')
 
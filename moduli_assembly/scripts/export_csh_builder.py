@@ -10,15 +10,15 @@ def main():
     
     set NICE="nice +15"
     set GEN_MODULI="python -m moduli_assembly"
-    set GEN_OPTS="--all"
+    set GEN_OPTS="-b 3072 3072 3072 3072 4096 4096 4096 4096 6144 6144 6144 6144 7680 7680 7680 7680 8192 8192 8192 8192"
+    set JOBS="--jobs 4"
     set LOG="all.gen.log"
     
     # Four Runs of ssh-keygen Per Bitsize will generate a file with sufficient entries per bitsize (~80)
-    rm $LOG
+    # Runs as parallel workers with non-overlapping start points
+    rm -f $LOG
     touch $LOG
-    foreach run ( 0 1 2 3 )
-        $NICE $GEN_MODULI $GEN_OPTS >>& $LOG&
-    end
+    $NICE $GEN_MODULI $GEN_OPTS $JOBS >>& $LOG&
     ''')
 
 
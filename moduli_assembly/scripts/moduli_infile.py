@@ -2,49 +2,113 @@
 from argparse import ArgumentParser
 from pathlib import PosixPath as Path
 
+# Sizes always reported by `moduli_infile`, even when absent
+authorized_bitsizes = (2047, 3071, 4095, 6143, 7679, 8191)
+
 
 def args():
     parser = ArgumentParser(description='Moduli In File')
-    parser.add_argument('-f', '--file', type=str, default='/etc/ssh/moduli',
-                        help='moduli_infile -f <moduli_file')
+    parser.add_argument('-f', '--file', type=str, nargs='+', default=['/etc/ssh/moduli'],
+                        help='moduli_infile -f <moduli_file> [<moduli_file> ...]')
     return parser.parse_args()
 
 
+def _count(table: dict, key) -> None:
+    table[key] = table.get(key, 0) + 1
+
+
+def moduli_distribution(*infiles: Path) -> dict:
+    """
+    Streams one or more moduli files in a single pass, and tallies their moduli by field.
+    Files are read in 1 MiB chunks, so memory does not grow with file size, and any modulus size is accepted.
+
+    :param infiles: Paths to moduli files
+    :type infiles: PosixPath
+    :return: Tallies: 'files', 'moduli', 'invalid' (malformed lines), and per field counts 'sizes', 'generators',
+        'types', 'tests', 'trials', plus 'timestamps', the first and last timestamp per size
+    :rtype: dict
+    :raises FileNotFoundError: If a moduli file doesn't exist
+    """
+    stats = {'files': [], 'moduli': 0, 'invalid': 0, 'sizes': {}, 'generators': {}, 'types': {}, 'tests': {},
+             'trials': {}, 'timestamps': {}}
+
+    for infile in infiles:
+        if not infile.exists():
+            raise FileNotFoundError(f'Provided moduli file, {infile}, Doesn\'t Exist')
+        stats['files'].append(str(infile))
+
+        with infile.open('rb', buffering=1 << 20) as f:
+            for line in f:
+                # Skip Comment and Blank Lines, Bypasses MODULI Header Line
+                if line.startswith(b'#') or not line.strip():
+                    continue
+                fields = line.split(None, 6)
+                if len(fields) != 7:
+                    stats['invalid'] += 1
+                    continue
+                try:
+                    timestamp = fields[0].decode()
+                    moduli_type, tests, trials, size = (int(field) for field in fields[1:5])
+                    generator = int(fields[5], 16)
+                except ValueError:
+                    stats['invalid'] += 1
+                    continue
+
+                stats['moduli'] += 1
+                _count(stats['sizes'], size)
+                _count(stats['generators'], generator)
+                _count(stats['types'], moduli_type)
+                _count(stats['tests'], tests)
+                _count(stats['trials'], trials)
+                first, last = stats['timestamps'].get(size, (timestamp, timestamp))
+                stats['timestamps'][size] = (min(first, timestamp), max(last, timestamp))
+
+    return stats
+
+
 def moduli_infile(infile):
     """
     Determine Frequency Distribution of Moduli Keylengths in Local [/usr/local]/etc/ssh/moduli
     :param infile: Path to moduli file
     :type infile: PosixPath
     :return: Frequency Table of Moduli Keylengths in Selected moduli file
-    :rtype: text
+    :rtype: dict
+    :raises FileNotFoundError: If the moduli file doesn't exist
     """
-    authorized_bitsizes = (2047, 3071, 4095, 6143, 7679, 8191)
     bitsizes = {}
     for bs in authorized_bitsizes:
         bitsizes[str(bs)] = 0
 
-    if infile.exists():
-        lines = infile.read_text().split('\n')
-        for line in lines:
-            if line.startswith('#') or line.startswith(' '):
-                continue
-            # Skip Comment and Blank Lines, Bypasses MODULI Header Line
-            if line:
-                bitsizes[line.split(' ')[4]] += 1
+    for size, count in sorted(moduli_distribution(infile)['sizes'].items()):
+        bitsizes[str(size)] = count
+
+    return bitsizes
 
-        return bitsizes
-    else:
-        print(f'Error: Provided moduli file, {infile.name}, Doesn\'t Exist')
-        exit(1)
+
+def print_distribution(stats: dict) -> None:
+    """
+    Prints the tallies of `moduli_distribution`.
+
+    :param stats: Result of `moduli_distribution`
+    :type stats: dict
+    """
+    print(f'\nModulus Frequency of {", ".join(stats["files"])}:')
+    print(f'Mod  Count  First           Last')
+    for size in sorted(stats['sizes']):
+        first, last = stats['timestamps'][size]
+        print(f'{size} {stats["sizes"][size]:>6}  {first}  {last}')
+    for field in ('generators', 'types', 'tests', 'trials'):
+        print(f'{field.capitalize()}: ' + ', '.join(f'{key}: {count}' for key, count in sorted(stats[field].items())))
+    print(f'Moduli: {stats["moduli"]}, Invalid Lines: {stats["invalid"]}')
 
 
 def main():
     largs = args()
-    freq_table = moduli_infile(Path(largs.file))
-    print(f'\nModulus Frequency of {largs.file}:')
-    print(f'Mod  Count')
-    for modulus in freq_table:
-        print(modulus, freq_table[modulus])
+    try:
+        print_distribution(moduli_distribution(*(Path(file) for file in largs.file)))
+    except FileNotFoundError as e:
+        print(f'Error: {e}')
+        return 1
 
 
 if __name__ == '__main__':
@@ -0,0 +1,139 @@
+import gzip
+import signal
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import PosixPath as Path
+from typing import (IO, Iterator, List, Optional)
+
+from moduli_assembly.trace import wait_process
+
+# Candidate spool compressions, by candidate file suffix
+COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def compression_of(path: Path) -> Optional[str]:
+    """
+    Args:
+        path: Candidate file.
+
+    Returns:
+        The compression of a candidate spool, from its suffix, or None for a plain candidate file.
+    """
+    for compression, suffix in COMPRESSIONS.items():
+        if path.name.endswith(suffix):
+            return compression
+    return None
+
+
+def compress_command(compression: str) -> List[str]:
+    """
+    Returns:
+        Command compressing its standard input to its standard output.
+    """
+    return ['gzip', '-c'] if compression == 'gzip' else ['zstd', '-q', '-c']
+
+
+def decompress_command(path: Path) -> List[str]:
+    """
+    Returns:
+        Command writing the decompressed candidate spool `path` to its standard output.
+    """
+    return ['gzip', '-d', '-c', str(path)] if compression_of(path) == 'gzip' else ['zstd', '-q', '-d', '-c', str(path)]
+
+
+@contextmanager
+def open_candidates(path: Path, mode: str = 'r', compression: str = None) -> Iterator[IO]:
+    """
+    Opens a candidate file, or a compressed candidate spool, as a stream. gzip is handled in-process, zstd by
+    the `zstd` command.
+
+    Args:
+        path: Candidate file.
+        mode: 'r', 'rb', 'w' or 'wb'.
+        compression: Compression, defaults to that of the file suffix.
+
+    Yields:
+        File object of the uncompressed candidate lines.
+
+    Raises:
+        subprocess.CalledProcessError: If zstd fails.
+    """
+    compression = compression or compression_of(path)
+    binary = 'b' in mode
+    if not compression:
+        with path.open(mode) as f:
+            yield f
+    elif compression == 'gzip':
+        with gzip.open(path, mode if binary else f'{mode}t', compresslevel=6) as f:
+            yield f
+    elif mode.startswith('r'):
+        with subprocess.Popen(['zstd', '-q', '-d', '-c', str(path)], stdout=subprocess.PIPE, text=not binary) as zstd:
+            try:
+                yield zstd.stdout
+            finally:
+                zstd.stdout.close()
+        if zstd.returncode and zstd.returncode != -signal.SIGPIPE:
+            raise subprocess.CalledProcessError(zstd.returncode, zstd.args)
+    else:
+        with path.open('wb') as out, subprocess.Popen(compress_command(compression), stdin=subprocess.PIPE,
+                                                      stdout=out, text=not binary) as zstd:
+            yield zstd.stdin
+            zstd.stdin.close()
+        if zstd.returncode:
+            raise subprocess.CalledProcessError(zstd.returncode, zstd.args)
+
+
+def compress_bytes(data: bytes, compression: Optional[str]) -> bytes:
+    """
+    Compresses candidate lines into a spool member, which can be appended to a spool of the same compression.
+    """
+    if not compression:
+        return data
+    if compression == 'gzip':
+        return gzip.compress(data, compresslevel=6)
+    return subprocess.run(compress_command(compression), input=data, stdout=subprocess.PIPE, check=True).stdout
+
+
+def run_pipeline(commands: List[List[str]], output: Path = None) -> None:
+    """
+    Runs commands as a shell pipeline would, each one's standard output feeding the next one's standard input,
+    without any intermediate file.
+
+    A producer killed by SIGPIPE is not an error: ssh-keygen stops reading its input at the end of a line
+    range, and the decompressor feeding it is then left with nowhere to write.
+
+    Each process is reaped with `moduli_assembly.trace.wait_process`, so a trace has its resource usage.
+
+    Args:
+        commands: Argument lists, in pipeline order.
+        output: Optional file receiving the standard output of the last command.
+
+    Raises:
+        subprocess.CalledProcessError: For the first command that fails.
+    """
+    processes: List[subprocess.Popen] = []
+    out = output.open('wb') if output else None
+    started = time.perf_counter()
+    try:
+        stdin = None
+        for index, command in enumerate(commands):
+            last = index == len(commands) - 1
+            process = subprocess.Popen(command, stdin=stdin, stdout=out if last else subprocess.PIPE)
+            if stdin is not None:
+                # Only the consumer holds the pipe now, so the producer sees SIGPIPE if the consumer exits
+                stdin.close()
+            stdin = process.stdout
+            processes.append(process)
+        returncodes = [wait_process(process, started) for process in processes]
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        if out:
+            out.close()
+
+    for index, (command, returncode) in enumerate(zip(commands, returncodes)):
+        if returncode and not (index < len(commands) - 1 and returncode == -signal.SIGPIPE):
+            raise subprocess.CalledProcessError(returncode, command)
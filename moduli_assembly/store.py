@@ -0,0 +1,190 @@
+import sqlite3
+from contextlib import closing
+from datetime import (datetime, timezone)
+from pathlib import PosixPath as Path
+from typing import (Dict, Iterable, Iterator, List, Tuple)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS moduli (
+    modulus   TEXT PRIMARY KEY,
+    size      INTEGER NOT NULL,
+    generator INTEGER NOT NULL,
+    type      INTEGER NOT NULL,
+    tests     INTEGER NOT NULL,
+    trials    INTEGER NOT NULL,
+    created   TEXT NOT NULL,
+    source    TEXT,
+    -- UTC time the modulus was handed out of the pool by `take`, NULL while available
+    retired   TEXT
+);
+CREATE INDEX IF NOT EXISTS moduli_size_generator_created ON moduli (size, generator, created);
+CREATE INDEX IF NOT EXISTS moduli_created ON moduli (created);
+CREATE INDEX IF NOT EXISTS moduli_size_retired ON moduli (size, retired);
+CREATE TABLE IF NOT EXISTS ingested (
+    name  TEXT PRIMARY KEY,
+    size  INTEGER NOT NULL,
+    mtime INTEGER NOT NULL
+);
+'''
+
+class ModuliStore(object):
+    """
+    Indexed SQLite store of screened safe primes, deduplicated on the modulus across runs.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Args:
+            path: SQLite database file, created with its schema on first use.
+        """
+        self.path = path
+        with closing(self.connect()) as db, db:
+            db.executescript(_SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Opens a connection. Connections are per call, so the store can be shared by screening threads.
+
+        Returns:
+            SQLite connection, in WAL mode.
+        """
+        db = sqlite3.connect(str(self.path), timeout=60)
+        db.execute('PRAGMA journal_mode=WAL')
+        return db
+
+    @staticmethod
+    def _rows(lines: Iterable[str], source: str) -> Iterator[tuple]:
+        for line in lines:
+            fields = line.split()
+            if line.startswith('#') or len(fields) != 7:
+                continue
+            created, moduli_type, tests, trials, size, generator, modulus = fields
+            yield (modulus.upper(), int(size), int(generator, 16), int(moduli_type), int(tests), int(trials),
+                   created, source, None)
+
+    def ingest(self, path: Path, batch_size: int = 1024) -> int:
+        """
+        Streams a screened (or moduli) file into the store. A file already ingested with the same size
+        and mtime is skipped; moduli already in the store are ignored.
+
+        Args:
+            path: Screened or moduli file.
+            batch_size: Rows inserted per statement batch.
+
+        Returns:
+            Number of new moduli stored.
+        """
+        stat = path.stat()
+        with closing(self.connect()) as db, db:
+            if db.execute('SELECT 1 FROM ingested WHERE name = ? AND size = ? AND mtime = ?',
+                          (path.name, stat.st_size, stat.st_mtime_ns)).fetchone():
+                return 0
+
+            before = db.total_changes
+            batch: List[tuple] = []
+            with path.open('r') as f:
+                for row in self._rows(f, path.name):
+                    batch.append(row)
+                    if len(batch) == batch_size:
+                        db.executemany('INSERT OR IGNORE INTO moduli VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+                        batch = []
+            if batch:
+                db.executemany('INSERT OR IGNORE INTO moduli VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+            inserted = db.total_changes - before
+
+            db.execute('INSERT OR REPLACE INTO ingested VALUES (?, ?, ?)', (path.name, stat.st_size, stat.st_mtime_ns))
+        return inserted
+
+    def count_by_size(self, generator: int = None, available: bool = False) -> Dict[int, int]:
+        """
+        Number of stored moduli per size.
+
+        Args:
+            generator: Optional generator filter.
+            available: Count only moduli not yet retired by `take`.
+
+        Returns:
+            {size: count}, where size is the moduli file size field (key length less one).
+        """
+        where, params = [], []
+        if generator:
+            where.append('generator = ?')
+            params.append(generator)
+        if available:
+            where.append('retired IS NULL')
+        query = 'SELECT size, COUNT(*) FROM moduli' + (' WHERE ' + ' AND '.join(where) if where else '')
+        with closing(self.connect()) as db:
+            return dict(db.execute(query + ' GROUP BY size ORDER BY size', params).fetchall())
+
+    @staticmethod
+    def _select_query(sizes: Iterable[int] = None, generator: int = None, since: str = None,
+                      limit_per_size: int = None, available: bool = False) -> Tuple[str, list]:
+        where, params = [], []
+        if sizes:
+            sizes = list(sizes)
+            where.append(f'size IN ({", ".join("?" * len(sizes))})')
+            params.extend(sizes)
+        if generator:
+            where.append('generator = ?')
+            params.append(generator)
+        if since:
+            where.append('created >= ?')
+            params.append(since)
+        if available:
+            where.append('retired IS NULL')
+
+        query = 'SELECT created, type, tests, trials, size, generator, modulus, ' \
+                'ROW_NUMBER() OVER (PARTITION BY size ORDER BY RANDOM()) AS rank FROM moduli'
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query = f'SELECT * FROM ({query})'
+        if limit_per_size:
+            query += ' WHERE rank <= ?'
+            params.append(limit_per_size)
+        return query + ' ORDER BY size, rank', params
+
+    @staticmethod
+    def _line(row: tuple) -> str:
+        created, moduli_type, tests, trials, size, generator, modulus = row[:7]
+        return f'{created} {moduli_type} {tests} {trials} {size} {generator:x} {modulus}\n'
+
+    def select(self, sizes: Iterable[int] = None, generator: int = None, since: str = None,
+               limit_per_size: int = None, available: bool = False) -> Iterator[str]:
+        """
+        Streams stored moduli as moduli file lines, in one indexed query, shuffled within each size.
+
+        Args:
+            sizes: Optional size field filter.
+            generator: Optional generator filter.
+            since: Optional minimum creation timestamp, YYYYMMDDHHMMSS.
+            limit_per_size: Optional maximum number of moduli per size.
+            available: Select only moduli not yet retired by `take`.
+
+        Yields:
+            Newline terminated moduli lines.
+        """
+        query, params = self._select_query(sizes, generator, since, limit_per_size, available)
+        with closing(self.connect()) as db:
+            for row in db.execute(query, params):
+                yield self._line(row)
+
+    def take(self, per_size: int, sizes: Iterable[int] = None, generator: int = None) -> List[str]:
+        """
+        Hands out up to `per_size` available moduli per size, chosen at random, and retires them. Selection and
+        retirement are one write transaction, so concurrent callers never get the same modulus.
+
+        Args:
+            per_size: Moduli per size.
+            sizes: Optional size field filter.
+            generator: Optional generator filter.
+
+        Returns:
+            Newline terminated moduli lines, by size.
+        """
+        query, params = self._select_query(sizes, generator, limit_per_size=per_size, available=True)
+        retired = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+        with closing(self.connect()) as db, db:
+            db.execute('BEGIN IMMEDIATE')
+            rows = db.execute(query, params).fetchall()
+            db.executemany('UPDATE moduli SET retired = ? WHERE modulus = ?', ((retired, row[6]) for row in rows))
+        return [self._line(row) for row in rows]
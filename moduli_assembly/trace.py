@@ -0,0 +1,310 @@
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from json import dumps
+from pathlib import PosixPath as Path
+from typing import (Callable, Iterator, List, Optional)
+
+# The active Tracer, if any: tracing costs nothing until `start()`
+_tracer: Optional['Tracer'] = None
+# Trace threads of asyncio tasks are numbered from here, clear of thread and process IDs
+TASK_LANES = 1 << 30
+# Arguments of the innermost span of the running thread or asyncio task, for `annotate`
+_span: ContextVar[Optional[dict]] = ContextVar('moduli_assembly_span', default=None)
+# Meter of the job run by the current thread or asyncio task, for `charge` and `job_cost`
+_meter: ContextVar[Optional['Meter']] = ContextVar('moduli_assembly_meter', default=None)
+
+
+def usage_args(usage) -> dict:
+    """
+    Returns:
+        Span arguments of a `resource.struct_rusage`: CPU seconds, peak RSS and bytes read from and written to
+        storage, which Linux accounts in 512-byte blocks.
+    """
+    return {'user_cpu_s': round(usage.ru_utime, 6), 'system_cpu_s': round(usage.ru_stime, 6),
+            'max_rss_kb': usage.ru_maxrss, 'read_bytes': usage.ru_inblock * 512,
+            'write_bytes': usage.ru_oublock * 512}
+
+
+class Tracer(object):
+    """
+    Collects spans as Chrome trace events, for chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    def __init__(self) -> None:
+        self.epoch = time.perf_counter()
+        self.pid = os.getpid()
+        self.events: List[dict] = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0,
+                                    'args': {'name': 'moduli_assembly'}}]
+        self._lock = threading.Lock()
+        self._lanes: dict = {}
+
+    def lane(self) -> int:
+        """
+        Returns:
+            Trace thread of the caller: its asyncio task, so that concurrent tasks do not overlap on one row,
+            else its thread.
+        """
+        asyncio = sys.modules.get('asyncio')
+        try:
+            task = asyncio.current_task() if asyncio else None
+        except RuntimeError:
+            task = None
+        if task is None:
+            return threading.get_native_id()
+        with self._lock:
+            return self._lanes.setdefault(id(task), TASK_LANES + len(self._lanes))
+
+    def add(self, name: str, category: str, start: float, end: float, tid: int, args: dict) -> None:
+        """
+        Adds a complete event, from `time.perf_counter()` start and end times.
+        """
+        event = {'name': name, 'cat': category, 'ph': 'X', 'pid': self.pid, 'tid': tid,
+                 'ts': round((start - self.epoch) * 1e6), 'dur': round((end - start) * 1e6), 'args': args}
+        with self._lock:
+            self.events.append(event)
+
+    def write(self, path: Path) -> None:
+        with self._lock:
+            path.write_text(dumps({'traceEvents': self.events, 'displayTimeUnit': 'ms'}))
+
+
+class Meter(object):
+    """
+    Cost of one generation or screening job: its wall time, and the CPU time of the child processes it ran.
+    Unlike spans, jobs are always metered, for the run history.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.cpu_s = 0.0
+        self._lock = threading.Lock()
+
+    def charge(self, cpu_s: float) -> None:
+        with self._lock:
+            self.cpu_s += cpu_s
+
+    def cost(self) -> dict:
+        """
+        Returns:
+            {'wall_s', 'cpu_s'} of the job so far.
+        """
+        return {'wall_s': round(time.perf_counter() - self.started, 3), 'cpu_s': round(self.cpu_s, 3)}
+
+
+@contextmanager
+def metered() -> Iterator[Meter]:
+    """
+    Meters the enclosed job, or decorated function. Children reaped by `wait_process` are charged to it, from
+    any thread or asyncio task inheriting the caller's context: `asyncio.to_thread` and tasks do, thread pool
+    workers only through `contextvars.copy_context().run`.
+
+    Yields:
+        The Meter of the job.
+    """
+    meter = Meter()
+    token = _meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _meter.reset(token)
+
+
+def charge(cpu_s: float) -> None:
+    """
+    Adds CPU seconds of child processes to the job metered by the caller, if any.
+    """
+    meter = _meter.get()
+    if meter is not None:
+        meter.charge(cpu_s)
+
+
+def job_cost() -> dict:
+    """
+    Returns:
+        {'wall_s', 'cpu_s'} of the job metered by the caller so far, or {} outside a metered job.
+    """
+    meter = _meter.get()
+    return meter.cost() if meter is not None else {}
+
+
+def children_cpu() -> float:
+    """
+    Returns:
+        CPU seconds, user and system, of every child process of this process reaped so far, by any thread.
+    """
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def start() -> Tracer:
+    """
+    Starts tracing for this process.
+    """
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def stop() -> Optional[Tracer]:
+    """
+    Stops tracing.
+
+    Returns:
+        The stopped Tracer, or None.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+@contextmanager
+def span(name: str, category: str = 'stage', **args) -> Iterator[dict]:
+    """
+    Records the enclosed block as a span. `annotate` adds arguments to the innermost span.
+
+    Yields:
+        The span arguments.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield args
+        return
+    token = _span.set(args)
+    started = time.perf_counter()
+    try:
+        yield args
+    finally:
+        _span.reset(token)
+        tracer.add(name, category, started, time.perf_counter(), tracer.lane(), args)
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorates a function, recording each call as a span.
+    """
+    def decorate(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def annotate(**args) -> None:
+    """
+    Adds arguments, e.g. line counts, to the innermost span of the caller, if any.
+    """
+    current = _span.get()
+    if current is not None:
+        current.update(args)
+
+
+def process_name(command: List[str]) -> str:
+    """
+    Returns:
+        Short span name of a command, e.g. `ssh-keygen -M screen`.
+    """
+    return ' '.join([Path(command[0]).name] + [str(arg) for arg in command[1:3]])
+
+
+def record_process(command: List[str], started: float, pid: int, returncode: int, usage=None,
+                   name: str = None) -> None:
+    """
+    Charges a finished child process to the metered job, and records it as a span, in its own trace thread.
+
+    Args:
+        command: Argument list.
+        started: `time.perf_counter()` when it was started.
+        pid: Process ID.
+        returncode: Exit status.
+        usage: Optional `resource.struct_rusage` of the process.
+        name: Span name, defaults to `process_name(command)`.
+    """
+    if usage is not None:
+        charge(usage.ru_utime + usage.ru_stime)
+    tracer = _tracer
+    if tracer is None:
+        return
+    args = {'command': ' '.join(str(arg) for arg in command), 'returncode': returncode}
+    if usage is not None:
+        args.update(usage_args(usage))
+    tracer.add(name or process_name(command), 'process', started, time.perf_counter(), pid, args)
+
+
+def wait_process(process: subprocess.Popen, started: float) -> int:
+    """
+    Waits for a child with `os.wait4`, which returns the resource usage of that one child, and records it with
+    `record_process`.
+
+    Args:
+        process: Child process.
+        started: `time.perf_counter()` when it was started.
+
+    Returns:
+        Exit status, as `Popen.wait`.
+    """
+    if process.returncode is not None:
+        return process.returncode
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # Already reaped elsewhere: no usage to report
+        return process.wait()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    record_process(process.args, started, process.pid, process.returncode, usage)
+    return process.returncode
+
+
+def run_process(command: List[str], check: bool = True, timeout: Optional[float] = None, **kwargs) -> int:
+    """
+    Runs a command to completion, as `subprocess.run` without input or captured output, recording it as a
+    span with its resource usage when tracing.
+
+    Args:
+        command: Argument list.
+        check: Raise for a non-zero exit status.
+        timeout: Optional seconds after which the command is killed.
+        kwargs: `subprocess.Popen` keyword arguments, e.g. `stdout=subprocess.DEVNULL`.
+
+    Returns:
+        Exit status.
+
+    Raises:
+        subprocess.CalledProcessError: If check is set and the command fails.
+        subprocess.TimeoutExpired: If the command was killed after `timeout` seconds.
+    """
+    started, expired = time.perf_counter(), threading.Event()
+    with subprocess.Popen(command, **kwargs) as process:
+
+        def expire() -> None:
+            expired.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, expire) if timeout else None
+        if timer:
+            timer.start()
+        try:
+            returncode = wait_process(process, started)
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            if timer:
+                timer.cancel()
+    if expired.is_set():
+        raise subprocess.TimeoutExpired(command, timeout)
+    if check and returncode:
+        raise subprocess.CalledProcessError(returncode, command)
+    return returncode
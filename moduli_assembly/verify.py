@@ -0,0 +1,118 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import PosixPath as Path
+from typing import (Iterator, List, Optional, Tuple)
+
+from moduli_assembly.safe_primes import (DEFAULT_PRIME_TESTS, MODULI_TYPE_SAFE, is_probable_prime, known_generator)
+
+
+def verify_line(line: str, trials: int = DEFAULT_PRIME_TESTS) -> Optional[str]:
+    """
+    Independently checks one moduli line: a safe prime p = 2q + 1 of the stated size, with q and p both
+    probable primes, and the stated generator.
+
+    Args:
+        line: Moduli line.
+        trials: Number of Miller-Rabin rounds for each of q and p.
+
+    Returns:
+        None when the line checks out, otherwise the reason it fails.
+    """
+    fields = line.split()
+    if len(fields) != 7:
+        return 'malformed line'
+    try:
+        moduli_type, size, generator, p = int(fields[1]), int(fields[4]), int(fields[5], 16), int(fields[6], 16)
+    except ValueError:
+        return 'malformed line'
+
+    if moduli_type != MODULI_TYPE_SAFE:
+        return f'type {moduli_type} is not a safe prime'
+    if p.bit_length() - 1 != size:
+        return f'size {size} does not match a {p.bit_length()} bit modulus'
+    if known_generator(p) != generator:
+        return f'generator {generator} does not generate the group'
+    if not is_probable_prime(p >> 1, trials):
+        return 'q = (p - 1) / 2 is composite'
+    if not is_probable_prime(p, trials):
+        return 'p is composite'
+    return None
+
+
+def _numbered_batches(path: Path, batch_size: int) -> Iterator[List[Tuple[int, str]]]:
+    """
+    Streams the moduli lines of a file, skipping comments and blank lines, in batches of (line number, line).
+    """
+    batch = []
+    with path.open('r') as f:
+        for line_number, line in enumerate(f, start=1):
+            if line.startswith('#') or not line.strip():
+                continue
+            batch.append((line_number, line))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def verify_file(path: Path, trials: int = DEFAULT_PRIME_TESTS, workers: int = None, fail_fast: bool = False,
+                batch_size: int = 64) -> dict:
+    """
+    Verifies every line of a moduli file across a process pool.
+
+    Args:
+        path: Moduli file, e.g. /etc/ssh/moduli.
+        trials: Number of Miller-Rabin rounds for each of q and p.
+        workers: Number of verification processes, defaults to the number of CPUs.
+        fail_fast: Stop at the first batch with a failure.
+        batch_size: Lines verified per batch.
+
+    Returns:
+        Report: 'file', 'moduli', 'sizes' ({size: {'moduli', 'failed'}}), 'failures' ([(line number, reason)])
+        and 'complete', False when stopped early.
+
+    Raises:
+        FileNotFoundError: If the moduli file doesn't exist.
+    """
+    if not path.exists():
+        raise FileNotFoundError(f'Provided moduli file, {path}, Doesn\'t Exist')
+
+    report = {'file': str(path), 'moduli': 0, 'sizes': {}, 'failures': [], 'complete': True}
+    verify = partial(verify_line, trials=trials)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in _numbered_batches(path, batch_size):
+            reasons = pool.map(verify, [line for _, line in batch])
+            for (line_number, line), reason in zip(batch, reasons):
+                fields = line.split()
+                size = int(fields[4]) if len(fields) > 4 and fields[4].isdigit() else 0
+                tally = report['sizes'].setdefault(size, {'moduli': 0, 'failed': 0})
+                tally['moduli'] += 1
+                report['moduli'] += 1
+                if reason:
+                    tally['failed'] += 1
+                    report['failures'].append((line_number, reason))
+            if fail_fast and report['failures']:
+                report['complete'] = False
+                break
+
+    return report
+
+
+def print_report(report: dict) -> None:
+    """
+    Prints a `verify_file` report, per size.
+
+    Args:
+        report: Result of `verify_file`.
+    """
+    print(f'\nVerification of {report["file"]}:')
+    print(f'Mod  Moduli  Failed')
+    for size in sorted(report['sizes']):
+        tally = report['sizes'][size]
+        print(f'{size} {tally["moduli"]:>7} {tally["failed"]:>7}')
+    for line_number, reason in report['failures']:
+        print(f'Line {line_number}: {reason}')
+    status = 'PASSED' if not report['failures'] else 'FAILED'
+    print(f'{status}: {report["moduli"]} moduli verified' + ('' if report['complete'] else ', stopped at first failure'))
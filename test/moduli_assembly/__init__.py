@@ -1,9 +1,15 @@
 #!/usr/bin/env python 3
+import os
+import subprocess
+import time
 from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 from unittest.mock import MagicMock as Mock, patch
 
-from moduli_assembly import (ModuliAssembly, __version__, default_config)
+from moduli_assembly import (GENERATE_START_STRIDE, ModuliAssembly, __version__, default_config)
+
+FAKE_SSH_KEYGEN = str(Path('benchmarks/fake_ssh_keygen.py').resolve())
 
 
 def _load_candidate(target_moduli_dir: Path = None) -> Path:
@@ -97,6 +103,66 @@ class TestModuliAssembly(TestCase):
         cls.assertTrue(screened_file.stat().st_size > 1)
         cls.assertTrue(len(screened_file.read_text().split('\n')) > 1)
 
+    def test_shard_ranges(cls):
+        ranges = ModuliAssembly.shard_ranges(10, 3)
+        cls.assertEqual(ranges, [(0, 4), (4, 3), (7, 3)])
+        cls.assertEqual(ModuliAssembly.shard_ranges(2, 8), [(0, 1), (1, 1)])
+        with cls.assertRaises(ValueError):
+            ModuliAssembly.shard_ranges(10, 0)
+
+    @patch.dict(os.environ, {'FAKE_SSH_KEYGEN_CANDIDATES': '3000', 'FAKE_SSH_KEYGEN_YIELD': '0.2'})
+    def test_resume_sharded_screening(cls):
+        with TemporaryDirectory() as tmp:
+            ma = ModuliAssembly(root_dir=Path(tmp))
+            ma.make_dirs()
+            ma.config['ssh_keygen'] = FAKE_SSH_KEYGEN
+            try:
+                candidate = ma.config['moduli_dir'] / '1024.candidate_a'
+                subprocess.run(ma.generate_command(1024, candidate), check=True)
+                # The same candidates screened in one piece, for reference
+                whole = ma.config['moduli_dir'] / '1024.candidate_b'
+                whole.write_text(candidate.read_text())
+                expected = [line.split()[6]
+                            for line in ma.screen_candidates(whole, shards=1).read_text().splitlines()]
+
+                # Interrupted after the first of three shards
+                ranges = ma.claim_shard_ranges(candidate, 3)
+                cls.assertEqual(ranges, ma.shard_ranges(3000, 3))
+                screened_shard, checkpoint = ma.create_shard_paths(candidate, *ranges[0])
+                subprocess.run(ma.screen_command(candidate, screened_shard, checkpoint, *ranges[0]), check=True)
+                cls.assertFalse(checkpoint.exists())
+                cls.assertEqual(ma.existing_shard_ranges(candidate), ranges)
+
+                # Resumes with the original ranges, whatever the shard count
+                screened = ma.screen_candidates(candidate, shards=5)
+                cls.assertEqual([line.split()[6] for line in screened.read_text().splitlines()], expected)
+                cls.assertGreater(len(expected), 0)
+                cls.assertFalse(candidate.exists())
+                cls.assertEqual(list(ma.config['moduli_dir'].glob('.*+*')), [])
+            finally:
+                ma.config.pop('ssh_keygen')
+
+    @patch.dict(os.environ, {'FAKE_SSH_KEYGEN_CANDIDATES': '500', 'FAKE_SSH_KEYGEN_YIELD': '0.2'})
+    def test_pipeline_candidates(cls):
+        with TemporaryDirectory() as tmp:
+            ma = ModuliAssembly(root_dir=Path(tmp))
+            ma.make_dirs()
+            ma.config['ssh_keygen'] = FAKE_SSH_KEYGEN
+            try:
+                entered = []
+                screened = ma.pipeline_candidates([(1024, 2), (2048, 1), (1536, 1)], generators=2, screeners=2,
+                                                  shards=2, on_candidate=entered.append)
+                cls.assertEqual(sorted(ma.key_length_of(path) for path in screened), [1024, 1536, 2048])
+                cls.assertEqual([ma.get_screened_path(path) for path in entered], screened)
+                cls.assertTrue(all(path.stat().st_size > 0 for path in screened))
+                # Every candidate file was screened and removed, leaving no shard or generation files
+                cls.assertEqual(sorted(ma.config['moduli_dir'].iterdir()), sorted(screened))
+
+                with cls.assertRaises(ValueError):
+                    ma.pipeline_candidates([(1024, 1)], generators=0)
+            finally:
+                ma.config.pop('ssh_keygen')
+
     def test_restart_candidate_screening(cls):
         candidate_file = _load_candidate(cls.ma_real.config['moduli_dir'])
         cls.ma_real.restart_candidate_screening()
@@ -114,5 +180,99 @@ class TestModuliAssembly(TestCase):
         cls.assertTrue(moduli_file.exists())
         cls.assertTrue(moduli_file.stat().st_size > 1)
 
+    def test_write_moduli_file_incremental(cls):
+        with TemporaryDirectory() as tmp:
+            ma = ModuliAssembly(root_dir=Path(tmp))
+            ma.make_dirs()
+            ma.config['moduli_dir'].joinpath('3072.screened_a').write_text('a1\na2\n')
+            first = ma.create_moduli_file()
+            ma.config['moduli_dir'].joinpath('4096.screened_b').write_text('b1\n')
+            second = ma.create_moduli_file()
+            cls.assertEqual(ma.config['moduli_file'].resolve(), second)
+            cls.assertEqual(second.read_text().split('\n')[1:], first.read_text().split('\n')[1:-1] + ['b1', ''])
+
+    def test_read_only_construction(cls):
+        with TemporaryDirectory() as tmp:
+            ma = ModuliAssembly(root_dir=Path(tmp))
+            ma.screening_progress()
+            cls.assertEqual(list(Path(tmp).iterdir()), [])
+
+            ma.make_dirs()
+            cls.assertTrue(ma.config['moduli_dir'].is_dir())
+            saved = ma.config['config_file'].stat().st_mtime_ns
+            # An unchanged configuration is not rewritten
+            ModuliAssembly(root_dir=Path(tmp)).save_config(properties=tuple(default_config()) + ('tuning',))
+            cls.assertEqual(ma.config['config_file'].stat().st_mtime_ns, saved)
+
+    def test_screening_progress_read_only(cls):
+        with TemporaryDirectory() as tmp:
+            ma = ModuliAssembly(root_dir=Path(tmp))
+            ma.make_dirs()
+            candidate = ma.config['moduli_dir'] / '1024.candidate_a'
+            candidate.write_text('line\n' * 100)
+            os.utime(candidate, (time.time() - 10, time.time() - 10))
+            ma.create_checkpoint_filename(candidate).write_text('40\n')
+            before = sorted(Path(tmp).rglob('*'))
+
+            record, = ma.screening_progress()['files']
+            cls.assertEqual((record['done'], record['lines']), (40, 100))
+            cls.assertAlmostEqual(record['lines_per_second'], 4.0, delta=0.5)
+            cls.assertEqual(sorted(Path(tmp).rglob('*')), before)
+
+            ma.screening_progress(keep_samples=True)
+            cls.assertTrue((ma.config['config_dir'] / '.progress').exists())
+
+    def test_generate_start_points(cls):
+        starts = ModuliAssembly.generate_start_points(1024, 8)
+        cls.assertEqual(len(set(starts)), 8)
+        # Sophie Germain candidate sized, GENERATE_START_STRIDE apart, so the sieve ranges never overlap
+        cls.assertTrue(all(start.bit_length() == 1023 for start in starts))
+        cls.assertEqual({b - a for a, b in zip(starts, starts[1:])}, {GENERATE_START_STRIDE})
+        cls.assertNotEqual(ModuliAssembly.generate_start_points(1024, 1), starts[:1])
+
+    @patch.dict(os.environ, {'FAKE_SSH_KEYGEN_CANDIDATES': '200'})
+    def test_generate_candidates_parallel(cls):
+        with TemporaryDirectory() as tmp:
+            ma = ModuliAssembly(root_dir=Path(tmp))
+            ma.make_dirs()
+            ma.config['ssh_keygen'] = FAKE_SSH_KEYGEN
+            try:
+                candidate = ma.generate_candidates(1024, 6, jobs=3)
+                lines = candidate.read_text().splitlines()
+                # Every run is complete, and runs from different start points share no candidates
+                cls.assertEqual(len(lines), 6 * 200)
+                cls.assertEqual(len({line.split()[6] for line in lines}), 6 * 200)
+                cls.assertTrue(all(line.split()[1] == '4' and line.split()[4] == '1022' for line in lines))
+                cls.assertFalse(ma.is_generating(candidate))
+                cls.assertEqual(list(ma.config['moduli_dir'].iterdir()), [candidate])
+
+                with cls.assertRaises(ValueError):
+                    ma.generate_candidates(1024, 1, jobs=0)
+            finally:
+                ma.config.pop('ssh_keygen')
+
+    def test_resume_candidate_generation(cls):
+        with TemporaryDirectory() as tmp:
+            ma = ModuliAssembly(root_dir=Path(tmp))
+            ma.config['ssh_keygen'] = FAKE_SSH_KEYGEN
+            try:
+                candidate = ma.create_candidate_path(1024)
+                starts = ma.generate_start_points(1024, 2)
+                subprocess.run(ma.generate_command(1024, candidate, starts[0]), check=True)
+                complete_size = candidate.stat().st_size
+                with candidate.open('a') as f:
+                    f.write('20250101000000 4 2 0 1022 0 PARTIAL')
+                ma._write_generation_state(ma.create_generation_state_path(candidate),
+                                           {'key_length': 1024, 'starts': [f'{start:x}' for start in starts],
+                                            'completed': [0], 'size': complete_size})
+                cls.assertTrue(ma.is_generating(candidate))
+
+                cls.assertEqual(ma.resume_candidate_generation(), [candidate])
+                cls.assertFalse(ma.is_generating(candidate))
+                cls.assertNotIn('PARTIAL', candidate.read_text())
+                cls.assertEqual(candidate.stat().st_size, 2 * complete_size)
+            finally:
+                ma.config.pop('ssh_keygen')
+
     def test_get_version(cls):
         cls.assertTrue(cls.ma_real.version == __version__)
@@ -0,0 +1,75 @@
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+
+from moduli_assembly.bundle import (apply_bundles, create_bundle, moduli_lines, read_bundle)
+
+
+def moduli(*moduli_ids: int) -> str:
+    return '#/etc/ssh/moduli: creation_date: moduli_assembly: now\n' + \
+        ''.join(f'20250101000000 2 6 100 3071 2 {modulus:X}\n' for modulus in moduli_ids)
+
+
+class TestBundle(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.moduli_file = self.dir / 'MODULI_FILE'
+        self.bundles = self.dir / 'bundles'
+        self.target = self.dir / 'moduli'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def bundle(self, *moduli_ids: int) -> dict:
+        self.moduli_file.write_text(moduli(*moduli_ids))
+        return create_bundle(self.moduli_file, self.bundles)
+
+    def test_versions_and_deltas(self):
+        first = self.bundle(1, 2, 3)
+        self.assertEqual((first['version'], first['delta']), (1, None))
+        second = self.bundle(3, 2, 4, 5)
+        self.assertEqual((second['version'], second['added'], second['removed']), (2, 2, 1))
+        header, delta = read_bundle(second['delta'])
+        self.assertEqual((header['from'], header['version']), (1, 2))
+        self.assertEqual(len(delta), 3)
+        # Unchanged moduli, in any order, make no new version
+        self.assertEqual(self.bundle(5, 4, 3, 2)['version'], 2)
+
+    def test_apply(self):
+        first = self.bundle(1, 2, 3)
+        second = self.bundle(2, 3, 4)
+        third = self.bundle(4, 5)
+
+        apply_bundles(self.target, [first['bundle']])
+        self.assertEqual(moduli_lines(self.target.read_text()), moduli_lines(moduli(1, 2, 3)))
+        self.target.chmod(0o600)
+
+        result = apply_bundles(self.target, [second['delta'], third['delta']])
+        self.assertEqual((result['version'], result['changed']), (3, True))
+        self.assertEqual(sorted(moduli_lines(self.target.read_text())), moduli_lines(moduli(4, 5)))
+        self.assertEqual(self.target.stat().st_mode & 0o777, 0o600)
+        self.assertEqual(sorted(path.name for path in self.dir.iterdir()), ['MODULI_FILE', 'bundles', 'moduli'])
+
+        # Applying the same deltas again changes nothing
+        self.assertFalse(apply_bundles(self.target, [second['delta'], third['delta']])['changed'])
+        # Nor does an older full bundle: no downgrade
+        result = apply_bundles(self.target, [first['bundle']])
+        self.assertEqual((result['version'], result['changed']), (3, False))
+        self.assertEqual(sorted(moduli_lines(self.target.read_text())), moduli_lines(moduli(4, 5)))
+
+    def test_apply_mismatch(self):
+        first = self.bundle(1, 2)
+        second = self.bundle(1, 2, 3)
+        self.target.write_text(moduli(7))
+        with self.assertRaises(ValueError):
+            apply_bundles(self.target, [second['delta']])
+        self.assertEqual(self.target.read_text(), moduli(7))
+        # A full bundle installs over anything
+        self.assertTrue(apply_bundles(self.target, [first['bundle'], second['delta']])['changed'])
+        self.assertEqual(self.target.read_bytes().count(b'\n'), 4)
+
+
+if __name__ == '__main__':
+    main()
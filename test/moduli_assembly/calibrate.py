@@ -0,0 +1,68 @@
+import os
+from json import loads
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+from unittest.mock import patch
+
+from moduli_assembly import ModuliAssembly
+from moduli_assembly.calibrate import (calibrate, calibrate_key_length, worker_settings)
+
+FAKE_SSH_KEYGEN = str(Path('benchmarks/fake_ssh_keygen.py').resolve())
+
+
+class TestCalibrate(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.ma = ModuliAssembly(root_dir=Path(self.tmp.name))
+        self.ma.config['ssh_keygen'] = FAKE_SSH_KEYGEN
+
+    def tearDown(self):
+        self.ma.config.pop('ssh_keygen')
+        self.ma.config.pop('tuning', None)
+        self.tmp.cleanup()
+
+    def test_worker_settings(self):
+        self.assertEqual(worker_settings(1), [1])
+        self.assertEqual(worker_settings(8), [1, 2, 4, 8])
+        self.assertEqual(worker_settings(6), [1, 2, 4, 6])
+
+    @patch.dict(os.environ, {'FAKE_SSH_KEYGEN_CANDIDATES': '300', 'FAKE_SSH_KEYGEN_YIELD': '0.05'})
+    def test_calibrate(self):
+        tuning = calibrate(self.ma, [1024], memory_settings=(None, 8), job_settings=(1, 2),
+                           shard_settings=(1, 2), sample_lines=200)
+        settings = tuning[1024]
+        self.assertIn(settings['memory'], (None, 8))
+        self.assertIn(settings['jobs'], (1, 2))
+        self.assertIn(settings['shards'], (1, 2))
+        self.assertGreater(settings['candidates_per_second'], 0)
+        self.assertGreater(settings['screened_per_second'], 0)
+        # Trials run in a scratch directory and leave no history
+        self.assertEqual(list(self.ma.config['moduli_dir'].glob('*')), [])
+
+        self.assertEqual(self.ma.tuning(1024), settings)
+        self.assertEqual(self.ma.tuning(2048), {})
+        saved = loads(self.ma.config['config_file'].read_text())
+        self.assertEqual(saved['tuning'], {'1024': settings})
+        self.assertNotIn('ssh_keygen', saved)
+
+    @patch.dict(os.environ, {'FAKE_SSH_KEYGEN_LATENCY': '5'})
+    def test_trial_timeout(self):
+        # No trial finishes: the key length is left uncalibrated and nothing is saved
+        self.assertIsNone(calibrate_key_length(self.ma, 1024, memory_settings=(None,), job_settings=(1, 2),
+                                               shard_settings=(1,), trial_seconds=0.2))
+        self.assertEqual(calibrate(self.ma, [1024], memory_settings=(None,), job_settings=(1,),
+                                   shard_settings=(1,), trial_seconds=0.2), {})
+        self.assertFalse(self.ma.config['config_file'].exists())
+
+    def test_generate_command_memory(self):
+        self.ma.save_tuning({1024: {'memory': 64, 'jobs': 2, 'shards': 4}})
+        self.assertIn('memory=64', self.ma.generate_command(1024, Path('out')))
+        self.assertIn('memory=8', self.ma.generate_command(1024, Path('out'), memory=8))
+        self.assertNotIn('-O memory', ' '.join(self.ma.generate_command(1024, Path('out'), memory=0)))
+        self.assertNotIn('-O memory', ' '.join(self.ma.generate_command(2048, Path('out'))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import threading
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+from unittest.mock import patch
+
+from benchmarks.fake_ssh_keygen import write_moduli
+from moduli_assembly import ModuliAssembly
+from moduli_assembly.daemon import (PoolKeeper, fetch, request)
+from moduli_assembly.orchestrator import AsyncOrchestrator
+
+FAKE_SSH_KEYGEN = str(Path('benchmarks/fake_ssh_keygen.py').resolve())
+
+
+class TestPoolKeeper(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.ma = ModuliAssembly(root_dir=Path(self.tmp.name))
+        self.ma.config['ssh_keygen'] = FAKE_SSH_KEYGEN
+        self.ma.make_dirs()
+        self.keeper = PoolKeeper(self.ma, {3072: 10, 4096: 10}, Path(self.tmp.name) / 'pool.sock',
+                                 AsyncOrchestrator(self.ma, generators=2, screeners=2))
+
+    def tearDown(self):
+        self.ma.config.pop('ssh_keygen')
+        self.tmp.cleanup()
+
+    def fill(self):
+        write_moduli(str(self.ma.config['moduli_dir'] / '3072.screened_a'), 3072, 25)
+        write_moduli(str(self.ma.config['moduli_dir'] / '4096.screened_a'), 4096, 6)
+        self.ma.ingest_screened_files()
+
+    def test_moduli_file(self):
+        self.fill()
+        first = self.keeper.moduli_file(10)
+        self.assertEqual(first['counts'], {3072: 10, 4096: 6})
+        lines = first['moduli'].splitlines()
+        self.assertTrue(lines[0].startswith('#/etc/ssh/moduli'))
+        self.assertEqual(len(set(lines[1:])), 16)
+
+        # Handed out moduli are retired: never handed out again
+        second = self.keeper.moduli_file(10, [3072, 4096])
+        self.assertEqual(second['counts'], {3072: 10, 4096: 0})
+        self.assertFalse(set(lines[1:]) & set(second['moduli'].splitlines()[1:]))
+        self.assertEqual(self.keeper.pool(), {3072: 5, 4096: 0})
+        self.assertEqual(self.ma.store.count_by_size(), {3071: 25, 4095: 6})
+
+    def test_socket(self):
+        self.fill()
+        server = self.keeper.server()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            self.assertEqual(self.keeper.socket_path.stat().st_mode & 0o777, 0o600)
+            # The process umask is restored
+            umask = os.umask(0o022)
+            os.umask(umask)
+            self.assertNotEqual(umask, 0o177)
+            self.assertEqual(request(self.keeper.socket_path, {'op': 'status'}),
+                             {'pool': {3072: 25, 4096: 6}, 'low_water': {3072: 10, 4096: 10}})
+            result = fetch(self.keeper.socket_path, 4, [4096])
+            self.assertEqual(result['counts'], {4096: 4})
+            with self.assertRaises(RuntimeError):
+                request(self.keeper.socket_path, {'op': 'moduli', 'per_bitsize': -1})
+            with self.assertRaises(RuntimeError):
+                request(self.keeper.socket_path, {'op': 'unknown'})
+            # Store errors are replied, not dropped
+            with patch.object(self.ma.store, 'take', side_effect=sqlite3.OperationalError('database is locked')):
+                with self.assertRaisesRegex(RuntimeError, 'locked'):
+                    fetch(self.keeper.socket_path, 4)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    @patch.dict(os.environ, {'FAKE_SSH_KEYGEN_CANDIDATES': '400', 'FAKE_SSH_KEYGEN_YIELD': '0.05'})
+    def test_refill(self):
+        self.fill()
+        # 3072 is above its low-water mark, 4096 below
+        plan = self.keeper.orchestrator.run(self.keeper.refill, True)
+        self.assertEqual(list(plan), [4096])
+        pool = self.keeper.pool()
+        self.assertEqual(pool[3072], 25)
+        self.assertGreaterEqual(pool[4096], 10)
+        self.assertEqual(self.keeper.orchestrator.run(self.keeper.refill), {})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import os
+import threading
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+from unittest.mock import patch
+
+from moduli_assembly import ModuliAssembly
+from benchmarks.fake_ssh_keygen import (screen, write_candidates)
+from moduli_assembly.distributed import (Coordinator, Worker)
+
+FAKE_SSH_KEYGEN = str(Path('benchmarks/fake_ssh_keygen.py').resolve())
+
+
+class TestDistributed(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.ma = ModuliAssembly(root_dir=Path(self.tmp.name))
+        self.ma.config['ssh_keygen'] = FAKE_SSH_KEYGEN
+        self.ma.make_dirs()
+
+    def tearDown(self):
+        self.ma.config.pop('ssh_keygen')
+        self.tmp.cleanup()
+
+    @patch.dict(os.environ, {'FAKE_SSH_KEYGEN_CANDIDATES': '400', 'FAKE_SSH_KEYGEN_YIELD': '0.05'})
+    # The fake ssh-keygen screens at random: accept its moduli
+    @patch.object(Coordinator, '_verify', lambda self, lines: [None] * len(lines))
+    def test_coordinator_with_workers(self):
+        coordinator = Coordinator(self.ma, [(1024, 3), (2048, 2)], shards=3, token='secret')
+        server = coordinator.server('127.0.0.1', 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+        try:
+            workers = [Worker(self.ma, url, name=f'worker-{index}', jobs=2, poll=0.05, token='secret')
+                       for index in range(3)]
+            threads = [threading.Thread(target=worker.run) for worker in workers]
+            for thread in threads:
+                thread.start()
+            self.assertTrue(coordinator.done.wait(30))
+            for thread in threads:
+                thread.join(30)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # 5 generation jobs and 2 x 3 screening jobs
+        self.assertEqual(sum(worker.completed for worker in workers), 11)
+        self.assertEqual(sorted(self.ma.key_length_of(path) for path in coordinator.screened), [1024, 2048])
+        self.assertEqual(sorted(path.name for path in self.ma.config['moduli_dir'].iterdir()),
+                         sorted(path.name for path in coordinator.screened))
+        self.assertEqual(sorted(entry['candidates'] for entry in self.ma.history.records('generate')), [800, 1200])
+
+    def test_lease_expiry(self):
+        coordinator = Coordinator(self.ma, [(1024, 1)], lease_seconds=0.01)
+        job = coordinator.lease('lost')
+        self.assertIsNone(coordinator.lease('other'))
+        threading.Event().wait(0.02)
+        self.assertFalse(coordinator.renew(job['id'], 'other'))
+        self.assertEqual(coordinator.lease('other')['id'], job['id'])
+        self.assertFalse(coordinator.renew(job['id'], 'lost'))
+
+    def screening_job(self, coordinator: Coordinator) -> dict:
+        candidate_path = self.ma.config['moduli_dir'] / '1024.candidate_a'
+        write_candidates(str(candidate_path), 1024, 200)
+        coordinator._add_screening(candidate_path)
+        return coordinator.lease('worker')
+
+    def test_rejects_forged_results(self):
+        coordinator = Coordinator(self.ma, [(1024, 1)])
+        job = coordinator.lease('worker')
+        self.assertFalse(coordinator.complete(job['id'], 'worker', b'garbage\n'))
+        # Rejected results return the job to the queue
+        self.assertEqual(coordinator.lease('other')['id'], job['id'])
+
+        job = self.screening_job(coordinator)
+        with TemporaryDirectory() as tmp:
+            candidates, screened = Path(tmp) / 'candidates', Path(tmp) / 'screened'
+            candidates.write_text(job['lines'])
+            with patch.dict(os.environ, {'FAKE_SSH_KEYGEN_YIELD': '0.5'}):
+                screen({}, str(candidates), str(screened))
+            output = screened.read_bytes()
+        # The fake ssh-keygen passes composites: verify_line rejects them
+        self.assertTrue(output)
+        self.assertFalse(coordinator.complete(job['id'], 'worker', output))
+        self.assertEqual(coordinator.lease('worker')['id'], job['id'])
+
+    def test_rejects_moduli_outside_lease(self):
+        coordinator = Coordinator(self.ma, [])
+        job = self.screening_job(coordinator)
+        forged = f'20260101000000 2 6 100 1023 2 {(1 << 1023) + 2011:X}\n'.encode()
+        with patch.object(Coordinator, '_verify', lambda self, lines: [None] * len(lines)):
+            self.assertFalse(coordinator.complete(job['id'], 'worker', forged))
+            self.assertTrue(coordinator.complete(coordinator.lease('worker')['id'], 'worker', b''))
+
+    def test_worker_retries_result(self):
+        worker = Worker(self.ma, 'http://127.0.0.1:1', poll=0, retries=2)
+        with patch.object(Worker, '_post', side_effect=[ConnectionResetError(), (200, b'{}')]) as post:
+            self.assertTrue(worker._complete('/jobs/1/complete', '1', b''))
+        self.assertEqual(post.call_count, 2)
+        with patch.object(Worker, '_post', side_effect=TimeoutError()):
+            self.assertFalse(worker._complete('/jobs/1/complete', '1', b''))
+
+    def test_token_required_off_loopback(self):
+        with self.assertRaises(ValueError):
+            Coordinator(self.ma, [(1024, 1)]).server('0.0.0.0', 0)
+        Coordinator(self.ma, [(1024, 1)], token='secret').server('0.0.0.0', 0).server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+from unittest.mock import patch
+
+from moduli_assembly.history import (RunHistory, period_of)
+
+
+class TestRunHistory(TestCase):
+
+    def test_yield_model(self):
+        with TemporaryDirectory() as tmp:
+            history = RunHistory(Path(tmp) / '.run_history')
+            self.assertEqual(history.yield_model(), {})
+
+            history.record('generate', 3072, runs=2, candidates=20000)
+            history.record('screen', 3072, candidates=20000, safe_primes=40)
+            history.record('generate', 4096, runs=1, candidates=8000)
+
+            model = history.yield_model()
+            self.assertEqual(model[3072]['candidates_per_run'], 10000)
+            self.assertEqual(model[3072]['safe_primes_per_candidate'], 0.002)
+            self.assertEqual(model[3072]['safe_primes_per_run'], 20)
+            self.assertIsNone(model[4096]['safe_primes_per_run'])
+            self.assertEqual(len(list(history.records('screen'))), 1)
+
+    def test_production_stats(self):
+        with TemporaryDirectory() as tmp:
+            history = RunHistory(Path(tmp) / '.run_history')
+            with patch('moduli_assembly.history.datetime') as clock:
+                clock.now.return_value.isoformat.return_value = '2026-09-30T10:00:00+00:00'
+                history.record('generate', 3072, runs=2, candidates=20000, wall_s=1800, cpu_s=3600)
+                history.record('screen', 3072, candidates=20000, safe_primes=40, wall_s=900, cpu_s=7200)
+                # Recorded before jobs were metered
+                history.record('screen', 3072, candidates=10000, safe_primes=10)
+                clock.now.return_value.isoformat.return_value = '2026-10-18T10:00:00+00:00'
+                history.record('generate', 3072, runs=1, candidates=10000, wall_s=900, cpu_s=3600)
+
+            stats = history.production_stats('month')[3072]
+            self.assertEqual(list(stats['periods']), ['2026-09', '2026-10'])
+            september, october = stats['periods'].values()
+            self.assertEqual(september['generated_per_cpu_hour'], 20000)
+            self.assertEqual(september['screened_per_cpu_hour'], 10000)
+            self.assertEqual(september['safe_primes_per_candidate'], 50 / 30000)
+            # 3600 s / 20000 candidates * 600 candidates per safe prime + 7200 s / 40 metered safe primes
+            self.assertAlmostEqual(september['cpu_s_per_safe_prime'], 108 + 180)
+            self.assertEqual(october['generated_per_cpu_hour'], 10000)
+            self.assertIsNone(october['cpu_s_per_safe_prime'])
+            self.assertEqual(stats['total']['generate_cpu_s'], 7200)
+            self.assertEqual(stats['total']['runs'], 3)
+            self.assertEqual(list(history.production_stats('week')[3072]['periods']), ['2026-W40', '2026-W42'])
+            with self.assertRaises(ValueError):
+                history.production_stats('hour')
+
+    def test_period_of(self):
+        timestamp = '2026-01-01T00:00:00+00:00'
+        self.assertEqual([period_of(timestamp, period) for period in ('day', 'week', 'month')],
+                         ['2026-01-01', '2026-W01', '2026-01'])
+
+
+if __name__ == '__main__':
+    main()
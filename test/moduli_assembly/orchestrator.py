@@ -0,0 +1,62 @@
+import os
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+from unittest.mock import patch
+
+from moduli_assembly import ModuliAssembly
+from moduli_assembly.orchestrator import AsyncOrchestrator
+
+FAKE_SSH_KEYGEN = str(Path('benchmarks/fake_ssh_keygen.py').resolve())
+
+
+class TestAsyncOrchestrator(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.ma = ModuliAssembly(root_dir=Path(self.tmp.name))
+        self.ma.config['ssh_keygen'] = FAKE_SSH_KEYGEN
+
+    def tearDown(self):
+        self.ma.config.pop('ssh_keygen')
+        self.tmp.cleanup()
+
+    @patch.dict(os.environ, {'FAKE_SSH_KEYGEN_CANDIDATES': '500', 'FAKE_SSH_KEYGEN_YIELD': '0.05'})
+    def test_pipeline(self):
+        orchestrator = AsyncOrchestrator(self.ma, generators=4, screeners=4)
+        screened = orchestrator.run(orchestrator.pipeline, [(1024, 2), (2048, 2)], shards=2)
+        self.assertIsNone(orchestrator.interrupted)
+        self.assertEqual([self.ma.key_length_of(path) for path in screened], [2048, 1024])
+        self.assertTrue(all(path.stat().st_size > 0 for path in screened))
+        self.assertEqual(sorted(path.name for path in self.ma.config['moduli_dir'].iterdir()),
+                         sorted(path.name for path in screened))
+
+    @patch.dict(os.environ, {'FAKE_SSH_KEYGEN_LATENCY': '5'})
+    def test_timeout(self):
+        orchestrator = AsyncOrchestrator(self.ma, timeout=0.2, grace=1)
+        with self.assertRaises(RuntimeError):
+            orchestrator.run(orchestrator.generate, 1024, 2)
+        # The interrupted generation keeps its checkpoint, and no partial run output
+        self.assertEqual(len(list(self.ma.config['moduli_dir'].glob('.*.generate'))), 1)
+        self.assertEqual(list(self.ma.config['moduli_dir'].glob('.*.part')), [])
+
+    @patch.dict(os.environ, {'FAKE_SSH_KEYGEN_YIELD': '1.0'})
+    def test_native_backend(self):
+        self.ma.make_dirs()
+        candidate = self.ma.config['moduli_dir'] / '1024.candidate_a'
+        # q = 41 and q = 29 are Sophie Germain primes, q = 27 is not: the fake ssh-keygen would keep all three
+        candidate.write_text(''.join(f'20250101000000 4 2 1000 5 0 {q:X}\n' for q in (41, 29, 27)))
+        orchestrator = AsyncOrchestrator(self.ma)
+        self.ma.config['screening_backend'] = 'native'
+        try:
+            screened = orchestrator.run(orchestrator.screen, candidate, 2)
+            self.assertEqual([line.split()[6] for line in screened.read_text().splitlines()], ['53', '3B'])
+            self.ma.config['screening_backend'] = 'unknown'
+            with self.assertRaises(ValueError):
+                orchestrator.run(orchestrator.screen, candidate)
+        finally:
+            self.ma.config.pop('screening_backend')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+from io import BytesIO
+from pathlib import PosixPath as Path
+from random import Random
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+
+from benchmarks.fake_ssh_keygen import write_moduli
+from moduli_assembly import ModuliAssembly
+from moduli_assembly.pack import (HEADER, INDEX_ENTRY, RECORD, ModuliPack, write_pack)
+
+
+class TestPack(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.moduli = Path(self.tmp.name) / 'moduli'
+        self.lines = ['# comment\n']
+        for bits, count in ((3072, 20), (4096, 7)):
+            write_moduli(str(self.moduli), bits, count)
+            self.lines += self.moduli.read_text().splitlines(keepends=True)
+        self.moduli.write_text(''.join(self.lines))
+        self.pack = Path(self.tmp.name) / 'moduli.pack'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        self.assertEqual(write_pack(self.lines, self.pack), {3072: 20, 4096: 7})
+        self.assertEqual(self.pack.stat().st_size, HEADER.size + 2 * INDEX_ENTRY.size +
+                         20 * (RECORD.size + 384) + 7 * (RECORD.size + 512))
+        with ModuliPack(self.pack) as pack:
+            self.assertEqual(pack.bitsizes(), {3072: 20, 4096: 7})
+            self.assertEqual(len(pack), 27)
+            dst = BytesIO()
+            pack.write_text(dst)
+        self.assertEqual(dst.getvalue().decode(), ''.join(self.lines[1:]))
+
+    def test_oversized_modulus(self):
+        # A 4096 bit modulus under a 3071 size field
+        line = self.lines[-1].replace(' 4095 ', ' 3071 ')
+        with self.assertRaisesRegex(ValueError, line.split()[6][:20]):
+            write_pack(self.lines + [line], self.pack)
+        self.assertFalse(self.pack.exists())
+
+    def test_random_access(self):
+        write_pack(self.lines, self.pack)
+        fields = self.lines[-3].split()
+        with ModuliPack(self.pack) as pack:
+            self.assertEqual(pack.modulus(4096, 4), int(fields[6], 16))
+            self.assertEqual(pack.generator(4096, 4), int(fields[5], 16))
+            self.assertEqual(pack.line(4096, 4), self.lines[-3])
+            view = pack.modulus_bytes(4096, 4)
+            self.assertIsInstance(view, memoryview)
+            self.assertEqual(len(view), 512)
+            view.release()
+            self.assertIn(pack.random(4096, Random(0)), range(7))
+            with self.assertRaises(KeyError):
+                pack.random(2048)
+            with self.assertRaises(IndexError):
+                pack.modulus(4096, 7)
+
+    def test_not_a_pack(self):
+        with self.assertRaises(ValueError):
+            ModuliPack(self.moduli)
+
+    def test_pack_moduli_file(self):
+        ma = ModuliAssembly(root_dir=Path(self.tmp.name))
+        self.assertEqual(ma.pack_moduli_file(self.pack, self.moduli), {3072: 20, 4096: 7})
+        with ModuliPack(self.pack) as pack:
+            self.assertEqual(list(pack.lines()), self.lines[1:])
+
+
+if __name__ == '__main__':
+    main()
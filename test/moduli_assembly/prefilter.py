@@ -0,0 +1,50 @@
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+
+from moduli_assembly.prefilter import (SSH_KEYGEN_SIEVE_BOUND, prefilter_file, remainders, product_tree,
+                                       small_factor_free, small_primes)
+
+
+class TestPrefilter(TestCase):
+
+    def test_small_primes(self):
+        self.assertEqual(small_primes(30), [2, 3, 5, 7, 11, 13, 17, 19, 23, 29])
+
+    def test_remainders(self):
+        values = [7, 11, 13, 17, 19]
+        self.assertEqual(remainders(1000, product_tree(values)), [1000 % v for v in values])
+
+    def test_small_factor_free(self):
+        # 1009 * 1013 is free of primes below 1000, 997 * 1013 is not
+        self.assertEqual(small_factor_free([1009 * 1013, 997 * 1013, 1019], 1000), [True, False, True])
+
+    def test_prefilter_file(self):
+        with TemporaryDirectory() as tmp:
+            candidate_path = Path(tmp) / '1024.candidate_test'
+            # q = 1019 keeps, 2q + 1 = 2039 prime; q = 1021 drops, 2q + 1 = 2043 = 3^2 * 227
+            lines = '20250101000000 4 2 1000 9 0 3FB\n20250101000000 4 2 1000 9 0 3FD\n'
+            candidate_path.write_text(lines)
+            # ssh-keygen has sieved far beyond 500: no batch GCD
+            self.assertEqual(prefilter_file(candidate_path, bound=500)['kept'], 2)
+            self.assertEqual(candidate_path.read_text(), lines)
+            self.assertLess(500, SSH_KEYGEN_SIEVE_BOUND)
+
+            stats = prefilter_file(candidate_path, bound=500, sieved=0)
+            self.assertEqual((stats['candidates'], stats['kept']), (2, 1))
+            self.assertEqual(candidate_path.read_text(), '20250101000000 4 2 1000 9 0 3FB\n')
+
+    def test_prefilter_generator(self):
+        with TemporaryDirectory() as tmp:
+            candidate_path = Path(tmp) / '1024.candidate_test'
+            # p = 83 and p = 59 get generator 2 from ssh-keygen, p = 23 generator 5
+            lines = '20250101000000 4 2 1000 5 0 29\n20250101000000 4 2 1000 4 0 1D\n'
+            candidate_path.write_text(lines + '20250101000000 4 2 1000 3 0 B\n')
+            prefilter_file(candidate_path, generator=2)
+            self.assertEqual(candidate_path.read_text(), lines)
+            prefilter_file(candidate_path, generator=5)
+            self.assertEqual(candidate_path.read_text(), '')
+
+
+if __name__ == '__main__':
+    main()
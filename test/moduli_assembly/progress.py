@@ -0,0 +1,57 @@
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+
+from moduli_assembly.progress import (ProgressSamples, estimate, prometheus_metrics, read_checkpoint, summarize)
+
+
+class TestProgress(TestCase):
+
+    def test_estimate(self):
+        # First reading: rate from the candidate file's age
+        record = estimate(1000, 200, updated=110.0, previous={}, started=100.0, now=115.0)
+        self.assertEqual(record['percent'], 20.0)
+        self.assertEqual(record['lines_per_second'], 20.0)
+        self.assertEqual(record['eta_seconds'], 40.0)
+        self.assertEqual(record['checkpoint_age_seconds'], 5.0)
+
+        # Later reading: rate between checkpoint writes
+        record = estimate(1000, 500, updated=130.0, previous={'done': 200, 'updated': 110.0}, started=100.0,
+                          now=130.0)
+        self.assertEqual(record['lines_per_second'], 15.0)
+
+        # Not started
+        record = estimate(1000, 0, updated=None, previous={}, started=100.0, now=130.0)
+        self.assertIsNone(record['lines_per_second'])
+        self.assertIsNone(record['eta_seconds'])
+        self.assertIsNone(record['checkpoint_age_seconds'])
+
+    def test_summarize_and_metrics(self):
+        files = [dict(estimate(1000, 500, 110.0, {}, 100.0, 110.0), file='3072.candidate_a', key_length=3072),
+                 dict(estimate(1000, 0, None, {}, 100.0, 110.0), file='3072.candidate_b', key_length=3072)]
+        totals = summarize(files)[3072]
+        self.assertEqual((totals['files'], totals['lines'], totals['done'], totals['percent']), (2, 2000, 500, 25.0))
+        self.assertEqual(totals['lines_per_second'], 50.0)
+        self.assertIsNone(totals['eta_seconds'])
+
+        metrics = prometheus_metrics({'timestamp': 110.0, 'files': files, 'bitsizes': summarize(files)})
+        self.assertIn('moduli_assembly_screening_done{file="3072.candidate_a",key_length="3072"} 500', metrics)
+        self.assertIn('moduli_assembly_bitsize_percent{key_length="3072"} 25.0', metrics)
+        self.assertNotIn('moduli_assembly_bitsize_eta_seconds{', metrics)
+
+    def test_checkpoint_and_samples(self):
+        with TemporaryDirectory() as tmp:
+            checkpoint = Path(tmp) / '.3072.candidate_a'
+            self.assertIsNone(read_checkpoint(checkpoint))
+            checkpoint.write_text('4000\n')
+            self.assertEqual(read_checkpoint(checkpoint)[0], 4000)
+
+            samples = ProgressSamples(Path(tmp) / '.progress')
+            samples.update('a', lines=10)
+            samples.update('b', lines=20)
+            samples.save(['a'])
+            self.assertEqual(ProgressSamples(Path(tmp) / '.progress').samples, {'a': {'lines': 10}})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+from collections import Counter
+from pathlib import PosixPath as Path
+from random import Random
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+
+from benchmarks.fake_ssh_keygen import write_moduli
+from moduli_assembly import ModuliAssembly
+from moduli_assembly.reservoir import (Reservoir, sample_moduli_files)
+
+
+class TestReservoir(TestCase):
+
+    def test_short_stream(self):
+        reservoir = Reservoir(5, Random(0))
+        for item in 'abc':
+            reservoir.offer(item)
+        self.assertEqual(sorted(reservoir.sample()), ['a', 'b', 'c'])
+        self.assertEqual(reservoir.seen, 3)
+
+    def test_uniform(self):
+        rng, counts = Random(1), Counter()
+        for _ in range(5000):
+            reservoir = Reservoir(4, rng)
+            for item in range(40):
+                reservoir.offer(item)
+            self.assertEqual(len(reservoir.items), 4)
+            counts.update(reservoir.items)
+        # Each item is kept with probability 4/40: 500 expected
+        self.assertEqual(len(counts), 40)
+        self.assertTrue(all(420 < count < 580 for count in counts.values()), counts)
+
+    def test_sample_moduli_files(self):
+        with TemporaryDirectory() as tmp:
+            paths = [Path(tmp) / '3072.screened_a', Path(tmp) / '4096.screened_b']
+            write_moduli(str(paths[0]), 3072, 50)
+            write_moduli(str(paths[1]), 4096, 3)
+            reservoirs = sample_moduli_files(paths, 10, Random(2))
+            self.assertEqual(sorted(reservoirs), [3071, 4095])
+            self.assertEqual((reservoirs[3071].seen, len(reservoirs[3071].items)), (50, 10))
+            self.assertEqual(len(reservoirs[4095].items), 3)
+            self.assertTrue(set(reservoirs[3071].items) <= set(paths[0].read_text().splitlines(keepends=True)))
+
+
+class TestBalancedModuliFile(TestCase):
+
+    def test_create_balanced_moduli_file(self):
+        with TemporaryDirectory() as tmp:
+            ma = ModuliAssembly(root_dir=Path(tmp))
+            ma.make_dirs()
+            write_moduli(str(ma.config['moduli_dir'] / '3072.screened_a'), 3072, 40)
+            write_moduli(str(ma.config['moduli_dir'] / '3072.screened_b'), 3072, 40, seed=1)
+            write_moduli(str(ma.config['moduli_dir'] / '4096.screened_a'), 4096, 25)
+            ma.create_moduli_file()
+
+            for from_store in (False, True):
+                moduli_file = ma.create_moduli_file(per_bitsize=20, from_store=from_store)
+                lines = moduli_file.read_text().splitlines()[1:]
+                self.assertEqual(Counter(line.split()[4] for line in lines), {'3071': 20, '4095': 20})
+                self.assertEqual(len(set(lines)), 40)
+                # No manifest: the next full assembly starts from scratch
+                self.assertFalse(ma.get_manifest_path(ma.config['moduli_file']).exists())
+
+
+if __name__ == '__main__':
+    main()
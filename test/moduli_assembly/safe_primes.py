@@ -0,0 +1,45 @@
+from unittest import (TestCase, main)
+
+from moduli_assembly.safe_primes import (is_probable_prime, known_generator, miller_rabin, moduli_line, screen_line)
+
+
+class TestSafePrimes(TestCase):
+
+    def test_miller_rabin(self):
+        self.assertTrue(miller_rabin((1 << 127) - 1, 20))
+        self.assertFalse(miller_rabin((1 << 128) + 1, 20))
+        self.assertFalse(miller_rabin(561, 20))
+
+    def test_is_probable_prime(self):
+        self.assertTrue(is_probable_prime(59))
+        self.assertTrue(is_probable_prime((1 << 521) - 1, 10))
+        self.assertFalse(is_probable_prime(1999 * 2003))
+
+    def test_known_generator(self):
+        self.assertEqual(known_generator(59), 2)
+        self.assertEqual(known_generator(23), 5)
+        self.assertEqual(known_generator(359), 0)
+
+    def test_moduli_line(self):
+        self.assertEqual(moduli_line(59, 5, 2, 6, 100, '20250101000000'), '20250101000000 2 6 100 5 2 3B\n')
+
+    def test_screen_sophie_germain_candidate(self):
+        # q = 29, p = 59
+        line = screen_line('20250101000000 4 2 1000 4 0 1D\n', generator=2, trials=10)
+        self.assertTrue(line.endswith(' 2 6 10 5 2 3B\n'))
+        # q = 41, p = 83: ssh-keygen derives generator 2, so -O generator=5 drops it
+        self.assertIsNone(screen_line('20250101000000 4 2 1000 5 0 29\n', generator=5, trials=10))
+        self.assertTrue(screen_line('20250101000000 4 2 1000 5 0 29\n', trials=10).endswith(' 6 2 53\n'))
+
+    def test_screen_rejects(self):
+        # q = 27 composite
+        self.assertIsNone(screen_line('20250101000000 4 2 1000 4 0 1B\n', generator=2))
+        # p = 23 has generator 5, not 2
+        self.assertIsNone(screen_line('20250101000000 4 2 1000 3 0 B\n', generator=2))
+        # Marked composite
+        self.assertIsNone(screen_line('20250101000000 4 3 1000 4 0 1D\n', generator=2))
+        self.assertIsNone(screen_line('#/etc/ssh/moduli: creation_date\n'))
+
+
+if __name__ == '__main__':
+    main()
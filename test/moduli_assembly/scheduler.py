@@ -0,0 +1,132 @@
+import asyncio
+import os
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+from unittest.mock import patch
+
+from moduli_assembly import ModuliAssembly
+from moduli_assembly.orchestrator import AsyncOrchestrator
+from moduli_assembly.scheduler import (AdaptiveSlots, HostProbe, LoadScheduler, cgroup_cpus)
+
+FAKE_SSH_KEYGEN = str(Path('benchmarks/fake_ssh_keygen.py').resolve())
+
+
+class FixedProbe(HostProbe):
+
+    def __init__(self, cpus: float, load: float, memory: int = None):
+        self._cpus, self._load, self._memory = cpus, load, memory
+
+    def cpus(self):
+        return self._cpus
+
+    def load(self):
+        return self._load
+
+    def memory(self):
+        return self._memory
+
+
+class TestCgroup(TestCase):
+
+    def test_cgroup_cpus(self):
+        with TemporaryDirectory() as tmp:
+            root, proc = Path(tmp) / 'cgroup', Path(tmp) / 'proc_cgroup'
+            (root / 'ci' / 'job').mkdir(parents=True)
+            proc.write_text('0::/ci/job\n')
+            self.assertIsNone(cgroup_cpus(root, proc))
+            (root / 'ci' / 'job' / 'cpu.max').write_text('max 100000\n')
+            (root / 'ci' / 'cpu.max').write_text('250000 100000\n')
+            self.assertEqual(cgroup_cpus(root, proc), 2.5)
+
+            (root / 'cpu,cpuacct' / 'docker').mkdir(parents=True)
+            (root / 'cpu,cpuacct' / 'docker' / 'cpu.cfs_quota_us').write_text('150000\n')
+            (root / 'cpu,cpuacct' / 'docker' / 'cpu.cfs_period_us').write_text('100000\n')
+            proc.write_text('4:memory:/docker\n3:cpu,cpuacct:/docker\n0::/ci/job\n')
+            self.assertEqual(cgroup_cpus(root, proc), 1.5)
+
+
+class TestLoadScheduler(TestCase):
+
+    def test_plan(self):
+        self.assertEqual(LoadScheduler(FixedProbe(8, 2.0)).plan(running=0), 6)
+        # Own workers are not foreground load
+        self.assertEqual(LoadScheduler(FixedProbe(8, 6.0)).plan(running=4), 6)
+        self.assertEqual(LoadScheduler(FixedProbe(8, 2.0), reserve=2).plan(running=0), 4)
+        self.assertEqual(LoadScheduler(FixedProbe(4, 3.6)).plan(running=0), 0)
+        self.assertEqual(LoadScheduler(FixedProbe(8, 0.0, memory=100)).plan(running=0), 0)
+        scheduler = LoadScheduler(FixedProbe(4, 2.8))
+        self.assertEqual(scheduler.plan(running=0), 1)
+        scheduler.paused = True
+        self.assertEqual(scheduler.plan(running=0), 0)
+
+    def test_wrap(self):
+        scheduler = LoadScheduler(ionice=None)
+        self.assertEqual(scheduler.wrap(['ssh-keygen']), ['nice', '-n', '15', 'ssh-keygen'])
+        with self.assertRaises(ValueError):
+            LoadScheduler(ionice='realtime')
+
+    def test_adaptive_slots(self):
+        async def run():
+            slots, order = AdaptiveSlots(0), []
+
+            async def job(n):
+                async with slots:
+                    order.append(n)
+
+            tasks = [asyncio.ensure_future(job(n)) for n in range(3)]
+            await asyncio.sleep(0.01)
+            self.assertEqual(order, [])
+            await slots.set_limit(1)
+            await asyncio.gather(*tasks)
+            return order
+
+        self.assertEqual(sorted(asyncio.run(run())), [0, 1, 2])
+
+
+class TestSharedHost(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.ma = ModuliAssembly(root_dir=Path(self.tmp.name))
+        self.ma.config['ssh_keygen'] = FAKE_SSH_KEYGEN
+
+    def tearDown(self):
+        self.ma.config.pop('ssh_keygen')
+        self.tmp.cleanup()
+
+    @patch.dict(os.environ, {'FAKE_SSH_KEYGEN_CANDIDATES': '300', 'FAKE_SSH_KEYGEN_YIELD': '0.05'})
+    def test_pipeline(self):
+        scheduler = LoadScheduler(FixedProbe(4, 0.0), interval=0.05)
+        orchestrator = AsyncOrchestrator(self.ma, generators=2, screeners=2, scheduler=scheduler)
+        screened = orchestrator.run(orchestrator.pipeline, [(1024, 2)], shards=2)
+        self.assertTrue(all(path.stat().st_size > 0 for path in screened))
+
+    @patch.dict(os.environ, {'FAKE_SSH_KEYGEN_LATENCY': '0.3'})
+    def test_pause_screening(self):
+        probe = FixedProbe(4, 0.0)
+        scheduler = LoadScheduler(probe, interval=0.05)
+        orchestrator = AsyncOrchestrator(self.ma, generators=1, screeners=1, scheduler=scheduler)
+        candidate = self.ma.config['moduli_dir'] / '1024.candidate_test'
+        self.ma.make_dirs()
+        candidate.write_text('')
+        observed = []
+
+        async def busy_then_idle():
+            task = asyncio.ensure_future(orchestrator.screen(candidate))
+            while not orchestrator._screening:
+                await asyncio.sleep(0.01)
+            probe._load = 8.0
+            await asyncio.sleep(0.5)
+            observed.append((scheduler.paused, len(scheduler._stopped), task.done()))
+            probe._load = 0.0
+            return await task
+
+        orchestrator.run(busy_then_idle)
+        # Paused past its 0.3s latency, then resumed to finish
+        self.assertEqual(observed, [(True, 1, False)])
+        self.assertFalse(scheduler.paused)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+
+from moduli_assembly.scripts.moduli_infile import (moduli_distribution, moduli_infile)
+
+MODULI = '''#/etc/ssh/moduli: creation_date: moduli_assembly: 2025-01-01T00:00:00.000000+00:00
+20250101000000 2 6 100 3071 2 F1
+20250102000000 2 6 100 3071 5 F3
+20241231000000 2 6 100 1023 2 F5
+not a moduli line
+'''
+
+
+class TestModuliInfile(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.moduli_file = Path(self.tmp.name) / 'moduli'
+        self.moduli_file.write_text(MODULI)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_moduli_distribution(self):
+        stats = moduli_distribution(self.moduli_file, self.moduli_file)
+        self.assertEqual(stats['moduli'], 6)
+        self.assertEqual(stats['invalid'], 2)
+        self.assertEqual(stats['sizes'], {3071: 4, 1023: 2})
+        self.assertEqual(stats['generators'], {2: 4, 5: 2})
+        self.assertEqual(stats['timestamps'][3071], ('20250101000000', '20250102000000'))
+
+    def test_moduli_infile(self):
+        bitsizes = moduli_infile(self.moduli_file)
+        self.assertEqual(bitsizes['3071'], 2)
+        self.assertEqual(bitsizes['4095'], 0)
+        self.assertEqual(bitsizes['1023'], 1)
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            moduli_infile(Path(self.tmp.name) / 'missing')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import os
+import subprocess
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+from unittest.mock import patch
+
+from benchmarks.fake_ssh_keygen import accepted
+from moduli_assembly import ModuliAssembly
+from moduli_assembly.orchestrator import AsyncOrchestrator
+from moduli_assembly.spool import (compress_bytes, compression_of, open_candidates, run_pipeline)
+
+FAKE_SSH_KEYGEN = str(Path('benchmarks/fake_ssh_keygen.py').resolve())
+
+
+class TestSpool(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_compression_of(self):
+        self.assertEqual(compression_of(Path('4096.candidate_2025.gz')), 'gzip')
+        self.assertEqual(compression_of(Path('4096.candidate_2025.zst')), 'zstd')
+        self.assertIsNone(compression_of(Path('4096.candidate_2025')))
+
+    def test_open_candidates(self):
+        for name in ('plain', 'spool.gz', 'spool.zst'):
+            path = self.dir / name
+            with open_candidates(path, 'w') as f:
+                f.write('a\nb\n')
+            # Spool members append into one stream
+            with path.open('ab') as f:
+                f.write(compress_bytes(b'c\n', compression_of(path)))
+            with open_candidates(path) as f:
+                self.assertEqual(f.read(), 'a\nb\nc\n', name)
+
+    def test_run_pipeline(self):
+        output = self.dir / 'out'
+        # `yes` is cut off by SIGPIPE once `head` exits
+        run_pipeline([['yes'], ['head', '-n', '3']], output)
+        self.assertEqual(output.read_text(), 'y\ny\ny\n')
+        with self.assertRaises(subprocess.CalledProcessError):
+            run_pipeline([['echo', 'y'], ['false']])
+
+
+@patch.dict(os.environ, {'FAKE_SSH_KEYGEN_CANDIDATES': '400', 'FAKE_SSH_KEYGEN_YIELD': '0.05'})
+class TestCandidateSpool(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.ma = ModuliAssembly(root_dir=Path(self.tmp.name))
+        self.ma.config['ssh_keygen'] = FAKE_SSH_KEYGEN
+
+    def tearDown(self):
+        self.ma.config.pop('ssh_keygen')
+        self.ma.config.pop('candidate_compression', None)
+        self.tmp.cleanup()
+
+    def expected_safe_primes(self, candidate_path: Path) -> int:
+        with open_candidates(candidate_path) as f:
+            return sum(accepted(line.split()[6], 0.05) for line in f)
+
+    def test_generate_and_screen(self):
+        for compression, suffix in (('gzip', '.gz'), ('zstd', '.zst')):
+            self.ma.config['candidate_compression'] = compression
+            candidate = self.ma.generate_candidates(1024, 3, jobs=3)
+            self.assertTrue(candidate.name.endswith(suffix))
+            self.assertEqual(self.ma.count_lines(candidate), 1200)
+            # Generation leaves no uncompressed candidates behind
+            self.assertEqual([path.name for path in self.ma.config['moduli_dir'].glob('*candidate*')],
+                             [candidate.name])
+
+            expected = self.expected_safe_primes(candidate)
+            screened = self.ma.screen_candidates(candidate, shards=3)
+            self.assertFalse(screened.name.endswith(suffix))
+            self.assertEqual(self.ma.count_lines(screened), expected)
+            self.assertFalse(candidate.exists())
+
+    def test_asyncio_pipeline(self):
+        self.ma.config['candidate_compression'] = 'gzip'
+        orchestrator = AsyncOrchestrator(self.ma, generators=2, screeners=2)
+        screened = orchestrator.run(orchestrator.pipeline, [(1024, 2)], shards=2)
+        record = list(self.ma.history.records('screen'))[-1]
+        self.assertEqual(record['candidates'], 800)
+        self.assertEqual(self.ma.count_lines(screened[0]), record['safe_primes'])
+        self.assertEqual([path.name for path in self.ma.config['moduli_dir'].iterdir()], [screened[0].name])
+
+
+if __name__ == '__main__':
+    main()
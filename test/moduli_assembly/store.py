@@ -0,0 +1,56 @@
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+
+from moduli_assembly.store import ModuliStore
+
+SCREENED = ('20250101000000 2 6 100 3071 2 C1\n'
+            '20250101000001 2 6 100 3071 5 C3\n'
+            '20250101000002 2 6 100 4095 2 D1\n')
+
+
+class TestModuliStore(TestCase):
+
+    def test_ingest_deduplicates(self):
+        with TemporaryDirectory() as tmp:
+            store = ModuliStore(Path(tmp) / 'moduli.db')
+            first, second = Path(tmp) / '3072.screened_a', Path(tmp) / '3072.screened_b'
+            first.write_text(SCREENED)
+            second.write_text('# comment\n' + SCREENED + '20250101000003 2 6 100 3071 2 C5\n')
+
+            self.assertEqual(store.ingest(first), 3)
+            self.assertEqual(store.ingest(first), 0)
+            self.assertEqual(store.ingest(second), 1)
+            self.assertEqual(store.count_by_size(), {3071: 3, 4095: 1})
+            self.assertEqual(store.count_by_size(generator=2), {3071: 2, 4095: 1})
+
+    def test_select(self):
+        with TemporaryDirectory() as tmp:
+            store = ModuliStore(Path(tmp) / 'moduli.db')
+            screened = Path(tmp) / '3072.screened_a'
+            screened.write_text(SCREENED)
+            store.ingest(screened)
+
+            self.assertEqual(sorted(store.select()), sorted(SCREENED.splitlines(keepends=True)))
+            self.assertEqual(list(store.select(sizes=[4095])), [SCREENED.splitlines(keepends=True)[2]])
+            self.assertEqual(len(list(store.select(limit_per_size=1))), 2)
+            self.assertEqual(len(list(store.select(generator=5))), 1)
+            self.assertEqual(len(list(store.select(since='20250101000001'))), 2)
+
+    def test_take(self):
+        with TemporaryDirectory() as tmp:
+            path, screened = Path(tmp) / 'moduli.db', Path(tmp) / '3072.screened_a'
+            screened.write_text(SCREENED)
+            store = ModuliStore(path)
+            store.ingest(screened)
+            self.assertEqual(ModuliStore(path).count_by_size(available=True), {3071: 2, 4095: 1})
+            taken = store.take(2, sizes=[3071], generator=2)
+            self.assertEqual([line.split()[6] for line in taken], ['C1'])
+            self.assertEqual(store.count_by_size(available=True), {3071: 1, 4095: 1})
+            self.assertEqual(store.take(2, sizes=[3071], generator=2), [])
+            self.assertEqual(len(list(store.select(available=True))), 2)
+            self.assertEqual(len(list(store.select())), 3)
+
+
+if __name__ == '__main__':
+    main()
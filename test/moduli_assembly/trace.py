@@ -0,0 +1,131 @@
+import os
+import subprocess
+import sys
+from json import loads
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+from unittest.mock import patch
+
+from moduli_assembly import (ModuliAssembly, trace)
+from moduli_assembly.orchestrator import AsyncOrchestrator
+
+FAKE_SSH_KEYGEN = str(Path('benchmarks/fake_ssh_keygen.py').resolve())
+
+
+class TestTrace(TestCase):
+
+    def tearDown(self):
+        trace.stop()
+
+    def spans(self, tracer, category):
+        return [event for event in tracer.events if event.get('cat') == category]
+
+    def test_disabled(self):
+        with trace.span('stage', key_length=1024) as args:
+            trace.annotate(candidates=3)
+        # Nothing is recorded, or annotated, until tracing starts
+        self.assertEqual(args, {'key_length': 1024})
+        self.assertEqual(trace.run_process([sys.executable, '-c', 'pass']), 0)
+
+    def test_spans(self):
+        tracer = trace.start()
+        with trace.span('outer', category='run'):
+            with trace.span('inner'):
+                trace.annotate(candidates=10)
+            trace.annotate(moduli=2)
+        inner, = self.spans(tracer, 'stage')
+        outer, = self.spans(tracer, 'run')
+        self.assertEqual((inner['args'], outer['args']), ({'candidates': 10}, {'moduli': 2}))
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertGreaterEqual(outer['ts'] + outer['dur'], inner['ts'] + inner['dur'])
+
+    def test_run_process(self):
+        tracer = trace.start()
+        trace.run_process([sys.executable, '-c', 'sum(range(10 ** 6))'], stdout=subprocess.DEVNULL)
+        with self.assertRaises(subprocess.CalledProcessError):
+            trace.run_process([sys.executable, '-c', 'raise SystemExit(3)'])
+        ok, failed = self.spans(tracer, 'process')
+        self.assertEqual((ok['args']['returncode'], failed['args']['returncode']), (0, 3))
+        self.assertGreater(ok['args']['user_cpu_s'] + ok['args']['system_cpu_s'], 0)
+        self.assertGreater(ok['args']['max_rss_kb'], 0)
+        self.assertEqual(ok['name'], f'{Path(sys.executable).name} -c sum(range(10 ** 6))')
+
+        with self.assertRaises(subprocess.TimeoutExpired):
+            trace.run_process([sys.executable, '-c', 'import time; time.sleep(30)'], timeout=0.2)
+        self.assertEqual(trace.run_process([sys.executable, '-c', 'pass'], timeout=30), 0)
+
+    def test_metered(self):
+        self.assertEqual(trace.job_cost(), {})
+        with trace.metered() as meter:
+            trace.run_process([sys.executable, '-c', 'sum(range(10 ** 6))'])
+            cost = trace.job_cost()
+        # Metered without tracing
+        self.assertFalse(trace.enabled())
+        self.assertGreater(cost['cpu_s'], 0)
+        self.assertEqual(cost['cpu_s'], round(meter.cpu_s, 3))
+        self.assertGreaterEqual(cost['wall_s'], 0)
+
+    def test_write(self):
+        tracer = trace.start()
+        with trace.span('stage'):
+            pass
+        with TemporaryDirectory() as tmp:
+            tracer.write(Path(tmp) / 'trace.json')
+            events = loads((Path(tmp) / 'trace.json').read_text())['traceEvents']
+        self.assertEqual([event['ph'] for event in events], ['M', 'X'])
+
+
+@patch.dict(os.environ, {'FAKE_SSH_KEYGEN_CANDIDATES': '300', 'FAKE_SSH_KEYGEN_YIELD': '0.05'})
+class TestStageSpans(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.ma = ModuliAssembly(root_dir=Path(self.tmp.name))
+        self.ma.config['ssh_keygen'] = FAKE_SSH_KEYGEN
+        self.tracer = trace.start()
+
+    def tearDown(self):
+        trace.stop()
+        self.ma.config.pop('ssh_keygen')
+        self.tmp.cleanup()
+
+    def stages(self):
+        return {event['name']: event['args'] for event in self.tracer.events if event.get('cat') == 'stage'}
+
+    def test_synchronous(self):
+        screened = self.ma.screen_candidates(self.ma.generate_candidates(1024, 2))
+        self.ma.create_moduli_file()
+        stages = self.stages()
+        self.assertEqual(stages['generate']['candidates'], 600)
+        self.assertEqual(stages['screen']['candidates'], 600)
+        self.assertEqual(stages['screen']['safe_primes'], self.ma.count_lines(screened))
+        self.assertGreater(stages['create_moduli_file']['moduli_bytes'], 0)
+        processes = [event for event in self.tracer.events if event.get('cat') == 'process']
+        self.assertEqual(sorted(event['name'] for event in processes),
+                         ['fake_ssh_keygen.py -M generate'] * 2 + ['fake_ssh_keygen.py -M screen'])
+        self.assertTrue(all('user_cpu_s' in event['args'] for event in processes))
+
+    def test_asyncio(self):
+        orchestrator = AsyncOrchestrator(self.ma, generators=2, screeners=2)
+        orchestrator.run(orchestrator.pipeline, [(1024, 1), (2048, 1)])
+        stages = [event for event in self.tracer.events if event.get('cat') == 'stage']
+        self.assertEqual(sorted((event['name'], event['args']['key_length']) for event in stages),
+                         [('generate', 1024), ('generate', 2048), ('screen', 1024), ('screen', 2048)])
+        # Concurrent jobs are on separate trace threads
+        self.assertEqual(len({event['tid'] for event in stages}), 2)
+        # Jobs finishing together may share their CPU time: only the total is exact
+        records = list(self.ma.history.records())
+        self.assertEqual(len(records), 4)
+        self.assertGreater(sum(record['cpu_s'] for record in records), 0)
+        self.assertTrue(all(record['wall_s'] > 0 for record in records))
+
+    def test_sharded_costs(self):
+        self.ma.screen_candidates(self.ma.generate_candidates(1024, 2, jobs=2), shards=2)
+        records = list(self.ma.history.records())
+        self.assertEqual([record['stage'] for record in records], ['generate', 'screen'])
+        self.assertTrue(all(record['cpu_s'] > 0 and record['wall_s'] > 0 for record in records))
+
+
+if __name__ == '__main__':
+    main()
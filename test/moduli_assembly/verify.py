@@ -0,0 +1,32 @@
+from pathlib import PosixPath as Path
+from tempfile import TemporaryDirectory
+from unittest import (TestCase, main)
+
+from moduli_assembly.verify import (verify_file, verify_line)
+
+
+class TestVerify(TestCase):
+
+    def test_verify_line(self):
+        self.assertIsNone(verify_line('20250101000000 2 6 100 5 2 3B'))
+        self.assertIn('generator', verify_line('20250101000000 2 6 100 5 5 3B'))
+        # p = 83 also meets the generator 5 condition, but ssh-keygen only ever writes it with generator 2
+        self.assertIsNone(verify_line('20250101000000 2 6 100 6 2 53'))
+        self.assertIn('generator', verify_line('20250101000000 2 6 100 6 5 53'))
+        self.assertIn('size', verify_line('20250101000000 2 6 100 6 2 3B'))
+        # p = 35 = 5 * 7
+        self.assertIn('composite', verify_line('20250101000000 2 6 100 5 2 23'))
+        self.assertEqual(verify_line('20250101000000 2 6 100'), 'malformed line')
+
+    def test_verify_file(self):
+        with TemporaryDirectory() as tmp:
+            moduli_file = Path(tmp) / 'moduli'
+            moduli_file.write_text('#header\n20250101000000 2 6 100 5 2 3B\n20250101000000 2 6 100 5 2 23\n')
+            report = verify_file(moduli_file, workers=1)
+            self.assertEqual(report['moduli'], 2)
+            self.assertEqual(report['sizes'][5], {'moduli': 2, 'failed': 1})
+            self.assertEqual([line_number for line_number, _ in report['failures']], [3])
+
+
+if __name__ == '__main__':
+    main()